@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Volcengine Ark 客户端封装
+进程内共享一个异步客户端和 HTTP 连接池，避免每个请求重新建连和 TLS 握手，
+并提供并发上限，避免模型调用阻塞 uvicorn 事件循环。
+每次调用先在所属接口和模式的 lane 中获取自适应名额（见 ark_limiter，含进程级总上限）；
+时限、重试和熔断见 ark_resilience
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any, AsyncIterator, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+from metrics import stage, record_stage, ark_errors, record_token_usage
+from ark_limiter import Permit, acquire_ark_permit
+from ark_resilience import (
+    ARK_MAX_RETRIES,
+    RETRYABLE_ERRORS,
+    ark_retries,
+    breaker_for,
+    check_local_deadline,
+    deadline_for,
+    retry_delay,
+    unavailable,
+    wait_for_ark,
+)
+
+logger = logging.getLogger(__name__)
+
+ARK_BASE_URL = os.getenv("ARK_BASE_URL", "https://ark.cn-beijing.volces.com/api/v3")
+
+# 连接池配置
+ARK_HTTP2 = os.getenv("ARK_HTTP2", "true").lower() == "true"
+ARK_MAX_CONNECTIONS = int(os.getenv("ARK_MAX_CONNECTIONS", "32"))
+ARK_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("ARK_MAX_KEEPALIVE_CONNECTIONS", "16"))
+ARK_KEEPALIVE_EXPIRY = float(os.getenv("ARK_KEEPALIVE_EXPIRY", "60"))
+
+# 超时配置（秒），思考模型生成时间较长，读超时需要留足余量
+ARK_CONNECT_TIMEOUT = float(os.getenv("ARK_CONNECT_TIMEOUT", "5"))
+ARK_READ_TIMEOUT = float(os.getenv("ARK_READ_TIMEOUT", "120"))
+
+# 关闭时等待进行中的 Ark 调用完成的最长时间（秒）
+ARK_DRAIN_TIMEOUT = float(os.getenv("ARK_DRAIN_TIMEOUT", "30"))
+
+# 进程级共享的客户端与连接池
+_client: Optional[AsyncOpenAI] = None
+_transport: Optional[httpx.AsyncHTTPTransport] = None
+_in_flight = 0
+
+
+def _http2_available() -> bool:
+    """HTTP/2 需要 h2 依赖，缺失时回退到 HTTP/1.1"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def init_ark_client() -> AsyncOpenAI:
+    """创建进程级共享的 Ark 客户端（在应用启动时调用）"""
+    global _client, _transport
+
+    api_key = os.getenv("ARK_API_KEY")
+    if not api_key:
+        raise ValueError("ARK_API_KEY environment variable not set")
+
+    http2 = ARK_HTTP2 and _http2_available()
+    if ARK_HTTP2 and not http2:
+        logger.warning("未安装 h2，Ark 连接池回退到 HTTP/1.1")
+
+    _transport = httpx.AsyncHTTPTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=ARK_MAX_CONNECTIONS,
+            max_keepalive_connections=ARK_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=ARK_KEEPALIVE_EXPIRY
+        )
+    )
+    http_client = httpx.AsyncClient(
+        transport=_transport,
+        timeout=httpx.Timeout(ARK_READ_TIMEOUT, connect=ARK_CONNECT_TIMEOUT)
+    )
+    _client = AsyncOpenAI(
+        api_key=api_key,
+        base_url=ARK_BASE_URL,
+        http_client=http_client,
+        # 重试由 create_chat_completion 按调用时限统一处理，SDK 内置的重试会使重试次数成倍增加
+        max_retries=0
+    )
+
+    logger.info("Ark 客户端已创建 - http2: %s, max_connections: %s", http2, ARK_MAX_CONNECTIONS)
+    return _client
+
+
+async def close_ark_client():
+    """关闭共享客户端并释放连接池（在应用关闭时调用）"""
+    global _client, _transport
+
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _transport = None
+
+
+async def drain_ark_calls(timeout: float = ARK_DRAIN_TIMEOUT) -> bool:
+    """
+    等待进行中的 Ark 调用完成（在应用关闭、释放连接池之前调用）
+
+    Returns:
+        超时前全部完成时返回 True
+    """
+    deadline = time.monotonic() + timeout
+    if _in_flight:
+        logger.info("等待 %s 个进行中的 Ark 调用完成", _in_flight)
+    while _in_flight and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    if _in_flight:
+        logger.warning("关闭时仍有 %s 个 Ark 调用未完成", _in_flight)
+        return False
+    return True
+
+
+def get_ark_client() -> AsyncOpenAI:
+    """获取进程级共享的 Ark 客户端，未初始化时按需创建"""
+    if _client is None:
+        return init_ark_client()
+    return _client
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """获取连接池统计信息：已打开、空闲和进行中的连接数"""
+    stats = {
+        "initialized": _client is not None,
+        "max_connections": ARK_MAX_CONNECTIONS,
+        "max_keepalive_connections": ARK_MAX_KEEPALIVE_CONNECTIONS,
+        "open_connections": 0,
+        "idle_connections": 0,
+        "in_flight_requests": _in_flight
+    }
+
+    if _transport is not None:
+        # httpcore 连接池未提供公开的统计接口，这里直接读取连接列表
+        connections = list(getattr(_transport, "_pool").connections)
+        stats["open_connections"] = sum(1 for conn in connections if not conn.is_closed())
+        stats["idle_connections"] = sum(1 for conn in connections if conn.is_idle())
+
+    return stats
+
+
+async def _request_once(client: AsyncOpenAI, expires: float, kwargs: Dict[str, Any]):
+    """在剩余时限内调用一次 chat.completions.create，返回 (响应, Ark 响应时间)"""
+    global _in_flight
+
+    _in_flight += 1
+    start = time.perf_counter()
+    try:
+        with stage("ark_request"):
+            response = await wait_for_ark(client.chat.completions.create(**kwargs), expires)
+    finally:
+        _in_flight -= 1
+    return response, time.perf_counter() - start
+
+
+async def _close_stream(stream):
+    """关闭 Ark 流式响应并归还连接，关闭本身失败时只记录日志，不掩盖原本的异常"""
+    try:
+        await stream.close()
+    except Exception as e:
+        logger.debug("关闭 Ark 流式响应失败: %r", e)
+
+
+async def create_chat_completion(
+    client: Optional[AsyncOpenAI] = None,
+    permit: Optional[Permit] = None,
+    deadline: Optional[float] = None,
+    **kwargs
+):
+    """
+    在并发上限和调用时限内调用 chat.completions.create，可重试的失败按退避策略重试
+
+    Args:
+        client: Ark 客户端，为空时使用共享客户端
+        permit: 已获取的 lane 名额，为空时按当前请求的接口和模式获取
+        deadline: 总时限（秒，含排队和重试），为空时按模型取默认值
+        **kwargs: 透传给 chat.completions.create 的参数
+
+    Returns:
+        Ark 的 ChatCompletion 响应
+
+    Raises:
+        ArkOverloaded: 所属 lane 排队已满或等待超时
+        ArkUnavailable: 熔断中、超过总时限或重试用尽
+    """
+    if client is None:
+        client = get_ark_client()
+    model = kwargs.get("model", "")
+
+    breaker = breaker_for(model)
+    probe = False
+    expires = time.monotonic() + (deadline if deadline is not None else deadline_for(model))
+    overloaded = False
+    try:
+        # 熔断中立即失败，不排队；半开状态的探测名额在获得并发名额之后才占用，不会在排队中耗尽
+        breaker.check()
+        if permit is None:
+            permit = await acquire_ark_permit(expires - time.monotonic())
+        probe = breaker.before_call()
+        attempt = 0
+        while True:
+            check_local_deadline(expires, breaker)
+            try:
+                response, latency = await _request_once(client, expires, kwargs)
+                break
+            except RETRYABLE_ERRORS as e:
+                ark_errors.inc(model, type(e).__name__)
+                overloaded = True
+                delay = retry_delay(attempt, e)
+                if attempt >= ARK_MAX_RETRIES or time.monotonic() + delay >= expires:
+                    raise unavailable(e, expires, breaker) from e
+                attempt += 1
+                ark_retries.inc(model, type(e).__name__)
+                logger.warning("Ark 调用失败，%.2fs 后第 %s 次重试 - model: %s, error: %r", delay, attempt, model, e)
+                with stage("ark_retry_wait"):
+                    await asyncio.sleep(delay)
+            except Exception as e:
+                ark_errors.inc(model, type(e).__name__)
+                raise
+
+        breaker.record_success()
+        # 以成功那次的 Ark 响应时间（不含排队）调整上限，中途失败过则退避
+        permit.release(latency, overloaded=overloaded)
+    finally:
+        # 被取消或请求本身出错（参数错误等）时不计入熔断，也不参与并发上限的调整
+        breaker.release(probe)
+        if permit is not None:
+            permit.release(overloaded=overloaded, sample=False)
+
+    record_token_usage(model, getattr(response, "usage", None))
+    return response
+
+
+async def stream_chat_completion(
+    client: Optional[AsyncOpenAI] = None,
+    permit: Optional[Permit] = None,
+    deadline: Optional[float] = None,
+    **kwargs
+) -> AsyncIterator[Tuple[str, str]]:
+    """
+    在并发上限内以 stream=True 调用 chat.completions.create
+
+    时限只约束到收到第一段输出为止，之后由连接池的读超时约束；
+    可重试的失败只在尚未输出任何内容时重试，已经转发出去的部分无法撤回
+
+    Args:
+        permit: 已获取的 lane 名额，为空时按当前请求的接口和模式获取。
+            SSE 接口应在返回响应之前获取，过载时才能以 503 拒绝
+        deadline: 收到第一段输出的时限（秒，含排队和重试），为空时按模型取默认值
+
+    Yields:
+        (类型, 文本) 二元组，类型为 "content"（正文）或 "reasoning"（思考模型的推理过程）
+
+    Raises:
+        ArkOverloaded: 所属 lane 排队已满或等待超时
+        ArkUnavailable: 熔断中、超过时限或重试用尽
+    """
+    global _in_flight
+
+    if client is None:
+        client = get_ark_client()
+    model = kwargs.get("model", "")
+
+    breaker = breaker_for(model)
+    probe = False
+    expires = time.monotonic() + (deadline if deadline is not None else deadline_for(model))
+    overloaded = False
+    first_token: Optional[float] = None
+    try:
+        # 熔断中立即失败，不排队；半开状态的探测名额在获得并发名额之后才占用，不会在排队中耗尽
+        breaker.check()
+        if permit is None:
+            permit = await acquire_ark_permit(expires - time.monotonic())
+        probe = breaker.before_call()
+        attempt = 0
+        while True:
+            check_local_deadline(expires, breaker)
+            _in_flight += 1
+            start = time.perf_counter()
+            stream = None
+            try:
+                # 最后一个分块携带整个流的 token 用量
+                stream = await wait_for_ark(
+                    client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs),
+                    expires
+                )
+                chunks = stream.__aiter__()
+                while True:
+                    try:
+                        if first_token is None:
+                            chunk = await wait_for_ark(chunks.__anext__(), expires)
+                        else:
+                            chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    usage = getattr(chunk, "usage", None)
+                    if usage is not None:
+                        record_token_usage(model, usage)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    reasoning = getattr(delta, "reasoning_content", None)
+                    if first_token is None and (reasoning or delta.content):
+                        first_token = time.perf_counter() - start
+                        record_stage("ark_first_token", first_token)
+                    if reasoning:
+                        yield "reasoning", reasoning
+                    if delta.content:
+                        yield "content", delta.content
+                break
+            except RETRYABLE_ERRORS as e:
+                ark_errors.inc(model, type(e).__name__)
+                overloaded = True
+                delay = retry_delay(attempt, e)
+                if first_token is not None or attempt >= ARK_MAX_RETRIES or time.monotonic() + delay >= expires:
+                    raise unavailable(e, expires, breaker) from e
+                attempt += 1
+                ark_retries.inc(model, type(e).__name__)
+                logger.warning("Ark 流式调用失败，%.2fs 后第 %s 次重试 - model: %s, error: %r", delay, attempt, model, e)
+            except Exception as e:
+                ark_errors.inc(model, type(e).__name__)
+                raise
+            finally:
+                # 客户端断开、出错重试时都要关闭流，否则 HTTP/2 流和连接要等到回收时才归还连接池
+                if stream is not None:
+                    await _close_stream(stream)
+                record_stage("ark_request", time.perf_counter() - start)
+                _in_flight -= 1
+            with stage("ark_retry_wait"):
+                await asyncio.sleep(delay)
+
+        breaker.record_success()
+        # 流的总时长取决于输出长度，以首个 token 的延迟调整上限
+        permit.release(first_token if first_token is not None else time.perf_counter() - start, overloaded=overloaded)
+    finally:
+        # 客户端断开时流被关闭或取消，不计入熔断，也不参与并发上限的调整
+        breaker.release(probe)
+        if permit is not None:
+            permit.release(overloaded=overloaded, sample=False)
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Ark 调用的自适应并发限制
+每个接口和模式（lane）各有一个并发上限，按观测到的 Ark 延迟以 AIMD 方式调整：
+延迟平稳且并发已用满时每轮加 1，短期延迟明显高于长期基线、超时或被 Ark 限流时乘以退避系数。
+超出上限的请求在有界队列中等待，队列已满或等待超时时返回 503 和 Retry-After，
+避免 Ark 变慢时请求和图片数据在内存中无限堆积。
+所有 lane 合计另有进程级总上限，但每个 lane 的下限名额不受总上限约束，
+思考模型的长文本解析占满总上限时，实时图片分析仍能以下限并发继续调用
+"""
+
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Optional, Dict, Any, NamedTuple, Deque, Tuple
+
+from fastapi import HTTPException
+
+from metrics import registry, current_request, record_stage, OTHER_ENDPOINT
+
+logger = logging.getLogger(__name__)
+
+
+class LaneConfig(NamedTuple):
+    """单个 lane 的限流参数"""
+    initial: int
+    minimum: int
+    maximum: int
+    # 等待队列长度，0 表示不排队，超出上限立即返回 503
+    queue: int
+
+
+# 各接口的默认参数：实时图片分析并发高、队列短；思考模型的长文本解析并发低，避免占满 Ark 配额
+LANE_DEFAULTS = {
+    "/analyze": LaneConfig(initial=8, minimum=2, maximum=32, queue=32),
+    "/analyze-batch": LaneConfig(initial=4, minimum=1, maximum=16, queue=64),
+    "/analyze-history": LaneConfig(initial=2, minimum=1, maximum=8, queue=8),
+    "/analyze-document": LaneConfig(initial=2, minimum=1, maximum=8, queue=16),
+    "/analyze-history-text": LaneConfig(initial=2, minimum=1, maximum=8, queue=8),
+}
+DEFAULT_LANE = LaneConfig(initial=4, minimum=1, maximum=16, queue=16)
+
+# 覆盖默认参数的 JSON，键为接口（"/analyze"）或接口:模式（"/analyze:pet"），例如
+# {"/analyze-history-text": {"maximum": 4, "queue": 4}}
+ARK_LANE_LIMITS = os.getenv("ARK_LANE_LIMITS", "")
+# 在队列中等待的最长时间（秒），超时返回 503
+ARK_QUEUE_TIMEOUT = float(os.getenv("ARK_QUEUE_TIMEOUT", "30"))
+# 短期延迟超过长期基线的倍数时判定为过载
+ARK_LIMIT_LATENCY_TOLERANCE = float(os.getenv("ARK_LIMIT_LATENCY_TOLERANCE", "2.0"))
+# 过载时并发上限乘以的系数
+ARK_LIMIT_BACKOFF = float(os.getenv("ARK_LIMIT_BACKOFF", "0.75"))
+# Retry-After 的上限（秒）
+ARK_RETRY_AFTER_MAX = int(os.getenv("ARK_RETRY_AFTER_MAX", "60"))
+# 进程内所有 lane 同时进行中的 Ark 调用总上限，各 lane 下限（minimum）以内的名额不计入约束
+ARK_MAX_CONCURRENCY = int(os.getenv("ARK_MAX_CONCURRENCY", "32"))
+
+# 延迟的指数滑动平均系数：短期反映当前状态，长期作为基线
+SHORT_EWMA_ALPHA = 0.2
+LONG_EWMA_ALPHA = 0.02
+
+lane_limit = registry.gauge("ark_lane_limit", "各 lane 当前的 Ark 并发上限", ("lane",))
+lane_in_flight = registry.gauge("ark_lane_in_flight", "各 lane 进行中的 Ark 调用数", ("lane",))
+lane_queued = registry.gauge("ark_lane_queued", "各 lane 排队等待的请求数", ("lane",))
+lane_shed = registry.counter("ark_lane_shed_total", "因过载返回 503 的请求数", ("lane", "reason"))
+
+# 所有 lane 合计进行中的调用数
+_total_in_flight = 0
+
+
+class ArkOverloaded(HTTPException):
+    """Ark 调用排队已满或等待超时，以 503 和 Retry-After 拒绝请求"""
+
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail="分析服务繁忙，请稍后重试",
+            headers={"Retry-After": str(retry_after)}
+        )
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+def _load_overrides() -> Dict[str, Dict[str, int]]:
+    if not ARK_LANE_LIMITS:
+        return {}
+    try:
+        return json.loads(ARK_LANE_LIMITS)
+    except ValueError as e:
+        logger.error("ARK_LANE_LIMITS 不是有效的 JSON，使用默认限流参数: %s", e)
+        return {}
+
+
+_overrides = _load_overrides()
+
+
+def lane_config(endpoint: str, mode: str) -> LaneConfig:
+    """接口:模式 的配置优先于接口的配置，再回退到接口默认值"""
+    config = LANE_DEFAULTS.get(endpoint, DEFAULT_LANE)
+    for key in (endpoint, f"{endpoint}:{mode}"):
+        if key in _overrides:
+            config = config._replace(**_overrides[key])
+    return config
+
+
+class Permit:
+    """一次 Ark 调用占用的并发名额，调用结束后必须 release"""
+
+    __slots__ = ("limiter", "start", "released")
+
+    def __init__(self, limiter: "AdaptiveLimiter"):
+        self.limiter = limiter
+        self.start = time.monotonic()
+        self.released = False
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False, sample: bool = True):
+        """
+        归还名额并反馈本次调用的结果
+
+        Args:
+            latency: 用于调整上限的延迟（秒），为空时使用从获得名额到现在的时间
+            overloaded: Ark 超时、限流或 5xx，立即退避
+            sample: 为 False 时不参与调整（例如客户端断开导致调用被取消）
+        """
+        if self.released:
+            return
+        self.released = True
+        if latency is None:
+            latency = time.monotonic() - self.start
+        self.limiter.release(latency if sample else None, overloaded)
+
+
+class AdaptiveLimiter:
+    """AIMD 并发上限 + 有界等待队列（只在事件循环线程中使用，无需加锁）"""
+
+    def __init__(self, lane: str, config: LaneConfig):
+        self.lane = lane
+        self.config = config
+        self.limit = float(config.initial)
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._short: Optional[float] = None
+        self._long: Optional[float] = None
+        self._last_decrease = 0.0
+        self.shed = 0
+        self._publish()
+
+    def _publish(self):
+        lane_limit.set(self.lane, value=int(self.limit))
+        lane_in_flight.set(self.lane, value=self.in_flight)
+        lane_queued.set(self.lane, value=len(self._waiters))
+
+    def retry_after(self) -> int:
+        """按排队长度和当前延迟估算多久之后可能有空闲名额"""
+        latency = self._short if self._short is not None else 1.0
+        rounds = len(self._waiters) / max(int(self.limit), 1) + 1
+        return max(1, min(ARK_RETRY_AFTER_MAX, math.ceil(latency * rounds)))
+
+    def _reject(self, reason: str) -> ArkOverloaded:
+        self.shed += 1
+        lane_shed.inc(self.lane, reason)
+        retry_after = self.retry_after()
+        logger.warning("Ark 调用过载，拒绝请求 - lane: %s, reason: %s, limit: %s, queued: %s",
+                       self.lane, reason, int(self.limit), len(self._waiters))
+        return ArkOverloaded(self.lane, retry_after)
+
+    async def acquire(self, timeout: Optional[float] = None) -> Permit:
+        """
+        获取一个并发名额，必要时排队等待
+
+        Args:
+            timeout: 最长等待时间（秒），不超过 ARK_QUEUE_TIMEOUT；调用方按自己的剩余时限传入
+
+        Raises:
+            ArkOverloaded: 队列已满或等待超时
+        """
+        if not self._waiters and self._can_grant():
+            self._grant()
+            self._publish()
+            return Permit(self)
+
+        if len(self._waiters) >= self.config.queue:
+            raise self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._publish()
+        # 不使用 asyncio.wait_for：名额恰好在取消的同时分到时，wait_for 会吞掉这次取消
+        try:
+            wait = ARK_QUEUE_TIMEOUT if timeout is None else max(0.0, min(ARK_QUEUE_TIMEOUT, timeout))
+            done, _ = await asyncio.wait((future,), timeout=wait)
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+        if not done:
+            self._abandon(future)
+            raise self._reject("queue_timeout")
+        return Permit(self)
+
+    def _abandon(self, future: asyncio.Future):
+        """放弃排队：已经分到名额时归还，否则移出队列"""
+        if future.done() and not future.cancelled():
+            self.release(None, False)
+        elif future in self._waiters:
+            self._waiters.remove(future)
+            self._publish()
+
+    def _can_grant(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        return self.in_flight < self.config.minimum or _total_in_flight < ARK_MAX_CONCURRENCY
+
+    def _grant(self):
+        global _total_in_flight
+        self.in_flight += 1
+        _total_in_flight += 1
+
+    def release(self, latency: Optional[float], overloaded: bool):
+        global _total_in_flight
+        self.in_flight -= 1
+        _total_in_flight -= 1
+        if overloaded:
+            self._decrease()
+        elif latency is not None:
+            self._observe(latency)
+        self._publish()
+        # 空出的名额可能属于总上限，其他 lane 的排队请求也可能因此可以继续
+        _wake_all()
+
+    def _observe(self, latency: float):
+        if self._short is None:
+            self._short = self._long = latency
+        else:
+            self._short += SHORT_EWMA_ALPHA * (latency - self._short)
+            self._long += LONG_EWMA_ALPHA * (latency - self._long)
+
+        if self._short > self._long * ARK_LIMIT_LATENCY_TOLERANCE:
+            self._decrease()
+        elif self.in_flight + 1 >= int(self.limit):
+            # 名额已用满且延迟平稳：每完成一轮（limit 次调用）上限加 1
+            self.limit = min(float(self.config.maximum), self.limit + 1.0 / self.limit)
+
+    def _decrease(self):
+        # 同一轮调用中的多次过载信号只退避一次
+        now = time.monotonic()
+        if now - self._last_decrease < (self._short or 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.config.minimum), self.limit * ARK_LIMIT_BACKOFF)
+
+    def _wake_one(self) -> bool:
+        """名额允许时唤醒队首的一个排队请求，返回是否唤醒"""
+        while self._waiters and self._can_grant():
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self._grant()
+            future.set_result(None)
+            self._publish()
+            return True
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "latency_short": round(self._short, 3) if self._short is not None else None,
+            "latency_baseline": round(self._long, 3) if self._long is not None else None,
+            "shed": self.shed
+        }
+
+
+_limiters: Dict[Tuple[str, str], AdaptiveLimiter] = {}
+_wake_offset = 0
+
+
+def _wake_all():
+    """按轮转顺序唤醒各 lane 的排队请求，每轮每个 lane 至多一个，空出的总名额不会被单个 lane 独占"""
+    global _wake_offset
+    limiters = list(_limiters.values())
+    if not limiters:
+        return
+    _wake_offset = (_wake_offset + 1) % len(limiters)
+    limiters = limiters[_wake_offset:] + limiters[:_wake_offset]
+    woke = True
+    while woke:
+        woke = False
+        for limiter in limiters:
+            woke = limiter._wake_one() or woke
+
+
+def get_limiter(endpoint: str, mode: str = "") -> AdaptiveLimiter:
+    key = (endpoint, mode)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        lane = f"{endpoint}:{mode}" if mode else endpoint
+        limiter = _limiters[key] = AdaptiveLimiter(lane, lane_config(endpoint, mode))
+    return limiter
+
+
+def current_limiter() -> AdaptiveLimiter:
+    """当前请求（接口和模式取自请求指标上下文）所属 lane 的限流器"""
+    request = current_request()
+    if request is None:
+        return get_limiter(OTHER_ENDPOINT)
+    return get_limiter(request.endpoint, request.mode)
+
+
+async def acquire_ark_permit(timeout: Optional[float] = None) -> Permit:
+    """
+    为当前请求获取 Ark 调用名额，排队时间记为 ark_lane_wait 阶段
+
+    Args:
+        timeout: 最长等待时间（秒），为空时为 ARK_QUEUE_TIMEOUT
+
+    Raises:
+        ArkOverloaded: 该 lane 过载或等待超时（本地排队，不计入熔断）
+    """
+    start = time.perf_counter()
+    try:
+        return await current_limiter().acquire(timeout)
+    finally:
+        record_stage("ark_lane_wait", time.perf_counter() - start)
+
+
+def lane_stats() -> Dict[str, Any]:
+    return {limiter.lane: limiter.stats() for limiter in _limiters.values()}
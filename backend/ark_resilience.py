@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Ark 调用的容错策略
+每次调用有总时限（含排队和重试）；超时、连接失败、限流和 5xx 这类与请求内容无关的失败
+以带抖动的指数退避重试；同一模型连续失败达到阈值后熔断，熔断期间的调用立即失败，
+不再排队等待注定超时的请求，到期后放行一个探测调用，成功则恢复。
+只有 Ark 请求本身的失败计入熔断，本地排队等待用完时限时不重试、不计入熔断。
+调用最终失败时抛出 ArkUnavailable：图片分析接口据此返回 degraded: true 的降级结果，
+文档解析接口返回 503 和 Retry-After
+"""
+
+import os
+import math
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, Any
+
+from fastapi import HTTPException
+from openai import APIConnectionError, RateLimitError, InternalServerError
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# 单次调用的总时限（秒，含排队和重试），思考模型生成时间较长
+ARK_CALL_DEADLINE = float(os.getenv("ARK_CALL_DEADLINE", "45"))
+ARK_THINKING_CALL_DEADLINE = float(os.getenv("ARK_THINKING_CALL_DEADLINE", "150"))
+
+# 重试次数（不含首次调用）和退避时间（秒）：第 n 次重试前等待 [0, min(最大值, 基数 * 2^n)] 内的随机时间
+ARK_MAX_RETRIES = int(os.getenv("ARK_MAX_RETRIES", "2"))
+ARK_RETRY_BASE_DELAY = float(os.getenv("ARK_RETRY_BASE_DELAY", "0.5"))
+ARK_RETRY_MAX_DELAY = float(os.getenv("ARK_RETRY_MAX_DELAY", "8"))
+
+# 同一模型连续失败多少次后熔断，以及熔断持续时间（秒）
+ARK_BREAKER_FAILURE_THRESHOLD = int(os.getenv("ARK_BREAKER_FAILURE_THRESHOLD", "5"))
+ARK_BREAKER_RESET_TIMEOUT = float(os.getenv("ARK_BREAKER_RESET_TIMEOUT", "30"))
+
+
+class ArkCallTimeout(Exception):
+    """Ark 在剩余时限内没有响应。只用于已经发出的 Ark 请求，本地排队等待超时不属于此类"""
+
+
+# 可以重试的失败：请求未送达、Ark 响应超时、限流或服务端错误，与请求内容无关，重试不会产生不同的副作用。
+# 参数错误、鉴权失败等 4xx 直接抛出
+RETRYABLE_ERRORS = (APIConnectionError, RateLimitError, InternalServerError, ArkCallTimeout)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+circuit_state = registry.gauge("ark_circuit_state", "Ark 熔断状态（0 关闭，1 半开，2 打开）", ("model",))
+circuit_rejections = registry.counter("ark_circuit_rejections_total", "熔断期间被立即拒绝的调用数", ("model",))
+ark_retries = registry.counter("ark_retries_total", "Ark 调用的重试次数", ("model", "error"))
+
+
+class ArkUnavailable(HTTPException):
+    """
+    Ark 调用最终失败
+
+    reason: circuit_open（熔断中）、deadline（超过总时限）或 unavailable（重试用尽）
+    """
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(
+            status_code=503,
+            detail="分析服务暂时不可用，请稍后重试",
+            headers={"Retry-After": str(retry_after)}
+        )
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def deadline_for(model: str) -> float:
+    """按模型返回默认的调用总时限"""
+    return ARK_THINKING_CALL_DEADLINE if "thinking" in model else ARK_CALL_DEADLINE
+
+
+def retry_delay(attempt: int, error: BaseException) -> float:
+    """
+    第 attempt 次重试（从 0 开始）前的等待时间：全抖动指数退避，
+    限流响应带有 Retry-After 时至少等待该时间
+    """
+    delay = random.uniform(0, min(ARK_RETRY_MAX_DELAY, ARK_RETRY_BASE_DELAY * 2 ** attempt))
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", "")))
+        except ValueError:
+            pass
+    return delay
+
+
+class CircuitBreaker:
+    """
+    单个模型的熔断器（只在事件循环线程中使用）
+
+    排队获取并发名额之前调用 check()，熔断中的调用立即失败而不必排队；
+    获得名额后调用 before_call() 占用半开状态的探测名额，结束时调用 record_success()、
+    record_failure() 之一，被取消或因请求本身出错时调用 release()；release() 可以在前两者之后重复调用
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self._publish()
+
+    def _publish(self):
+        circuit_state.set(self.model, value=_STATE_VALUES[self.state])
+
+    def retry_after(self) -> int:
+        """距离熔断结束的秒数，未熔断时为 1"""
+        if self.state != OPEN:
+            return 1
+        remaining = self.opened_at + ARK_BREAKER_RESET_TIMEOUT - time.monotonic()
+        return max(1, math.ceil(remaining))
+
+    def _refresh(self):
+        if self.state == OPEN and time.monotonic() - self.opened_at >= ARK_BREAKER_RESET_TIMEOUT:
+            self.state = HALF_OPEN
+            self._publish()
+            logger.info("Ark 熔断到期，放行探测调用 - model: %s", self.model)
+
+    def _reject(self) -> ArkUnavailable:
+        self.rejected += 1
+        circuit_rejections.inc(self.model)
+        return ArkUnavailable("circuit_open", self.retry_after())
+
+    def check(self):
+        """
+        排队前检查，不占用探测名额
+
+        Raises:
+            ArkUnavailable: 熔断中，或半开状态下已有探测调用在进行
+        """
+        self._refresh()
+        if self.state == OPEN or (self.state == HALF_OPEN and self._probing):
+            raise self._reject()
+
+    def before_call(self) -> bool:
+        """
+        Returns:
+            本次调用是否为半开状态下的探测调用
+
+        Raises:
+            ArkUnavailable: 熔断中，或半开状态下已有探测调用在进行
+        """
+        self._refresh()
+        if self.state == CLOSED:
+            return False
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        raise self._reject()
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info("Ark 调用恢复，关闭熔断 - model: %s", self.model)
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+        self._publish()
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= ARK_BREAKER_FAILURE_THRESHOLD:
+            if self.state != OPEN:
+                logger.error("Ark 连续失败 %s 次，熔断 %ss - model: %s",
+                             self.failures, ARK_BREAKER_RESET_TIMEOUT, self.model)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._publish()
+
+    def release(self, probe: bool):
+        """调用未得出 Ark 是否可用的结论（被取消、参数错误），归还半开状态的探测名额"""
+        if probe:
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_after": self.retry_after() if self.state == OPEN else None,
+            "rejected": self.rejected
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def breaker_for(model: str) -> CircuitBreaker:
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers[model] = CircuitBreaker(model)
+    return breaker
+
+
+def check_circuit(model: str):
+    """
+    在获取并发名额之前检查模型是否熔断（流式接口在返回响应之前调用）
+
+    Raises:
+        ArkUnavailable: 熔断中
+    """
+    breaker_for(model).check()
+
+
+def breaker_stats() -> Dict[str, Any]:
+    return {model: breaker.stats() for model, breaker in _breakers.items()}
+
+
+async def wait_for_ark(awaitable, expires: float):
+    """
+    在剩余时限内等待 Ark 的响应
+
+    Raises:
+        ArkCallTimeout: 超过时限
+    """
+    try:
+        return await asyncio.wait_for(awaitable, expires - time.monotonic())
+    except asyncio.TimeoutError as e:
+        raise ArkCallTimeout("Ark 未在时限内响应") from e
+
+
+def check_local_deadline(expires: float, breaker: CircuitBreaker):
+    """
+    发出 Ark 请求前检查剩余时限。时限在本地排队中已经用完时 Ark 并未参与，
+    不计入熔断，也不重试
+
+    Raises:
+        ArkUnavailable: 剩余时限已用完
+    """
+    if time.monotonic() < expires:
+        return
+    logger.warning("Ark 调用时限在本地排队中用完，未发出请求 - model: %s", breaker.model)
+    raise ArkUnavailable("deadline", breaker.retry_after())
+
+
+def unavailable(error: BaseException, expires: float, breaker: CircuitBreaker) -> ArkUnavailable:
+    """重试用尽或超过总时限时记为一次失败，返回要抛出的 ArkUnavailable"""
+    breaker.record_failure()
+    reason = "deadline" if time.monotonic() >= expires or isinstance(error, ArkCallTimeout) else "unavailable"
+    logger.error("Ark 调用失败，放弃重试 - model: %s, reason: %s, error: %r", breaker.model, reason, error)
+    return ArkUnavailable(reason, breaker.retry_after())
+
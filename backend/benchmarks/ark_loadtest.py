@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Ark 调用并发压测
+启动一个本地 Ark 桩服务（固定延迟返回），再以不同并发客户端数压测后端，
+验证吞吐量随并发数增长而不是保持不变
+
+用法:
+    cd backend && python benchmarks/ark_loadtest.py --delay 0.5 --requests 32
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import threading
+
+import json
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def build_stub_ark(delay: float) -> FastAPI:
+    """构建模拟 Ark chat.completions 接口的桩服务"""
+    stub = FastAPI()
+
+    @stub.post("/api/v3/chat/completions")
+    async def chat_completions(body: dict):
+        if body.get("stream"):
+            return StreamingResponse(stream_chunks(body), media_type="text/event-stream")
+        await asyncio.sleep(delay)
+        return {
+            "id": "stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": '{"events": [], "summary": {}}'}
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }
+
+    async def stream_chunks(body: dict):
+        """把固定输出拆成若干片段，在 delay 时间内逐段发送"""
+        pieces = ['{"events": ', '[], ', '"summary": ', '{}}']
+        for piece in pieces:
+            await asyncio.sleep(delay / len(pieces))
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return stub
+
+
+def serve_in_thread(app, port: int) -> uvicorn.Server:
+    """在后台线程中启动 uvicorn，并等待其就绪"""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run_level(base_url: str, concurrency: int, total: int) -> float:
+    """以指定并发数发送 total 个请求，返回吞吐量（请求/秒）"""
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker(client: httpx.AsyncClient):
+        while not queue.empty():
+            queue.get_nowait()
+            response = await client.post(
+                f"{base_url}/analyze-document",
+                json={"prompt": "2025-10-13 19:50:51 猫在观望", "analysis_type": "text_analysis"}
+            )
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=60) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ark 调用并发压测")
+    parser.add_argument("--delay", type=float, default=0.5, help="桩服务每次调用的延迟（秒）")
+    parser.add_argument("--requests", type=int, default=32, help="每个并发级别的请求数")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="并发客户端数列表")
+    args = parser.parse_args()
+
+    stub_port = _free_port()
+    serve_in_thread(build_stub_ark(args.delay), stub_port)
+
+    os.environ["ARK_API_KEY"] = "stub-key"
+    os.environ["ARK_BASE_URL"] = f"http://127.0.0.1:{stub_port}/api/v3"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import logging
+    logging.disable(logging.INFO)
+    from main import app
+
+    app_port = _free_port()
+    serve_in_thread(app, app_port)
+    base_url = f"http://127.0.0.1:{app_port}"
+
+    print(f"桩服务延迟: {args.delay}s, 每级请求数: {args.requests}")
+    print(f"{'并发数':>6} {'吞吐量(req/s)':>14}")
+    for level in (int(x) for x in args.levels.split(",")):
+        throughput = asyncio.run(run_level(base_url, level, args.requests))
+        print(f"{level:>6} {throughput:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
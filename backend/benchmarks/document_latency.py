@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+/analyze-document 端到端延迟与文档大小的关系
+本地 Ark 桩服务按输入中的事件数生成输出，耗时 = 基础延迟 + 事件数 x 单事件生成耗时，
+模拟模型输出时间与事件数成正比；分别测量单次整体解析与按时间戳分段并行解析的耗时
+
+用法:
+    cd backend && python benchmarks/document_latency.py --sizes 12,50,100,200
+"""
+
+import os
+import re
+import sys
+import time
+import json
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ark_loadtest import serve_in_thread, _free_port
+
+TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}")
+
+
+def build_event_stub(base_delay: float, per_event_delay: float) -> FastAPI:
+    """按输入中的时间戳数量生成事件的 Ark 桩服务"""
+    stub = FastAPI()
+
+    @stub.post("/api/v3/chat/completions")
+    async def chat_completions(body: dict):
+        timestamps = TIMESTAMP.findall(body["messages"][-1]["content"])
+        await asyncio.sleep(base_delay + per_event_delay * len(timestamps))
+        events = [
+            {"timestamp": ts.replace(" ", "T"), "title": "观望行为", "content": "猫在观望",
+             "category": "observe", "confidence": 0.9}
+            for ts in timestamps
+        ]
+        content = json.dumps({"events": events, "summary": {"total_events": len(events)}}, ensure_ascii=False)
+        return {
+            "id": "stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        }
+
+    return stub
+
+
+def make_document(events: int) -> str:
+    """生成与 document_content.txt 相同格式的监控文档"""
+    start = datetime(2025, 10, 13, 19, 50, 51)
+    parts = []
+    for i in range(events):
+        ts = (start + timedelta(seconds=5 * i)).strftime("%Y-%m-%d %H:%M:%S")
+        parts.append(
+            f'{ts}observe0.5```json\n{{\n"category": "观望",\n"confidence": 0.9,\n'
+            f'"reasons": "猫站立在室内，头部朝向左侧，姿态警觉，表现出观望行为。"\n}}\n```'
+        )
+    return "timestampcategoryconfidencereasons" + "".join(parts)
+
+
+def measure(base_url: str, document: str) -> float:
+    start = time.perf_counter()
+    response = httpx.post(f"{base_url}/analyze-document",
+                          json={"prompt": document, "analysis_type": "text_analysis"}, timeout=600)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/analyze-document 延迟与文档大小")
+    parser.add_argument("--sizes", default="12,50,100,200", help="文档事件数列表")
+    parser.add_argument("--base-delay", type=float, default=0.3, help="每次调用的基础延迟（秒）")
+    parser.add_argument("--per-event", type=float, default=0.02, help="每个事件的生成耗时（秒）")
+    args = parser.parse_args()
+
+    stub_port = _free_port()
+    serve_in_thread(build_event_stub(args.base_delay, args.per_event), stub_port)
+
+    os.environ["ARK_API_KEY"] = "stub-key"
+    os.environ["ARK_BASE_URL"] = f"http://127.0.0.1:{stub_port}/api/v3"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import logging
+    logging.disable(logging.INFO)
+    import main as backend
+
+    app_port = _free_port()
+    serve_in_thread(backend.app, app_port)
+    base_url = f"http://127.0.0.1:{app_port}"
+    chunk_settings = (backend.DOCUMENT_CHUNK_MAX_CHARS, backend.DOCUMENT_CHUNK_MAX_EVENTS)
+
+    print(f"桩服务: 基础延迟 {args.base_delay}s + 每事件 {args.per_event}s")
+    print(f"{'事件数':>6} {'字符数':>8} {'整体解析(s)':>12} {'分段并行(s)':>12}")
+    for size in (int(x) for x in args.sizes.split(",")):
+        document = make_document(size)
+
+        backend.DOCUMENT_CHUNK_MAX_CHARS = backend.DOCUMENT_CHUNK_MAX_EVENTS = 10 ** 9
+        single = measure(base_url, document)
+        backend.DOCUMENT_CHUNK_MAX_CHARS, backend.DOCUMENT_CHUNK_MAX_EVENTS = chunk_settings
+        chunked = measure(base_url, document)
+
+        print(f"{size:>6} {len(document):>8} {single:>12.2f} {chunked:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
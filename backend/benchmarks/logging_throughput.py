@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+日志开销对请求吞吐量的影响
+本地 Ark 桩服务立即返回与文档事件数相同的事件 JSON，后端在子进程中运行（stderr 写入临时文件，
+模拟日志采集），以不同日志配置并发压测 /analyze-history-text，报告吞吐量和写出的日志量
+
+    off    LOG_LEVEL=WARNING
+    info   LOG_LEVEL=INFO（默认配置：JSON 队列日志，模型输出抽样预览）
+    debug  LOG_LEVEL=DEBUG（完整模型输出和逐事件明细）
+
+用法:
+    cd backend && python benchmarks/logging_throughput.py --events 200 --requests 400 --concurrency 16
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ark_loadtest import serve_in_thread, _free_port
+from document_latency import build_event_stub
+
+MODES = {
+    "off": {"LOG_LEVEL": "WARNING"},
+    "info": {"LOG_LEVEL": "INFO"},
+    "debug": {"LOG_LEVEL": "DEBUG"},
+}
+
+
+def make_free_text(events: int) -> str:
+    """生成不符合结构化监控格式的自由文本，保证请求交由模型（桩服务）解析"""
+    lines = []
+    for i in range(events):
+        minute, second = divmod(i * 5, 60)
+        hour, minute = divmod(minute, 60)
+        lines.append(f"2025-10-13 {19 + hour:02d}:{minute:02d}:{second:02d} 猫在窗边观望，尾巴轻轻摆动。")
+    return "\n".join(lines)
+
+
+def serve_backend(port: int):
+    """子进程入口：以与生产相同的方式启动后端"""
+    sys.path.insert(0, BACKEND)
+    import uvicorn
+    import main as backend
+    uvicorn.run(backend.app, host="127.0.0.1", port=port, log_config=None, access_log=True)
+
+
+def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"后端未能在 {timeout}s 内启动")
+
+
+async def run_load(base_url: str, document: str, concurrency: int, total: int) -> float:
+    """以指定并发数发送 total 个请求，返回吞吐量（请求/秒）"""
+    remaining = total
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            response = await client.post(
+                f"{base_url}/analyze-history-text",
+                json={"prompt": document, "analysis_type": "text_analysis"}
+            )
+            response.raise_for_status()
+
+    async with httpx.AsyncClient(timeout=60) as client:
+        # 预热：建立连接、加载模块
+        await client.post(f"{base_url}/analyze-history-text", json={"prompt": document})
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200, help="每个文档（及模型输出）中的事件数")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--modes", default="off,info,debug", help="日志配置列表")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_backend(args.serve)
+        return
+
+    stub_port = _free_port()
+    serve_in_thread(build_event_stub(0, 0), stub_port)
+    document = make_free_text(args.events)
+
+    print(f"每个请求 {args.events} 个事件（{len(document)} 字符），{args.requests} 个请求，并发 {args.concurrency}")
+    print(f"{'日志配置':>8} {'吞吐量(req/s)':>14} {'日志量(KB/请求)':>16}")
+    for mode in args.modes.split(","):
+        port = _free_port()
+        env = dict(os.environ, ARK_API_KEY="stub-key", ARK_BASE_URL=f"http://127.0.0.1:{stub_port}/api/v3",
+                   **MODES[mode])
+        with tempfile.TemporaryFile() as log_file:
+            process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+                                       cwd=BACKEND, env=env, stdout=log_file, stderr=log_file)
+            try:
+                wait_for_port(port)
+                throughput = asyncio.run(run_load(f"http://127.0.0.1:{port}", document,
+                                                  args.concurrency, args.requests))
+            finally:
+                process.terminate()
+                process.wait()
+            log_kb = log_file.tell() / 1024 / (args.requests + 1)
+        print(f"{mode:>8} {throughput:>14.1f} {log_kb:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+/timeline 分页查询 vs 下载并解析整个 timeline_data.json
+在合成事件存储上测量建立索引和各类查询（时间窗口、类别过滤、游标翻页、从新到旧）的耗时，
+并与解析同等规模 timeline_data.json（按小样本折算）的耗时对比
+
+用法:
+    cd backend && python benchmarks/timeline_query.py --events 6307200
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(os.path.dirname(BACKEND), "benchmarks"))
+from event_store_load import make_synthetic_store
+from timeline_index import TimelineIndexLoader
+from petlog.exports import timeline_item
+from petlog.timeline import parse_time
+
+
+def timed(label, func, repeat=200):
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {label:28s} {elapsed * 1000:8.2f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=365 * 24 * 720, help="事件数（默认一年 5 秒一帧）")
+    parser.add_argument("--json-events", type=int, default=50_000, help="timeline_data.json 对照组的事件数")
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="timeline_bench_")
+    try:
+        store_path = os.path.join(workdir, "events.store")
+        make_synthetic_store(args.events).save(store_path)
+        loader = TimelineIndexLoader(store_path)
+
+        start = time.perf_counter()
+        index = loader.get()
+        print(f"{args.events} 条事件，首次加载并建立索引 {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        # 查询结果为空时返回空页而不是报错
+        end = parse_time("2100-01-01")
+        assert index.query(end, limit=args.limit) == {"items": [], "next_cursor": None, "total": 0}
+        assert index.query(categories=["no_such_category"], limit=args.limit)["items"] == []
+
+        day = parse_time("2025-06-01")
+        timed("最新一页（desc）", lambda: index.query(limit=args.limit, descending=True))
+        timed("一天内的第一页", lambda: index.query(day, day + 86400, limit=args.limit))
+        timed("一天内 + 两个类别", lambda: index.query(day, day + 86400, ["play", "attack"], limit=args.limit))
+        page = index.query(day, day + 86400, limit=args.limit)
+        timed("游标翻页", lambda: index.query(day, day + 86400, cursor=page["next_cursor"], limit=args.limit))
+        timed("检查事件存储是否变化", loader.get, repeat=2000)
+
+        json_path = os.path.join(workdir, "timeline_data.json")
+        sample = make_synthetic_store(args.json_events)
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"timeline": [timeline_item(record) for record in sample.iter_records()]}, f,
+                      ensure_ascii=False, indent=2)
+        start = time.perf_counter()
+        with open(json_path, "r", encoding="utf-8") as f:
+            json.load(f)
+        elapsed = time.perf_counter() - start
+        size_mb = os.path.getsize(json_path) / 1024 / 1024
+        print(f"timeline_data.json: {args.json_events} 条 {size_mb:.0f} MB，解析 {elapsed * 1000:.0f} ms；"
+              f"按比例折算 {args.events} 条约 {size_mb * args.events / args.json_events / 1024:.1f} GB、"
+              f"{elapsed * args.events / args.json_events:.0f} s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+上传图片处理的峰值内存压测
+对比旧流程（await file.read() 整体读入 + 全尺寸解码 + LANCZOS 缩放）与
+当前流程（从 multipart 临时文件直接 draft 解码），统计每个并发请求带来的峰值 RSS 增量
+
+用法:
+    cd backend && python benchmarks/upload_memory.py --concurrency 1,4,8
+"""
+
+import os
+import sys
+import json
+import base64
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from io import BytesIO
+
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb() -> float:
+    """进程峰值 RSS（MB），Linux 下 ru_maxrss 单位为 KB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def legacy_pipeline(path: str):
+    """旧流程：整体读入字节后全尺寸解码并用 LANCZOS 缩放"""
+    with open(path, "rb") as f:
+        image_bytes = f.read()
+    image = Image.open(BytesIO(image_bytes))
+    image.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def current_pipeline(path: str):
+    """当前流程：从临时文件直接增量解码"""
+    from image_pipeline import preprocess_image
+    with open(path, "rb") as f:
+        return preprocess_image(f, "normal")
+
+
+def run_worker(variant: str, path: str, concurrency: int):
+    """子进程入口：并发执行一种流程并输出每请求的峰值 RSS 增量"""
+    sys.path.insert(0, BACKEND_DIR)
+    pipeline = legacy_pipeline if variant == "legacy" else current_pipeline
+    # 用小图预热一次，排除模块导入和解码器初始化的开销
+    with tempfile.NamedTemporaryFile(suffix=".jpg") as warmup:
+        Image.new("RGB", (64, 64)).save(warmup, format="JPEG")
+        warmup.flush()
+        pipeline(warmup.name)
+    baseline = peak_rss_mb()
+
+    barrier = threading.Barrier(concurrency)
+
+    def request():
+        barrier.wait()
+        pipeline(path)
+
+    threads = [threading.Thread(target=request) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(json.dumps({"per_request_mb": (peak_rss_mb() - baseline) / concurrency}))
+
+
+def make_photo(path: str) -> float:
+    """生成 4000x3000 的高噪声 JPEG（约 12 MB），模拟手机原图，返回文件大小（MB）"""
+    Image.effect_noise((4000, 3000), 90).convert("RGB").save(path, format="JPEG", quality=95)
+    return os.path.getsize(path) / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上传图片处理峰值内存压测")
+    parser.add_argument("--concurrency", default="1,4,8", help="并发请求数列表")
+    parser.add_argument("--worker", nargs=3, metavar=("VARIANT", "PATH", "N"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        variant, path, concurrency = args.worker
+        run_worker(variant, path, int(concurrency))
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
+        path = tmp.name
+    try:
+        size_mb = make_photo(path)
+        print(f"测试图片: 4000x3000 JPEG, {size_mb:.1f} MB")
+        print(f"{'并发数':>6} {'旧流程(MB/请求)':>16} {'当前流程(MB/请求)':>18}")
+        for level in (int(x) for x in args.concurrency.split(",")):
+            row = []
+            for variant in ("legacy", "current"):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--worker", variant, path, str(level)],
+                    capture_output=True, text=True, check=True
+                ).stdout
+                row.append(json.loads(output)["per_request_mb"])
+            print(f"{level:>6} {row[0]:>16.1f} {row[1]:>18.1f}")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
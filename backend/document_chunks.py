@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+长文档分段解析
+按时间戳边界把文档拆成若干段，使每段的事件数和长度都在单次模型输出的预算之内，
+各段并行解析后再合并 events 并重新计算 summary
+"""
+
+import re
+import json
+import logging
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# 事件起始时间戳，例如 2025-10-13 19:50:51、2024-01-15T14:30
+TIMESTAMP_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2})?")
+
+# 模型输出中可能包裹的 ```json 代码块
+JSON_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+
+def _split_segments(content: str) -> List[str]:
+    """按时间戳拆分为单个事件片段，没有时间戳时按空行拆分段落"""
+    starts = [match.start() for match in TIMESTAMP_PATTERN.finditer(content)]
+    if not starts:
+        return [part for part in re.split(r"\n\s*\n", content) if part.strip()]
+
+    # 第一个时间戳之前的内容（如表头）并入第一段
+    starts[0] = 0
+    starts.append(len(content))
+    return [content[starts[i]:starts[i + 1]] for i in range(len(starts) - 1)]
+
+
+def split_document(content: str, max_chars: int, max_events: int) -> List[str]:
+    """
+    将文档拆分为不超过预算的若干段
+
+    Args:
+        content: 原始文档内容
+        max_chars: 每段的最大字符数（单个超长事件单独成段）
+        max_events: 每段最多包含的事件片段数
+
+    Returns:
+        按原始顺序排列的分段文本
+    """
+    if len(content) <= max_chars and len(TIMESTAMP_PATTERN.findall(content)) <= max_events:
+        return [content]
+
+    chunks = []
+    current: List[str] = []
+    current_chars = 0
+
+    for segment in _split_segments(content):
+        if current and (current_chars + len(segment) > max_chars or len(current) >= max_events):
+            chunks.append("".join(current))
+            current, current_chars = [], 0
+        current.append(segment)
+        current_chars += len(segment)
+
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def extract_json(text: str) -> Dict[str, Any]:
+    """
+    从模型输出中提取 JSON 对象，兼容 ```json 代码块包裹
+
+    Raises:
+        ValueError: 输出不是 JSON，或顶层不是对象（json.JSONDecodeError 也是 ValueError）
+    """
+    if not isinstance(text, str):
+        raise ValueError("模型输出为空")
+    fenced = JSON_FENCE_PATTERN.search(text)
+    parsed = json.loads(fenced.group(1) if fenced else text)
+    if not isinstance(parsed, dict):
+        raise ValueError(f"顶层应为 JSON 对象，实际为 {type(parsed).__name__}")
+    return parsed
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return round(sum(values) / len(values), 3) if values else None
+
+
+def merge_parsed_chunks(parsed_chunks: List[Dict[str, Any]], notes: List[str]) -> Dict[str, Any]:
+    """
+    合并各段的解析结果并重新计算 summary
+
+    Args:
+        parsed_chunks: 每段模型输出解析得到的 JSON 对象
+        notes: 额外的解析说明（如某段解析失败）
+
+    Returns:
+        与单次解析相同结构的 {"events": [...], "summary": {...}}
+    """
+    events = []
+    for i, parsed in enumerate(parsed_chunks):
+        # 模型输出的结构不可信：events 不是列表、事件不是对象时跳过并记录，不影响其他分段
+        chunk_events = parsed.get("events", []) if isinstance(parsed, dict) else None
+        if not isinstance(chunk_events, list):
+            logger.warning("第 %s 段解析结果缺少 events 列表，已跳过", i + 1)
+            notes.append(f"第 {i + 1} 段解析结果格式不正确，已跳过")
+            continue
+        malformed = sum(1 for event in chunk_events if not isinstance(event, dict))
+        if malformed:
+            notes.append(f"第 {i + 1} 段有 {malformed} 个事件格式不正确，已跳过")
+        events.extend(event for event in chunk_events if isinstance(event, dict))
+
+        summary = parsed.get("summary")
+        chunk_note = summary.get("parsing_notes") if isinstance(summary, dict) else None
+        if chunk_note:
+            notes.append(str(chunk_note))
+
+    # 时间戳为 ISO 格式，字符串排序即时间排序；缺失时间戳的事件保持原有相对顺序排在最后
+    events.sort(key=lambda event: (not event.get("timestamp"), str(event.get("timestamp") or "")))
+
+    timestamps = [str(event["timestamp"]) for event in events if event.get("timestamp")]
+    confidences = [
+        float(event["confidence"]) for event in events
+        if isinstance(event.get("confidence"), (int, float))
+    ]
+    categories = list(dict.fromkeys(
+        event["category"] for event in events if isinstance(event.get("category"), str) and event["category"]
+    ))
+
+    return {
+        "events": events,
+        "summary": {
+            "total_events": len(events),
+            "time_range": {
+                "start": timestamps[0] if timestamps else None,
+                "end": timestamps[-1] if timestamps else None
+            },
+            "categories": categories,
+            "confidence_avg": _mean(confidences),
+            "parsing_notes": "；".join(notes)
+        }
+    }
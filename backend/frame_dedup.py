@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+近重复帧去重
+持续监控模式下摄像头约每 5 秒上传一帧，相邻帧大多几乎相同（no_pet、neutral）。
+这里对每帧计算 64 位 dHash，与同一设备最近的若干帧比较汉明距离，
+足够接近时直接复用之前的分析结果，跳过 Ark 调用。
+只对显式传入 device_id 的请求去重：同一 NAT 或反向代理后的多台设备共用客户端地址，
+按地址去重会把一台设备的分析结果复用给另一台；默认只在宠物监控模式下启用
+"""
+
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Union, BinaryIO
+
+import numpy as np
+from PIL import Image
+
+from image_pipeline import as_binary_stream
+
+logger = logging.getLogger(__name__)
+
+FRAME_DEDUP_ENABLED = os.getenv("FRAME_DEDUP_ENABLED", "true").lower() == "true"
+# 判定为近重复帧的最大汉明距离（64 位哈希）
+FRAME_DEDUP_MAX_DISTANCE = int(os.getenv("FRAME_DEDUP_MAX_DISTANCE", "6"))
+# 每个设备保留的最近帧数量
+FRAME_DEDUP_WINDOW = int(os.getenv("FRAME_DEDUP_WINDOW", "8"))
+# 可复用结果的最长时间（秒），超过后即使画面相同也重新分析
+FRAME_DEDUP_MAX_AGE = float(os.getenv("FRAME_DEDUP_MAX_AGE", "300"))
+FRAME_DEDUP_MAX_DEVICES = int(os.getenv("FRAME_DEDUP_MAX_DEVICES", "1024"))
+# 启用去重的分析模式（逗号分隔）
+FRAME_DEDUP_MODES = {
+    mode.strip() for mode in os.getenv("FRAME_DEDUP_MODES", "pet").split(",") if mode.strip()
+}
+
+HASH_SIZE = 8
+
+
+def dedup_applies(device_id: str, mode: str) -> bool:
+    """请求是否参与近重复帧去重：需要启用、传入设备标识且模式在 FRAME_DEDUP_MODES 中"""
+    return FRAME_DEDUP_ENABLED and bool(device_id) and mode in FRAME_DEDUP_MODES
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """逐元素统计 uint64 中置位的比特数"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    bits = np.unpackbits(values.view(np.uint8)).reshape(-1, 64)
+    return bits.sum(axis=1)
+
+
+def compute_dhash(source: Union[bytes, BinaryIO]) -> int:
+    """
+    计算图片的 64 位差值哈希（dHash）
+
+    JPEG 通过 draft 模式直接以缩小尺寸解码灰度图，再缩放到 9x8，
+    用 NumPy 一次比较相邻像素得到 64 个比特
+    """
+    image = Image.open(as_binary_stream(source))
+    image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+    image = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR)
+
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class _DeviceRing:
+    """单个设备最近帧的定长环形缓冲"""
+
+    def __init__(self, size: int):
+        self.hashes = np.zeros(size, dtype=np.uint64)
+        self.mode_ids = np.full(size, -1, dtype=np.int16)
+        self.seen_at = np.zeros(size, dtype=np.float64)
+        self.results = [None] * size
+        self.pos = 0
+
+
+class FrameDeduplicator:
+    """按设备维护近期帧哈希索引，查找可复用的分析结果"""
+
+    def __init__(self, max_distance: int, window: int, max_age: float, max_devices: int):
+        self.max_distance = max_distance
+        self.window = window
+        self.max_age = max_age
+        self.max_devices = max_devices
+        self._devices: "OrderedDict[str, _DeviceRing]" = OrderedDict()
+        self._mode_ids: Dict[str, int] = {}
+
+        self.reused = 0
+        self.analyzed = 0
+
+    def _mode_id(self, mode: str) -> int:
+        return self._mode_ids.setdefault(mode, len(self._mode_ids))
+
+    def lookup(self, device_id: str, mode: str, frame_hash: int) -> Optional[Dict[str, Any]]:
+        """
+        查找同一设备、同一模式下的近重复帧
+
+        Returns:
+            命中时返回 {"result", "distance", "age_seconds"}，否则返回 None
+        """
+        ring = self._devices.get(device_id)
+        if ring is None:
+            return None
+        self._devices.move_to_end(device_id)
+
+        now = time.time()
+        distances = _popcount(ring.hashes ^ np.uint64(frame_hash)).astype(np.int16)
+        candidates = (
+            (ring.mode_ids == self._mode_id(mode))
+            & (now - ring.seen_at <= self.max_age)
+            & (distances <= self.max_distance)
+        )
+        if not candidates.any():
+            return None
+
+        distances = np.where(candidates, distances, np.iinfo(np.int16).max)
+        best = int(np.argmin(distances))
+        self.reused += 1
+        return {
+            "result": ring.results[best],
+            "distance": int(distances[best]),
+            "age_seconds": round(now - float(ring.seen_at[best]), 1)
+        }
+
+    def record(self, device_id: str, mode: str, frame_hash: int, result: str):
+        """记录一次真实分析的帧哈希和结果"""
+        ring = self._devices.get(device_id)
+        if ring is None:
+            ring = self._devices[device_id] = _DeviceRing(self.window)
+            while len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+        self._devices.move_to_end(device_id)
+
+        slot = ring.pos
+        ring.hashes[slot] = frame_hash
+        ring.mode_ids[slot] = self._mode_id(mode)
+        ring.seen_at[slot] = time.time()
+        ring.results[slot] = result
+        ring.pos = (slot + 1) % self.window
+        self.analyzed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """去重统计"""
+        total = self.reused + self.analyzed
+        return {
+            "enabled": FRAME_DEDUP_ENABLED,
+            "modes": sorted(FRAME_DEDUP_MODES),
+            "devices": len(self._devices),
+            "max_distance": self.max_distance,
+            "reused": self.reused,
+            "analyzed": self.analyzed,
+            "reuse_ratio": self.reused / total if total else 0.0
+        }
+
+
+frame_dedup = FrameDeduplicator(
+    FRAME_DEDUP_MAX_DISTANCE,
+    FRAME_DEDUP_WINDOW,
+    FRAME_DEDUP_MAX_AGE,
+    FRAME_DEDUP_MAX_DEVICES
+)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+服务启动
+开发模式：单进程，监听文件变化自动重载（python main.py）
+生产模式：多 worker 进程、uvloop + httptools、优雅关闭，并使用 backend/ 下的 TLS 证书（python main.py --production）
+
+多个 worker 之间不共享内存，需要共享的状态在启动 worker 之前通过环境变量放到进程外：
+结果缓存使用 SQLite 磁盘层，/metrics 汇总各 worker 写入 METRICS_DIR 的快照
+"""
+
+import os
+import sys
+import glob
+import logging
+import argparse
+import tempfile
+import importlib.util
+
+import uvicorn
+
+from structured_logging import setup_logging
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+# 为空时开发模式使用 8000，生产模式启用 TLS 时使用 8443
+SERVER_PORT = os.getenv("SERVER_PORT", "")
+# 0 表示按 CPU 核数
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "0"))
+# 收到退出信号后等待进行中的请求（包括 Ark 调用和流式响应）完成的最长时间（秒）
+SERVER_GRACEFUL_TIMEOUT = float(os.getenv("SERVER_GRACEFUL_TIMEOUT", "60"))
+SERVER_TLS = os.getenv("SERVER_TLS", "true").lower() == "true"
+SSL_CERTFILE = os.getenv("SSL_CERTFILE", os.path.join(BACKEND_DIR, "cert.pem"))
+SSL_KEYFILE = os.getenv("SSL_KEYFILE", os.path.join(BACKEND_DIR, "key.pem"))
+# 未设置 ARK_MAX_CONCURRENCY 时，生产模式各 worker 合计的 Ark 并发上限（与 ark_limiter 的默认值一致）
+ARK_MAX_CONCURRENCY_TOTAL = 32
+
+
+def default_workers() -> int:
+    """worker 数默认等于 CPU 核数：Ark 调用是 I/O 等待，CPU 主要花在图片预处理和 JSON 上"""
+    return max(1, os.cpu_count() or 1)
+
+
+def _implementation(module: str) -> str:
+    """已安装时显式选择 uvloop / httptools，否则回退到 uvicorn 的纯 Python 实现"""
+    if importlib.util.find_spec(module) is not None:
+        return module
+    logger.warning("未安装 %s，回退到默认实现（pip install 'uvicorn[standard]'）", module)
+    return "auto"
+
+
+def share_state_across_workers(port: int, workers: int):
+    """
+    为多 worker 部署设置进程外共享状态（结果缓存、指标快照目录）和按 worker 分摊的资源（Ark 并发、图片预处理线程）的默认配置
+
+    worker 进程由 uvicorn 在此之后启动，导入模块时从环境变量读取配置；已显式设置的环境变量不覆盖。
+    近重复帧去重、Ark 熔断器和各 lane 的限流器仍在每个 worker 内独立生效
+    """
+    # 结果缓存：各 worker 保留内存 LRU，并共享同一个 SQLite 文件（WAL 模式支持多进程读写，
+    # 读写在专用线程中执行，不阻塞事件循环）
+    os.environ.setdefault("RESULT_CACHE_DB", os.path.join(BACKEND_DIR, "result_cache.db"))
+
+    # 指标：每个 worker 定期写快照，/metrics 汇总；清理上次运行遗留的快照
+    metrics_dir = os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"felo_metrics_{port}"))
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        os.remove(path)
+
+    # Ark 并发总上限和各 lane 的限流器在每个 worker 中独立生效，按 worker 数分摊默认总上限，
+    # 避免实际并发变成 worker 数倍；显式设置时即为每个 worker 的上限
+    os.environ.setdefault("ARK_MAX_CONCURRENCY", str(max(1, ARK_MAX_CONCURRENCY_TOTAL // workers)))
+
+    # 图片预处理线程按 worker 数分摊 CPU，避免线程数远超核数
+    os.environ.setdefault("IMAGE_PREPROCESS_WORKERS", str(max(1, default_workers() // workers)))
+
+
+def run_dev(host: str, port: int):
+    """开发模式：单进程，代码变化时自动重载"""
+    logger.info("启动 Nothing Phone 3a Camera API 服务器（开发模式）...")
+    uvicorn.run(
+        "main:app",
+        app_dir=BACKEND_DIR,
+        host=host,
+        port=port,
+        reload=True,
+        log_level="info",
+        # 不使用 uvicorn 自带的日志配置，访问日志同样经队列以 JSON 写出
+        log_config=None
+    )
+
+
+def run_production(host: str, port: int, workers: int, tls: bool):
+    """生产模式：多 worker、uvloop + httptools、优雅关闭、TLS"""
+    ssl_options = {}
+    if tls:
+        missing = [path for path in (SSL_CERTFILE, SSL_KEYFILE) if not os.path.exists(path)]
+        if missing:
+            logger.error("TLS 证书文件不存在: %s（可设置 SSL_CERTFILE/SSL_KEYFILE，或使用 --no-tls）", ", ".join(missing))
+            sys.exit(1)
+        ssl_options = {"ssl_certfile": SSL_CERTFILE, "ssl_keyfile": SSL_KEYFILE}
+
+    share_state_across_workers(port, workers)
+
+    loop = _implementation("uvloop")
+    http = _implementation("httptools")
+    logger.info(
+        "启动 Nothing Phone 3a Camera API 服务器（生产模式）- workers: %s, loop: %s, http: %s, tls: %s, port: %s",
+        workers, loop, http, tls, port
+    )
+    uvicorn.run(
+        "main:app",
+        app_dir=BACKEND_DIR,
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+        log_level="info",
+        log_config=None,
+        **ssl_options
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="启动 Nothing Phone 3a Camera API 服务器")
+    parser.add_argument("--production", action="store_true", help="生产模式（多 worker、TLS、无自动重载）")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS or None, help="worker 进程数（默认 CPU 核数）")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=int(SERVER_PORT) if SERVER_PORT else None)
+    parser.add_argument("--no-tls", dest="tls", action="store_false", default=SERVER_TLS, help="生产模式下不启用 TLS")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+
+    if not args.production:
+        run_dev(args.host, args.port or 8000)
+        return
+
+    port = args.port or (8443 if args.tls else 8000)
+    run_production(args.host, port, args.workers or default_workers(), args.tls)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,38 +5,92 @@ FastAPI 后端服务器 - 代理 Volcengine Ark API 请求
 """
 
 import os
-import base64
+import sys
+import json
+import asyncio
 import logging
-from typing import Optional, Dict, Any
-from io import BytesIO
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, Callable, AsyncIterator
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
-import uvicorn
-from openai import OpenAI
-from PIL import Image
+from openai import APIStatusError
+from PIL import UnidentifiedImageError
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+from ark_client import (
+    init_ark_client,
+    close_ark_client,
+    drain_ark_calls,
+    get_ark_client,
+    get_pool_stats,
+    create_chat_completion,
+    stream_chat_completion,
+)
+from ark_limiter import ArkOverloaded, Permit, acquire_ark_permit, lane_stats
+from ark_resilience import ArkUnavailable, breaker_stats, check_circuit
+from result_cache import result_cache
+from document_chunks import split_document, extract_json, merge_parsed_chunks
+
+# 共享的 petlog 模块位于仓库根目录
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from petlog.parser import parse_structured_document, record_to_event
+from upload_limits import MAX_UPLOAD_BYTES, UploadSizeLimitMiddleware
+from image_pipeline import prepare_image, run_in_image_pool, to_data_url
+from frame_dedup import compute_dhash, dedup_applies, frame_dedup
+from timeline_index import timeline_index, TornEventStore
+from petlog.timeline import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, parse_time
+from structured_logging import setup_logging, log_payload
+from metrics import (
+    MetricsMiddleware,
+    registry,
+    start_snapshots,
+    stop_snapshots,
+    render_metrics,
+    set_request_mode,
+    stage,
+    record_error,
+    record_degraded,
+)
+
+# 配置日志：结构化 JSON，经队列由后台线程写出
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # 请求模型
 class TextAnalysisRequest(BaseModel):
     prompt: str
     analysis_type: str = "text_analysis"
+    stream: bool = False  # 为 True 时以 SSE 流式返回
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建共享 Ark 客户端，关闭时等待进行中的 Ark 调用完成后释放连接池"""
+    try:
+        init_ark_client()
+    except ValueError as e:
+        logger.error("Ark 客户端初始化失败: %s", e)
+    snapshot_task = start_snapshots()
+    yield
+    await drain_ark_calls()
+    await close_ark_client()
+    await stop_snapshots(snapshot_task)
 
 app = FastAPI(
     title="Nothing Phone 3a Camera API",
     description="图片分析服务 - 基于 Volcengine Ark",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# 限制上传大小，超限请求在解析前直接返回 413
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES)
+
 # 配置 CORS 允许 Flutter 客户端访问
 app.add_middleware(
     CORSMiddleware,
@@ -46,17 +100,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 初始化 Volcengine Ark 客户端
-def get_ark_client() -> OpenAI:
-    """获取配置好的 Ark 客户端"""
-    api_key = os.getenv("ARK_API_KEY")
-    if not api_key:
-        raise ValueError("ARK_API_KEY environment variable not set")
-    
-    return OpenAI(
-        api_key=api_key,
-        base_url="https://ark.cn-beijing.volces.com/api/v3"
-    )
+# 请求指标，放在最外层以便统计被上传大小限制拒绝的请求
+app.add_middleware(MetricsMiddleware)
+
+# 导出时读取的已有统计
+registry.add_collector("ark_pool_open_connections", "gauge", "Ark 连接池中已打开的连接数",
+                       lambda: get_pool_stats()["open_connections"])
+registry.add_collector("ark_pool_idle_connections", "gauge", "Ark 连接池中空闲的连接数",
+                       lambda: get_pool_stats()["idle_connections"])
+registry.add_collector("ark_requests_in_flight", "gauge", "进行中的 Ark 调用数",
+                       lambda: get_pool_stats()["in_flight_requests"])
+registry.add_collector("result_cache_hits_total", "counter", "结果缓存命中次数",
+                       lambda: result_cache.hits)
+registry.add_collector("result_cache_misses_total", "counter", "结果缓存未命中次数",
+                       lambda: result_cache.misses)
+registry.add_collector("frame_dedup_reused_total", "counter", "近重复帧复用结果的次数",
+                       lambda: frame_dedup.reused)
 
 # 模式对应的提示词
 MODE_PROMPTS = {
@@ -67,36 +126,177 @@ MODE_PROMPTS = {
     "history": "当前为历史记录分析模式，请基于用户提供的历史记录信息进行深度分析：1. 分析图片内容与用户描述的关联性和一致性；2. 提取关键信息并生成结构化的记录摘要；3. 识别潜在的行为模式、趋势或异常情况；4. 提供基于历史数据的洞察和建议；5. 生成适合长期追踪的标签和分类信息。"
 }
 
-def encode_image_to_base64(image_bytes: bytes) -> str:
-    """将图片字节转换为 base64 编码"""
-    try:
-        # 验证图片格式
-        image = Image.open(BytesIO(image_bytes))
-        
-        # 如果图片过大，进行压缩
-        max_size = (1024, 1024)
-        if image.size[0] > max_size[0] or image.size[1] > max_size[1]:
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
-            # 重新编码压缩后的图片
-            buffer = BytesIO()
-            image.save(buffer, format='JPEG', quality=85)
-            image_bytes = buffer.getvalue()
-        
-        return base64.b64encode(image_bytes).decode('utf-8')
-    except Exception as e:
-        logger.error(f"图片编码失败: {e}")
-        raise HTTPException(status_code=400, detail="图片格式不支持或损坏")
-
 @app.get("/")
 async def root():
     """健康检查接口"""
     return {"message": "Nothing Phone 3a Camera API 运行正常", "status": "ok"}
 
+# Ark 不可用时降级结果的描述
+DEGRADED_DESCRIPTION = "图片分析服务暂时不可用，本次结果未经模型分析，请稍后重试。"
+
+def ark_rejected(error: APIStatusError) -> HTTPException:
+    """
+    Ark 拒绝了请求（鉴权失败、参数错误等不可重试的 4xx）：记录错误并以 502 返回。
+    这类错误不是 Ark 暂时不可用，返回降级结果会掩盖密钥失效等需要处理的问题
+    """
+    logger.error("Ark 拒绝请求 - status: %s, error: %r", error.status_code, error)
+    record_error("ark_rejected")
+    return HTTPException(status_code=502, detail="分析服务调用失败")
+
+def build_image_analysis_result(mode: str, analysis_result: str, degraded: Optional[str] = None) -> Dict[str, Any]:
+    """
+    构建符合 Flutter 客户端期望的图片分析响应格式
+    
+    Args:
+        degraded: Ark 不可用时的降级原因，此时响应带 degraded: true，置信度为 0
+    """
+    result = {
+        "success": True,
+        "mode": mode,
+        "analysis": {
+            "title": get_title_for_mode(mode),
+            "description": analysis_result,
+            "confidence": 0.0 if degraded else 0.85,  # 模拟置信度
+            "sub_info": get_sub_info_for_mode(mode)
+        },
+        "degraded": degraded is not None,
+        "timestamp": int(os.times().elapsed * 1000)  # 毫秒时间戳
+    }
+    if degraded is not None:
+        result["degraded_reason"] = degraded
+    return result
+
+def image_error_detail(error: Exception) -> str:
+    """图片解码失败时返回给客户端的说明（异常原文可能包含临时文件对象等服务器内部信息，只记录在日志中）"""
+    if isinstance(error, UnidentifiedImageError):
+        return "图片编码失败: 无法识别的图片格式"
+    return "图片编码失败: 图片已损坏或格式不受支持"
+
+def build_image_messages(prompt: str, base64_image: str, mime_type: str) -> List[Dict[str, Any]]:
+    """构建图片分析请求消息"""
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": prompt
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": to_data_url(base64_image, mime_type)
+                    }
+                }
+            ]
+        }
+    ]
+
+def format_sse(event: str, data: Any) -> str:
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class SSEResponse(StreamingResponse):
+    """
+    SSE 流式响应
+
+    持有 Ark 调用名额时，响应结束后归还：流通常在调用结束时已经归还，
+    这里兜底流尚未开始发送时客户端就断开、生成器从未执行的情况
+    """
+
+    def __init__(self, events: AsyncIterator[str], permit: Optional[Permit] = None):
+        super().__init__(
+            events,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+        self.permit = permit
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.permit is not None:
+                self.permit.release(sample=False)
+
+def sse_response(events: AsyncIterator[str], permit: Optional[Permit] = None) -> StreamingResponse:
+    """以 text/event-stream 返回 SSE 流，并关闭代理缓冲"""
+    return SSEResponse(events, permit)
+
+async def single_result_events(result: Dict[str, Any]) -> AsyncIterator[str]:
+    """无需调用模型时（缓存或去重命中），流式模式下只发送最终结果"""
+    yield format_sse("result", result)
+
+async def stream_ark_events(
+    completion_kwargs: Dict[str, Any],
+    build_result: Callable[[str, Optional[str]], Dict[str, Any]],
+    permit: Permit,
+    fallback: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    将 Ark 流式输出转发为 SSE
+    
+    先发送 start 事件，随后逐段发送 delta（正文）和 reasoning（思考过程），
+    最后发送 result 事件，内容与非流式接口的响应结构一致
+    
+    Args:
+        completion_kwargs: 透传给 chat.completions.create 的参数
+        build_result: 根据完整文本构建最终响应，第二个参数为降级原因（文本来自模型时为 None）
+        permit: 返回响应之前获取的 Ark 调用名额（过载时在此之前以 503 拒绝）
+        fallback: 尚未收到任何输出就失败时使用的降级文本，为空时发送 error 事件
+    """
+    yield format_sse("start", {"model": completion_kwargs.get("model")})
+    
+    chunks = []
+    try:
+        async for kind, text in stream_chat_completion(get_ark_client(), permit, **completion_kwargs):
+            if kind == "content":
+                chunks.append(text)
+                yield format_sse("delta", {"content": text})
+            else:
+                yield format_sse("reasoning", {"content": text})
+    except Exception as e:
+        logger.error("Ark streaming call failed: %s", e)
+        # 只有 Ark 暂时不可用且尚未输出任何内容时返回降级结果
+        if chunks or fallback is None or not isinstance(e, ArkUnavailable):
+            record_error("ark_rejected" if isinstance(e, APIStatusError) else "stream_error")
+            error = {"detail": f"分析失败: {str(e)}"}
+            if isinstance(e, APIStatusError):
+                error = {"detail": "分析服务调用失败"}
+            elif isinstance(e, ArkUnavailable):
+                error = {"detail": e.detail, "retry_after": e.retry_after}
+            yield format_sse("error", error)
+            return
+        record_degraded(e.reason)
+        yield format_sse("result", build_result(fallback, e.reason))
+        return
+    
+    yield format_sse("result", build_result("".join(chunks).strip(), None))
+
+async def request_image_analysis(
+    prompt: str,
+    base64_image: str,
+    mime_type: str,
+    model: str,
+    max_tokens: int,
+    temperature: float
+) -> str:
+    """调用 Ark 视觉模型分析单张图片，返回模型输出文本"""
+    response = await create_chat_completion(
+        get_ark_client(),
+        model=model,
+        messages=build_image_messages(prompt, base64_image, mime_type),
+        max_tokens=max_tokens,
+        temperature=temperature
+    )
+    return response.choices[0].message.content.strip()
+
 @app.post("/analyze")
 async def analyze_image(
     file: UploadFile = File(...),
-    mode: str = Form(default="normal")
+    mode: str = Form(default="normal"),
+    device_id: str = Form(default=""),
+    stream: bool = Form(default=False)
 ):
     """
     图片分析接口
@@ -104,106 +304,151 @@ async def analyze_image(
     Args:
         file: 上传的图片文件
         mode: 分析模式 (normal, pet, health, travel)
+        device_id: 设备标识，用于近重复帧去重（为空时不去重）
+        stream: 为 True 时以 SSE 流式返回模型输出，最后一个 result 事件为完整响应
     
     Returns:
         JSON 响应包含分析结果
     """
     try:
         # 添加详细日志
-        logger.info(f"Received request - file: {file.filename}, content_type: {file.content_type}, mode: {mode}")
+        logger.info("Received request - file: %s, content_type: %s, mode: %s", file.filename, file.content_type, mode)
         
         # 验证文件类型
         if not file.content_type or not file.content_type.startswith('image/'):
-            logger.error(f"Invalid content type: {file.content_type}")
+            logger.error("Invalid content type: %s", file.content_type)
             raise HTTPException(status_code=400, detail="请上传有效的图片文件")
         
         # 验证模式
         if mode not in MODE_PROMPTS:
-            logger.warning(f"Invalid mode '{mode}', using 'normal'")
+            logger.warning("Invalid mode '%s', using 'normal'", mode)
             mode = "normal"
+        set_request_mode(mode)
         
-        # 读取图片数据
-        image_bytes = await file.read()
-        logger.info(f"Image size: {len(image_bytes)} bytes")
+        # 上传内容已由 multipart 解析器写入临时文件（超过阈值时落盘），这里直接从文件解码，不再整体读入内存
+        image_file = file.file
+        logger.info("Image size: %s bytes", file.size)
         
-        if len(image_bytes) == 0:
+        if not file.size:
             logger.error("Empty image file")
             raise HTTPException(status_code=400, detail="图片文件为空")
         
+        # 近重复帧去重：与同一设备最近的帧足够相似时直接复用结果
+        frame_hash = None
+        device_key = device_id
+        if dedup_applies(device_id, mode):
+            try:
+                with stage("frame_hash"):
+                    frame_hash = await run_in_image_pool(compute_dhash, image_file)
+            except Exception as e:
+                logger.warning("Frame hash failed: %s", e)
+        if frame_hash is not None:
+            reused = frame_dedup.lookup(device_key, mode, frame_hash)
+            if reused is not None:
+                logger.info("Near-duplicate frame reused - device: %s, distance: %s", device_key, reused['distance'])
+                result = build_image_analysis_result(mode, reused["result"])
+                result["cache"] = "dedup"
+                result["dedup"] = {
+                    "reused": True,
+                    "distance": reused["distance"],
+                    "age_seconds": reused["age_seconds"]
+                }
+                if stream:
+                    return sse_response(single_result_events(result))
+                return JSONResponse(content=result)
+        
         # 编码图片
         try:
-            base64_image = encode_image_to_base64(image_bytes)
-            logger.info("Image encoded successfully")
+            base64_image, mime_type = await prepare_image(image_file, mode)
+            logger.info("Image encoded successfully - mime: %s", mime_type)
         except Exception as e:
-            logger.error(f"Image encoding failed: {e}")
-            raise HTTPException(status_code=400, detail=f"图片编码失败: {str(e)}")
-        
-        # 获取 Ark 客户端
-        client = get_ark_client()
+            logger.error("Image encoding failed: %s", e)
+            raise HTTPException(status_code=400, detail=image_error_detail(e))
         
-        # 构建请求
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": MODE_PROMPTS[mode]
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
-                    }
-                ]
-            }
-        ]
+        # 查询结果缓存
+        model = "doubao-seed-1-6-250615"  # 使用用户提供的推理接入点 ID
+        cache_key = result_cache.make_key(base64_image, mode, MODE_PROMPTS[mode], model)
+        analysis_result = await result_cache.get(cache_key)
+        cache_status = "hit" if analysis_result is not None else "miss"
+        from_model = analysis_result is not None
+        degraded = None
         
-        # 调用 Ark API
-        logger.info(f"Analyzing image - mode: {mode}")
-        try:
-            response = client.chat.completions.create(
-                model="doubao-seed-1-6-250615",  # 使用用户提供的推理接入点 ID
-                messages=messages,
-                max_tokens=300,
-                temperature=0.7
-            )
-            logger.info("Ark API call successful")
-        except Exception as api_error:
-            logger.error(f"Ark API call failed: {str(api_error)}")
-            # 返回模拟结果以便测试
-            analysis_result = f"This is an image analysis result in {mode} mode. Returning mock data due to API configuration issues."
+        if analysis_result is not None:
+            logger.info("Result cache hit - mode: %s", mode)
+        elif stream:
+            def finish_stream(text: str, degraded: Optional[str]) -> Dict[str, Any]:
+                if degraded is None:
+                    result_cache.set(cache_key, text, len(base64_image))
+                    if frame_hash is not None:
+                        frame_dedup.record(device_key, mode, frame_hash, text)
+                result = build_image_analysis_result(mode, text, degraded)
+                result["cache"] = "miss"
+                result["dedup"] = {"reused": False}
+                return result
+            
+            logger.info("Streaming image analysis - mode: %s", mode)
+            try:
+                check_circuit(model)
+            except ArkUnavailable as e:
+                # 熔断中直接返回降级结果，不排队
+                record_degraded(e.reason)
+                return sse_response(single_result_events(finish_stream(DEGRADED_DESCRIPTION, e.reason)))
+            permit = await acquire_ark_permit()
+            return sse_response(stream_ark_events(
+                {
+                    "model": model,
+                    "messages": build_image_messages(MODE_PROMPTS[mode], base64_image, mime_type),
+                    "max_tokens": 300,
+                    "temperature": 0.7
+                },
+                finish_stream,
+                permit,
+                fallback=DEGRADED_DESCRIPTION
+            ), permit)
+        else:
+            # 调用 Ark API
+            logger.info("Analyzing image - mode: %s", mode)
+            try:
+                analysis_result = await request_image_analysis(
+                    MODE_PROMPTS[mode],
+                    base64_image,
+                    mime_type,
+                    model=model,
+                    max_tokens=300,
+                    temperature=0.7
+                )
+                logger.info("Ark API call successful")
+                # 只缓存真实的模型结果
+                result_cache.set(cache_key, analysis_result, len(base64_image))
+                from_model = True
+            except ArkUnavailable as api_error:
+                # Ark 暂时不可用时返回带 degraded: true 的降级结果，不写入缓存和去重记录；
+                # 过载（ArkOverloaded）返回 503 让客户端稍后重试
+                logger.error("Ark API call failed: %s", api_error.reason)
+                degraded = api_error.reason
+                record_degraded(degraded)
+                analysis_result = DEGRADED_DESCRIPTION
+            except APIStatusError as api_error:
+                raise ark_rejected(api_error)
         
-        # 解析响应
-        try:
-            if 'response' in locals():
-                analysis_result = response.choices[0].message.content.strip()
-            # 如果没有response（API调用失败），使用之前设置的模拟结果
-        except Exception as e:
-            logger.error(f"Response parsing failed: {e}")
-            analysis_result = f"This is an image analysis result in {mode} mode. Response parsing error, returning mock data."
+        if from_model and frame_hash is not None:
+            frame_dedup.record(device_key, mode, frame_hash, analysis_result)
         
         # 构建符合 Flutter 客户端期望的响应格式
-        result = {
-            "success": True,
-            "mode": mode,
-            "analysis": {
-                "title": get_title_for_mode(mode),
-                "description": analysis_result,
-                "confidence": 0.85,  # 模拟置信度
-                "sub_info": get_sub_info_for_mode(mode)
-            },
-            "timestamp": int(os.times().elapsed * 1000)  # 毫秒时间戳
-        }
-        
-        logger.info(f"Analysis completed - mode: {mode}")
-        return JSONResponse(content=result)
+        with stage("response_build"):
+            result = build_image_analysis_result(mode, analysis_result, degraded)
+            result["cache"] = cache_status
+            result["dedup"] = {"reused": False}
+            
+            logger.info("Analysis completed - mode: %s", mode)
+            if stream:
+                return sse_response(single_result_events(result))
+            return JSONResponse(content=result)
             
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"图片分析失败: {e}")
+        logger.error("图片分析失败: %s", e)
         raise HTTPException(status_code=500, detail=f"分析失败: {str(e)}")
 
 @app.post("/analyze-history")
@@ -224,31 +469,29 @@ async def analyze_history_record(
         JSON 响应包含增强的分析结果
     """
     try:
-        logger.info(f"Received history analysis request - file: {file.filename}, title: {title}")
+        logger.info("Received history analysis request - file: %s, title: %s", file.filename, title)
+        set_request_mode("history")
         
         # 验证文件类型
         if not file.content_type or not file.content_type.startswith('image/'):
-            logger.error(f"Invalid content type: {file.content_type}")
+            logger.error("Invalid content type: %s", file.content_type)
             raise HTTPException(status_code=400, detail="请上传有效的图片文件")
         
-        # 读取图片数据
-        image_bytes = await file.read()
-        logger.info(f"Image size: {len(image_bytes)} bytes")
+        # 上传内容已由 multipart 解析器写入临时文件（超过阈值时落盘），这里直接从文件解码，不再整体读入内存
+        image_file = file.file
+        logger.info("Image size: %s bytes", file.size)
         
-        if len(image_bytes) == 0:
+        if not file.size:
             logger.error("Empty image file")
             raise HTTPException(status_code=400, detail="图片文件为空")
         
         # 编码图片
         try:
-            base64_image = encode_image_to_base64(image_bytes)
-            logger.info("Image encoded successfully")
+            base64_image, mime_type = await prepare_image(image_file, "history")
+            logger.info("Image encoded successfully - mime: %s", mime_type)
         except Exception as e:
-            logger.error(f"Image encoding failed: {e}")
-            raise HTTPException(status_code=400, detail=f"图片编码失败: {str(e)}")
-        
-        # 获取 Ark 客户端
-        client = get_ark_client()
+            logger.error("Image encoding failed: %s", e)
+            raise HTTPException(status_code=400, detail=image_error_detail(e))
         
         # 构建历史记录分析的特殊提示词
         history_prompt = f"""
@@ -265,70 +508,184 @@ async def analyze_history_record(
 4. 适合历史追踪的洞察建议
 """
         
-        # 构建请求
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": history_prompt
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
-                    }
-                ]
-            }
-        ]
+        # 查询结果缓存
+        model = "doubao-seed-1-6-thinking-250715"  # 使用Doubao-Seed-1.6-thinking进行深度思考分析
+        cache_key = result_cache.make_key(base64_image, "history", history_prompt, model)
+        analysis_result = await result_cache.get(cache_key)
+        cache_status = "hit" if analysis_result is not None else "miss"
+        degraded = None
         
-        # 调用 Ark API
-        logger.info("Analyzing history record with enhanced AI")
-        try:
-            response = client.chat.completions.create(
-                model="doubao-seed-1-6-thinking-250715",  # 使用Doubao-Seed-1.6-thinking进行深度思考分析
-                messages=messages,
-                max_tokens=500,  # 更多token用于详细分析
-                temperature=0.3  # 更低的温度确保一致性
-            )
-            logger.info("Ark API call successful for history analysis")
-            analysis_result = response.choices[0].message.content.strip()
-        except Exception as api_error:
-            logger.error(f"Ark API call failed: {str(api_error)}")
-            # 返回基于用户输入的增强结果
-            analysis_result = f"基于历史记录分析：{title}。{description if description else ''} 图片内容已记录并分类用于历史追踪。"
+        if analysis_result is not None:
+            logger.info("Result cache hit - history title: %s", title)
+        else:
+            # 调用 Ark API
+            logger.info("Analyzing history record with enhanced AI")
+            try:
+                analysis_result = await request_image_analysis(
+                    history_prompt,
+                    base64_image,
+                    mime_type,
+                    model=model,
+                    max_tokens=500,  # 更多token用于详细分析
+                    temperature=0.3  # 更低的温度确保一致性
+                )
+                logger.info("Ark API call successful for history analysis")
+                result_cache.set(cache_key, analysis_result, len(base64_image))
+            except ArkUnavailable as api_error:
+                logger.error("Ark API call failed: %s", api_error.reason)
+                # 返回仅基于用户输入的降级结果
+                degraded = api_error.reason
+                record_degraded(degraded)
+                analysis_result = f"基于历史记录分析：{title}。{description if description else ''} 图片内容已记录并分类用于历史追踪。"
+            except APIStatusError as api_error:
+                raise ark_rejected(api_error)
         
         # 构建增强的响应格式
-        result = {
-            "success": True,
-            "mode": "history",
-            "analysis": {
-                "title": f"历史记录：{title}",
-                "description": analysis_result,
-                "confidence": 0.92,  # 历史记录分析通常有更高的置信度
-                "sub_info": f"记录时间：{description}" if description else "历史数据分析",
-                "tags": extract_tags_from_analysis(analysis_result, title, description),
-                "category": determine_category(title, description),
-                "user_input": {
-                    "title": title,
-                    "description": description
-                }
-            },
-            "timestamp": int(os.times().elapsed * 1000)
-        }
+        with stage("response_build"):
+            result = {
+                "success": True,
+                "mode": "history",
+                "analysis": {
+                    "title": f"历史记录：{title}",
+                    "description": analysis_result,
+                    "confidence": 0.0 if degraded else 0.92,  # 历史记录分析通常有更高的置信度
+                    "sub_info": f"记录时间：{description}" if description else "历史数据分析",
+                    "tags": extract_tags_from_analysis(analysis_result, title, description),
+                    "category": determine_category(title, description),
+                    "user_input": {
+                        "title": title,
+                        "description": description
+                    }
+                },
+                "cache": cache_status,
+                "degraded": degraded is not None,
+                "timestamp": int(os.times().elapsed * 1000)
+            }
+            if degraded is not None:
+                result["degraded_reason"] = degraded
         
-        logger.info(f"History analysis completed - title: {title}")
-        return JSONResponse(content=result)
+            logger.info("History analysis completed - title: %s", title)
+            return JSONResponse(content=result)
             
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"历史记录分析失败: {e}")
+        logger.error("历史记录分析失败: %s", e)
         raise HTTPException(status_code=500, detail=f"分析失败: {str(e)}")
 
 
+# 批量分析的图片数量上限和单批次内的 Ark 并发上限
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "20"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+@app.post("/analyze-batch")
+async def analyze_batch(
+    files: List[UploadFile] = File(...),
+    mode: str = Form(default="normal")
+):
+    """
+    批量图片分析接口
+    
+    Args:
+        files: 上传的多张图片文件
+        mode: 分析模式 (normal, pet, health, travel)
+    
+    Returns:
+        JSON 响应，results 与上传顺序一致，单张失败时对应项包含 error
+    """
+    logger.info("Received batch request - images: %s, mode: %s", len(files), mode)
+    
+    if len(files) > BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"单次最多上传 {BATCH_MAX_IMAGES} 张图片")
+    
+    if mode not in MODE_PROMPTS:
+        logger.warning("Invalid mode '%s', using 'normal'", mode)
+        mode = "normal"
+    set_request_mode(mode)
+    
+    model = "doubao-seed-1-6-250615"
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    
+    async def analyze_one(index: int, file: UploadFile) -> Dict[str, Any]:
+        """分析单张图片，失败时返回带错误信息的条目而不是中断整个批次"""
+        item = {"index": index, "filename": file.filename}
+        try:
+            if not file.content_type or not file.content_type.startswith('image/'):
+                raise ValueError("请上传有效的图片文件")
+            if not file.size:
+                raise ValueError("图片文件为空")
+            
+            try:
+                base64_image, mime_type = await prepare_image(file.file, mode)
+            except Exception as e:
+                logger.warning("Batch item %s image encoding failed: %r", index, e)
+                raise ValueError(image_error_detail(e))
+            
+            cache_key = result_cache.make_key(base64_image, mode, MODE_PROMPTS[mode], model)
+            analysis_result = await result_cache.get(cache_key)
+            cache_status = "hit" if analysis_result is not None else "miss"
+            
+            if analysis_result is None:
+                async with semaphore:
+                    analysis_result = await request_image_analysis(
+                        MODE_PROMPTS[mode],
+                        base64_image,
+                        mime_type,
+                        model=model,
+                        max_tokens=300,
+                        temperature=0.7
+                    )
+                result_cache.set(cache_key, analysis_result, len(base64_image))
+            
+            item.update(build_image_analysis_result(mode, analysis_result))
+            item["cache"] = cache_status
+        except (ArkOverloaded, ArkUnavailable) as e:
+            record_error("batch_item")
+            item.update({"success": False, "error": e.detail, "retry_after": e.retry_after})
+        except Exception as e:
+            logger.error("Batch item %s failed: %s", index, e)
+            record_error("batch_item")
+            item.update({"success": False, "error": str(e)})
+        return item
+    
+    results = await asyncio.gather(*(analyze_one(i, f) for i, f in enumerate(files)))
+    
+    succeeded = sum(1 for item in results if item["success"])
+    logger.info("Batch analysis completed - succeeded: %s/%s", succeeded, len(results))
+    return JSONResponse(content={
+        "success": True,
+        "mode": mode,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+        "timestamp": int(os.times().elapsed * 1000)
+    })
+
+
+async def parse_structured_locally(content: str) -> Optional[str]:
+    """
+    结构化监控数据的本地快速解析
+    
+    Returns:
+        内容为结构化监控数据时，返回与模型输出相同 events/summary 结构的 JSON 字符串；
+        否则返回 None，交由模型处理自由文本
+    """
+    with stage("local_parse"):
+        records = await asyncio.to_thread(parse_structured_document, content)
+    if records is None:
+        return None
+    
+    events = [record_to_event(record) for record in records]
+    logger.info("结构化文档本地解析完成，包含 %s 个事件", len(events))
+    merged = merge_parsed_chunks([{"events": events}], ["结构化监控数据，已在本地直接解析"])
+    return json.dumps(merged, ensure_ascii=False)
+
+# 长文档分段解析：每段最大字符数、最多事件数，以及并行解析的段数上限
+DOCUMENT_CHUNK_MAX_CHARS = int(os.getenv("DOCUMENT_CHUNK_MAX_CHARS", "6000"))
+DOCUMENT_CHUNK_MAX_EVENTS = int(os.getenv("DOCUMENT_CHUNK_MAX_EVENTS", "12"))
+DOCUMENT_CHUNK_CONCURRENCY = int(os.getenv("DOCUMENT_CHUNK_CONCURRENCY", "4"))
+
 @app.post("/analyze-document")
 async def analyze_document(request: TextAnalysisRequest):
     """
@@ -336,8 +693,13 @@ async def analyze_document(request: TextAnalysisRequest):
     支持识别和拆分多个独立的宠物活动事件
     """
     try:
-        logger.info(f"收到文档解析请求，内容长度: {len(request.prompt)}")
-        logger.info(f"请求内容预览: {request.prompt[:200]}...")
+        logger.info("收到文档解析请求，内容长度: %s", len(request.prompt))
+        log_payload(logger, "请求内容", request.prompt)
+        
+        # 结构化监控数据直接本地解析，不调用模型
+        local_result = await parse_structured_locally(request.prompt)
+        if local_result is not None:
+            return {"result": local_result, "parser": "local"}
         
         # 获取 Ark 客户端
         client = get_ark_client()
@@ -427,47 +789,79 @@ async def analyze_document(request: TextAnalysisRequest):
 
 请开始解析用户提供的文档内容，识别并拆分其中的多个宠物活动事件。"""
         
-        # 构建请求消息
-        messages = [
-            {
-                "role": "system",
-                "content": system_prompt
-            },
-            {
-                "role": "user", 
-                "content": f"请解析以下宠物活动文档内容：\n\n{request.prompt}"
-            }
-        ]
+        async def parse_document_chunk(content: str) -> str:
+            """调用模型解析一段文档内容，返回模型原始输出"""
+            # 构建请求消息
+            messages = [
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user", 
+                    "content": f"请解析以下宠物活动文档内容：\n\n{content}"
+                }
+            ]
+            
+            response = await create_chat_completion(
+                client,
+                model="doubao-seed-1-6-250615",
+                messages=messages,
+                max_tokens=3000,
+                temperature=0.3
+            )
+            return response.choices[0].message.content
+        
+        # 长文档按时间戳拆分，避免单次输出超出 max_tokens 被截断
+        chunks = split_document(request.prompt, DOCUMENT_CHUNK_MAX_CHARS, DOCUMENT_CHUNK_MAX_EVENTS)
         
         # 调用 Ark API
-        logger.info("开始调用豆包模型进行文档解析...")
-        response = client.chat.completions.create(
-            model="doubao-seed-1-6-250615",
-            messages=messages,
-            max_tokens=3000,
-            temperature=0.3
-        )
+        if len(chunks) == 1:
+            logger.info("开始调用豆包模型进行文档解析...")
+            result = await parse_document_chunk(request.prompt)
+        else:
+            logger.info("文档拆分为 %s 段，开始并行调用豆包模型进行文档解析...", len(chunks))
+            semaphore = asyncio.Semaphore(DOCUMENT_CHUNK_CONCURRENCY)
+            
+            async def parse_with_limit(content: str) -> str:
+                async with semaphore:
+                    return await parse_document_chunk(content)
+            
+            # 任一段失败（或请求被取消）时取消其余分段，不再继续占用 Ark 调用
+            tasks = [asyncio.ensure_future(parse_with_limit(chunk)) for chunk in chunks]
+            try:
+                outputs = await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            
+            parsed_chunks = []
+            notes = [f"文档按时间戳拆分为 {len(chunks)} 段并行解析"]
+            for i, output in enumerate(outputs):
+                try:
+                    parsed_chunks.append(extract_json(output))
+                except ValueError as e:
+                    logger.error("第 %s 段AI响应不是有效的JSON格式: %s", i + 1, e)
+                    notes.append(f"第 {i+1} 段解析失败，已跳过")
+            
+            if not parsed_chunks:
+                raise ValueError("所有分段的AI响应都不是有效的JSON格式")
+            result = json.dumps(merge_parsed_chunks(parsed_chunks, notes), ensure_ascii=False)
         
-        result = response.choices[0].message.content
-        logger.info(f"豆包模型响应成功，内容长度: {len(result)}")
-        logger.info(f"AI响应内容: {result}")
+        logger.info("豆包模型响应成功，内容长度: %s", len(result))
+        log_payload(logger, "AI响应内容", result)
         
         # 尝试解析JSON以验证格式
-        try:
-            import json
-            parsed_json = json.loads(result)
-            events_count = len(parsed_json.get('events', []))
-            logger.info(f"JSON解析成功，包含 {events_count} 个事件")
-            for i, event in enumerate(parsed_json.get('events', [])):
-                logger.info(f"事件 {i+1}: {event.get('title', 'N/A')} - {event.get('timestamp', 'N/A')}")
-        except json.JSONDecodeError as e:
-            logger.error(f"AI响应不是有效的JSON格式: {e}")
-            logger.error(f"原始响应: {result}")
+        log_events_json(result)
         
         return {"result": result}
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"文档解析失败: {e}")
+        logger.error("文档解析失败: %s", e)
         raise HTTPException(status_code=500, detail=f"文档解析失败: {str(e)}")
 
 @app.post("/analyze-history-text")
@@ -477,8 +871,16 @@ async def analyze_history_text(request: TextAnalysisRequest):
     支持识别和拆分多个独立的宠物活动事件
     """
     try:
-        logger.info(f"收到文本分析请求，内容长度: {len(request.prompt)}")
-        logger.info(f"请求内容预览: {request.prompt[:200]}...")
+        logger.info("收到文本分析请求，内容长度: %s", len(request.prompt))
+        log_payload(logger, "请求内容", request.prompt)
+        
+        # 结构化监控数据直接本地解析，不调用模型
+        local_result = await parse_structured_locally(request.prompt)
+        if local_result is not None:
+            result = {"result": local_result, "parser": "local"}
+            if request.stream:
+                return sse_response(single_result_events(result))
+            return result
         
         # 获取 Ark 客户端
         client = get_ark_client()
@@ -580,9 +982,30 @@ async def analyze_history_text(request: TextAnalysisRequest):
             }
         ]
         
+        if request.stream:
+            def finish_stream(text: str, degraded: Optional[str]) -> Dict[str, Any]:
+                log_events_json(text)
+                return {"result": text}
+            
+            logger.info("开始以流式方式调用豆包模型进行文本分析...")
+            # 熔断中直接返回 503，不排队
+            check_circuit("doubao-seed-1-6-thinking-250715")
+            permit = await acquire_ark_permit()
+            return sse_response(stream_ark_events(
+                {
+                    "model": "doubao-seed-1-6-thinking-250715",
+                    "messages": messages,
+                    "max_tokens": 2000,
+                    "temperature": 0.3
+                },
+                finish_stream,
+                permit
+            ), permit)
+        
         # 调用 Ark API
         logger.info("开始调用豆包模型进行文本分析...")
-        response = client.chat.completions.create(
+        response = await create_chat_completion(
+            client,
             model="doubao-seed-1-6-thinking-250715",
             messages=messages,
             max_tokens=2000,
@@ -590,28 +1013,39 @@ async def analyze_history_text(request: TextAnalysisRequest):
         )
         
         result = response.choices[0].message.content
-        logger.info(f"豆包模型响应成功，内容长度: {len(result)}")
-        logger.info(f"AI响应内容: {result}")
+        logger.info("豆包模型响应成功，内容长度: %s", len(result))
+        log_payload(logger, "AI响应内容", result)
         
         # 尝试解析JSON以验证格式
-        try:
-            import json
-            parsed_json = json.loads(result)
-            events_count = len(parsed_json.get('events', []))
-            logger.info(f"JSON解析成功，包含 {events_count} 个事件")
-            for i, event in enumerate(parsed_json.get('events', [])):
-                logger.info(f"事件 {i+1}: {event.get('title', 'N/A')} - {event.get('timestamp', 'N/A')}")
-        except json.JSONDecodeError as e:
-            logger.error(f"AI响应不是有效的JSON格式: {e}")
-            logger.error(f"原始响应: {result}")
+        log_events_json(result)
         
         return {"result": result}
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"文本分析失败: {e}")
+        logger.error("文本分析失败: %s", e)
         raise HTTPException(status_code=500, detail=f"文本分析失败: {str(e)}")
 
 
+def log_events_json(result: str):
+    """校验模型输出是否为合法的事件 JSON，并记录解析到的事件"""
+    try:
+        parsed_json = json.loads(result)
+        events = parsed_json.get('events') if isinstance(parsed_json, dict) else None
+        if not isinstance(events, list):
+            logger.error("AI响应缺少 events 列表")
+            return
+        logger.info("JSON解析成功，包含 %s 个事件", len(events), extra={"events": len(events)})
+        # 逐个事件的明细只在 DEBUG 级别输出
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, event in enumerate(events):
+                if isinstance(event, dict):
+                    logger.debug("事件 %s: %s - %s", i + 1, event.get('title', 'N/A'), event.get('timestamp', 'N/A'))
+    except (TypeError, json.JSONDecodeError) as e:
+        logger.error("AI响应不是有效的JSON格式: %s", e)
+        logger.error("原始响应: %s", result)
+
 def extract_tags_from_analysis(analysis: str, title: str, description: str) -> list:
     """从分析结果中提取标签"""
     tags = []
@@ -667,6 +1101,49 @@ def get_sub_info_for_mode(mode: str) -> str:
     }
     return sub_infos.get(mode, "Smart Recognition")
 
+@app.get("/timeline")
+def get_timeline(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    category: List[str] = Query(default=[]),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    order: str = Query(default="asc", pattern="^(asc|desc)$")
+):
+    """
+    分页查询时间线（基于离线流水线生成的事件存储）
+    
+    客户端只获取当前可见的时间窗口，条目格式与 timeline_data.json 中的 timeline 相同。
+    首次查询或事件存储变化后需要加载并建立索引，因此定义为同步函数，在线程池中执行，不阻塞事件循环
+    
+    Args:
+        start: 起始时间（含），如 "2025-10-13 19:00:00" 或 "2025-10-13"
+        end: 结束时间（不含）
+        category: 类别过滤，可重复传入多个
+        cursor: 上一页返回的 next_cursor
+        limit: 每页条数
+        order: asc 从旧到新，desc 从新到旧
+    
+    Returns:
+        {"items": [...], "next_cursor": 下一页游标或 null, "total": 时间范围和类别内的事件总数}
+    """
+    try:
+        start_time = parse_time(start) if start else None
+        end_time = parse_time(end) if end else None
+        index = timeline_index.get()
+        return index.query(start_time, end_time, category, cursor, limit, descending=order == "desc")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="事件存储不存在，请先运行数据导入流水线")
+    except TornEventStore:
+        raise HTTPException(status_code=503, detail="事件存储正在更新，请稍后重试", headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 格式的运行指标（每个 worker 进程各自统计）"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 async def health_check():
     """详细健康检查"""
@@ -683,7 +1160,13 @@ async def health_check():
         return {
             "status": "healthy",
             "api_configured": bool(api_key),
-            "model": "doubao-seed-1-6-250615"
+            "model": "doubao-seed-1-6-250615",
+            "ark_pool": get_pool_stats(),
+            "ark_lanes": lane_stats(),
+            "ark_circuit": breaker_stats(),
+            "result_cache": result_cache.stats(),
+            "frame_dedup": frame_dedup.stats(),
+            "timeline": timeline_index.stats()
         }
     except Exception as e:
         return JSONResponse(
@@ -697,11 +1180,7 @@ if __name__ == "__main__":
         logger.error("请设置 ARK_API_KEY 环境变量")
         exit(1)
     
-    logger.info("启动 Nothing Phone 3a Camera API 服务器...")
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
\ No newline at end of file
+    # 开发模式: python main.py
+    # 生产模式: python main.py --production [--workers N] [--no-tls]
+    from launcher import main as launch
+    launch()
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Prometheus 格式的运行指标
+按接口和模式统计请求耗时及各阶段耗时（上传接收、帧哈希、解码缩放、base64 编码、Ark 排队与调用、响应构建），
+以及 Ark token 用量、进行中的请求数、错误和降级（模拟结果）次数，由 /metrics 接口以文本格式导出。
+
+每个请求的阶段耗时先记录到 contextvar 中的 RequestMetrics（只属于该请求，无需加锁），
+请求结束时由中间件在事件循环线程中一次性写入直方图；计数器同样只在事件循环线程中更新，
+因此热路径上没有锁，开销只有几次 perf_counter 和列表追加。
+
+多 worker 部署时每个进程各自统计，并定期把快照写入 METRICS_DIR；/metrics 汇总目录中所有进程的快照，
+无论请求落到哪个 worker 都返回全局数据（其他进程的数据最多滞后 METRICS_SNAPSHOT_INTERVAL 秒）
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import bisect
+import contextvars
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Callable, Sequence, Iterator
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "felo")
+# 为空时只导出当前进程的指标
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "5"))
+
+# 耗时直方图的桶上限（秒），Ark 思考模型的调用可能长达数十秒
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# 未匹配任何路由的请求统一归为 other，避免路径作为标签导致时间序列无限增长
+OTHER_ENDPOINT = "other"
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """单调递增的计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def export(self) -> List[list]:
+        return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def merge(merged: Dict[Tuple[str, ...], Any], labels: Tuple[str, ...], value: Any):
+        merged[labels] = merged.get(labels, 0) + value
+
+    def samples(self, values: Dict[Tuple[str, ...], Any]) -> Iterator[Tuple[str, str, float]]:
+        for labels, value in values.items():
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    """可增可减的当前值"""
+
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        self._values[labels] = value
+
+
+class Histogram:
+    """分桶直方图，观测时只增加一个桶的计数，导出时再累加为 Prometheus 的累积桶"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各桶计数..., +Inf 桶计数, 总和]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._values.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def export(self) -> List[list]:
+        return [[list(labels), list(series)] for labels, series in self._values.items()]
+
+    @staticmethod
+    def merge(merged: Dict[Tuple[str, ...], Any], labels: Tuple[str, ...], series: List[float]):
+        current = merged.get(labels)
+        merged[labels] = list(series) if current is None else [a + b for a, b in zip(current, series)]
+
+    def samples(self, values: Dict[Tuple[str, ...], Any]) -> Iterator[Tuple[str, str, float]]:
+        bucket_names = self.labelnames + ("le",)
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, series in values.items():
+            cumulative = 0
+            for bound, count in zip(bounds, series[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket", _format_labels(bucket_names, labels + (bound,)), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), series[-1]
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), cumulative
+
+
+class MetricsRegistry:
+    """已注册的指标，以及导出时按需读取的回调（连接池、缓存等已有的统计）"""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        # (名称, 类型, 说明, 读取函数)
+        self._collectors: List[Tuple[str, str, str, Callable[[], float]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(f"{METRICS_PREFIX}_{name}", help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(f"{METRICS_PREFIX}_{name}", help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(f"{METRICS_PREFIX}_{name}", help_text, labelnames, buckets))
+
+    def add_collector(self, name: str, kind: str, help_text: str, read: Callable[[], float]):
+        """注册导出时读取的单值指标，例如连接池中的空闲连接数"""
+        full_name = f"{METRICS_PREFIX}_{name}"
+        # 同名回调只保留最后一次注册（以 python main.py 启动多 worker 时，main 模块在 worker 中会被导入两次）
+        self._collectors = [entry for entry in self._collectors if entry[0] != full_name]
+        self._collectors.append((full_name, kind, help_text, read))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前进程全部指标的快照（可序列化为 JSON）"""
+        return {
+            "pid": os.getpid(),
+            "metrics": {metric.name: metric.export() for metric in self._metrics},
+            "collectors": {name: read() for name, _, _, read in self._collectors}
+        }
+
+    def render(self, snapshots: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        以 Prometheus 文本格式（0.0.4）导出指标
+
+        Args:
+            snapshots: 多个 worker 进程的快照，计数器和直方图求和；已退出进程的 gauge 不计入。
+                为空时只导出当前进程
+        """
+        if snapshots is None:
+            snapshots = [self.snapshot()]
+        alive = {snapshot["pid"]: _pid_alive(snapshot["pid"]) for snapshot in snapshots}
+
+        lines = []
+        for metric in self._metrics:
+            merged: Dict[Tuple[str, ...], Any] = {}
+            for snapshot in snapshots:
+                if metric.kind == "gauge" and not alive[snapshot["pid"]]:
+                    continue
+                for labels, value in snapshot["metrics"].get(metric.name, []):
+                    metric.merge(merged, tuple(labels), value)
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples(merged):
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        for name, kind, help_text, _ in self._collectors:
+            value = sum(
+                snapshot["collectors"].get(name, 0) for snapshot in snapshots
+                if kind != "gauge" or alive[snapshot["pid"]]
+            )
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "http_requests_total", "按接口、方法和状态码统计的请求数", ("endpoint", "method", "status"))
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "请求总耗时（含流式响应的发送）", ("endpoint", "mode"))
+http_in_flight = registry.gauge(
+    "http_requests_in_flight", "正在处理的请求数", ("endpoint",))
+stage_duration = registry.histogram(
+    "stage_duration_seconds", "请求内各阶段的耗时", ("endpoint", "mode", "stage"))
+ark_tokens = registry.counter(
+    "ark_tokens_total", "Ark 返回的 token 用量", ("model", "type"))
+ark_errors = registry.counter(
+    "ark_errors_total", "Ark 调用失败次数", ("model", "error"))
+errors = registry.counter(
+    "errors_total", "请求错误次数（未处理异常或 5xx 响应）", ("endpoint", "kind"))
+degraded_responses = registry.counter(
+    "degraded_responses_total", "Ark 不可用时返回降级结果（degraded: true）的次数", ("endpoint", "mode", "reason"))
+
+
+class RequestMetrics:
+    """单个请求的指标上下文：接口、模式和各阶段耗时"""
+
+    __slots__ = ("endpoint", "mode", "stages")
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.mode = ""
+        # (阶段, 秒)，同一阶段可以出现多次（例如批量接口中每张图片各一次）
+        self.stages: List[Tuple[str, float]] = []
+
+
+_current: contextvars.ContextVar[Optional[RequestMetrics]] = contextvars.ContextVar("request_metrics", default=None)
+
+
+def current_request() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+def set_request_mode(mode: str):
+    """记录当前请求的分析模式，作为耗时直方图的 mode 标签"""
+    request = _current.get()
+    if request is not None:
+        request.mode = mode
+
+
+@contextmanager
+def stage(name: str):
+    """
+    记录一个阶段的耗时，可以跨越 await 使用
+
+    在线程池中执行的函数需要通过 contextvars.copy_context().run 调用才能找到所属请求；
+    不在请求上下文中时（离线脚本、启动阶段）不做记录
+    """
+    request = _current.get()
+    if request is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        # list.append 是原子操作，线程池和事件循环可以同时追加
+        request.stages.append((name, time.perf_counter() - start))
+
+
+def record_stage(name: str, seconds: float):
+    """记录在别处测量好的阶段耗时"""
+    request = _current.get()
+    if request is not None:
+        request.stages.append((name, seconds))
+
+
+def record_token_usage(model: str, usage: Any):
+    """累加 Ark 响应中 usage 字段的 token 数"""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, kind, None)
+        if value:
+            ark_tokens.inc(model, kind.replace("_tokens", ""), amount=value)
+    details = getattr(usage, "completion_tokens_details", None)
+    reasoning = getattr(details, "reasoning_tokens", None) if details is not None else None
+    if reasoning:
+        ark_tokens.inc(model, "reasoning", amount=reasoning)
+
+
+def record_error(kind: str):
+    """记录一次未以 5xx 返回的错误，例如流式响应中的 error 事件、批量分析中单张图片失败"""
+    request = _current.get()
+    errors.inc(request.endpoint if request is not None else OTHER_ENDPOINT, kind)
+
+
+def record_degraded(reason: str):
+    """记录一次因 Ark 不可用而返回降级结果，reason 为 circuit_open、deadline 或 unavailable"""
+    request = _current.get()
+    if request is not None:
+        degraded_responses.inc(request.endpoint, request.mode, reason)
+    else:
+        degraded_responses.inc(OTHER_ENDPOINT, "", reason)
+
+
+class MetricsMiddleware:
+    """统计请求数、总耗时、进行中的请求数、上传接收耗时和 5xx 错误的 ASGI 中间件"""
+
+    def __init__(self, app):
+        self.app = app
+        self._endpoints: Optional[frozenset] = None
+
+    def _endpoint(self, scope) -> str:
+        # 路由都没有路径参数，路径本身就是路由模板；首次请求时收集一次
+        if self._endpoints is None:
+            routes = getattr(scope.get("app"), "routes", [])
+            self._endpoints = frozenset(route.path for route in routes if hasattr(route, "path"))
+        path = scope["path"]
+        return path if path in self._endpoints else OTHER_ENDPOINT
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._endpoint(scope)
+        request = RequestMetrics(endpoint)
+        token = _current.set(request)
+        start = time.perf_counter()
+        status = 500
+        failed = False
+        http_in_flight.inc(endpoint)
+
+        async def timed_receive():
+            # 最后一块请求体到达时记录上传接收耗时（multipart 解析与接收交替进行，一并计入）
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False) and message.get("body"):
+                request.stages.append(("upload_read", time.perf_counter() - start))
+            return message
+
+        async def status_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, timed_receive, status_send)
+        except Exception:
+            failed = True
+            errors.inc(endpoint, "exception")
+            raise
+        finally:
+            _current.reset(token)
+            http_in_flight.dec(endpoint)
+            duration = time.perf_counter() - start
+            http_requests.inc(endpoint, scope["method"], str(status))
+            http_request_duration.observe(duration, endpoint, request.mode)
+            if status >= 500 and not failed:
+                errors.inc(endpoint, "http_5xx")
+            for name, seconds in request.stages:
+                stage_duration.observe(seconds, endpoint, request.mode, name)
+
+
+def write_snapshot():
+    """把当前进程的指标快照写入 METRICS_DIR（先写临时文件再替换，读取方不会读到半个文件）"""
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_snapshots() -> List[Dict[str, Any]]:
+    snapshots = []
+    for name in os.listdir(METRICS_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name), "r", encoding="utf-8") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning("读取指标快照失败: %s (%s)", name, e)
+    return snapshots
+
+
+async def _snapshot_loop():
+    while True:
+        await asyncio.sleep(METRICS_SNAPSHOT_INTERVAL)
+        try:
+            write_snapshot()
+        except OSError as e:
+            logger.warning("写入指标快照失败: %s", e)
+
+
+def start_snapshots() -> Optional[asyncio.Task]:
+    """配置了 METRICS_DIR 时启动定期写快照的后台任务（在应用启动时调用）"""
+    if not METRICS_DIR:
+        return None
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    write_snapshot()
+    return asyncio.create_task(_snapshot_loop())
+
+
+async def stop_snapshots(task: Optional[asyncio.Task]):
+    """停止后台任务并写入最后一次快照，已退出 worker 的计数仍计入汇总"""
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    write_snapshot()
+
+
+def render_metrics() -> str:
+    if not METRICS_DIR:
+        return registry.render()
+    write_snapshot()
+    return registry.render(read_snapshots())
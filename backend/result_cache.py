@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+分析结果缓存
+以规范化图片内容 + 模式 + 提示词 + 模型的哈希作为键，缓存 Ark 分析结果，
+避免重试、重复点击和历史同步时对同一张图片重复调用模型。
+SQLite 磁盘层的读写在专用线程中执行，不阻塞事件循环；磁盘层出错时按未命中处理
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+# 为空时不启用磁盘缓存
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "")
+# 清理磁盘层过期条目的最短间隔（秒）
+RESULT_CACHE_PRUNE_INTERVAL = float(os.getenv("RESULT_CACHE_PRUNE_INTERVAL", "300"))
+
+
+class ResultCache:
+    """内存 LRU + TTL 缓存，可选 SQLite 磁盘层（重启后仍可命中）"""
+
+    def __init__(self, max_entries: int, ttl: float, db_path: str = ""):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (过期时间, 分析结果, 图片负载字节数)
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        # 连接只在这一个线程中使用
+        self._db_executor: Optional[ThreadPoolExecutor] = None
+        self._last_prune = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS result_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "payload_bytes INTEGER NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS result_cache_expires_at ON result_cache (expires_at)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error("结果缓存磁盘层初始化失败，仅使用内存缓存: %s", e)
+                self._db = None
+                return
+            self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="result-cache-db")
+            logger.info("结果缓存已启用磁盘层: %s", db_path)
+
+    @staticmethod
+    def make_key(image_data: str, mode: str, prompt: str, model: str) -> str:
+        """根据规范化图片数据、模式、提示词和模型计算缓存键"""
+        digest = hashlib.sha256()
+        for part in (image_data, mode, prompt, model):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """查询缓存，命中时返回分析结果"""
+        now = time.time()
+        entry = self._entries.get(key)
+
+        if entry is not None and entry[0] <= now:
+            del self._entries[key]
+            entry = None
+
+        if entry is None and self._db is not None:
+            row = await asyncio.get_running_loop().run_in_executor(self._db_executor, self._db_get, key)
+            if row is not None and row[0] > now:
+                entry = (row[0], row[1], row[2])
+                self._remember(key, entry)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.bytes_saved += entry[2]
+        return entry[1]
+
+    def set(self, key: str, value: str, payload_bytes: int):
+        """写入缓存，payload_bytes 为命中时可省去的图片上传字节数（磁盘层在后台线程写入，不等待完成）"""
+        entry = (time.time() + self.ttl, value, payload_bytes)
+        self._remember(key, entry)
+
+        if self._db is not None:
+            self._db_executor.submit(self._db_set, key, entry)
+
+    def _db_get(self, key: str) -> Optional[Tuple[float, str, int]]:
+        """在磁盘层线程中查询，出错时按未命中处理"""
+        try:
+            return self._db.execute(
+                "SELECT expires_at, value, payload_bytes FROM result_cache WHERE key = ?",
+                (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("结果缓存磁盘层读取失败，按未命中处理: %s", e)
+            return None
+
+    def _db_set(self, key: str, entry: Tuple[float, str, int]):
+        """在磁盘层线程中写入，并按 RESULT_CACHE_PRUNE_INTERVAL 间隔清理过期条目"""
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO result_cache (key, value, payload_bytes, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, entry[1], entry[2], entry[0])
+            )
+            now = time.time()
+            if now - self._last_prune >= RESULT_CACHE_PRUNE_INTERVAL:
+                self._db.execute("DELETE FROM result_cache WHERE expires_at <= ?", (now,))
+                self._last_prune = now
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning("结果缓存磁盘层写入失败: %s", e)
+            try:
+                self._db.rollback()
+            except sqlite3.Error:
+                pass
+
+    def _remember(self, key: str, entry: Tuple[float, str, int]):
+        """写入内存层并按 LRU 淘汰"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计：命中率和节省的字节数"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "disk_tier": self._db is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved
+        }
+
+
+result_cache = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL, RESULT_CACHE_DB)
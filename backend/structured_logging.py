@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+结构化日志
+所有日志经 QueueHandler 放入内存队列，由 QueueListener 的后台线程格式化为 JSON 行并写出，
+请求处理和事件循环中只剩一次入队，不再同步执行格式化和 stderr 写入。
+模型输出等大段内容只在 DEBUG 级别完整记录，INFO 级别按比例抽样记录截断的预览
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from metrics import current_request
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# json 或 text（本地开发时便于阅读）
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# INFO 级别下记录模型输出预览的比例，0 为不记录
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+LOG_PAYLOAD_PREVIEW_CHARS = int(os.getenv("LOG_PAYLOAD_PREVIEW_CHARS", "200"))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# LogRecord 的标准属性，其余属性（extra 传入的字段）原样输出到 JSON
+# uvicorn 的 color_message 是带终端颜色码的重复消息，不输出
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "color_message"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON：时间、级别、logger、消息，以及 extra 字段和请求上下文"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """在调用线程中为日志附加当前请求的接口和模式（之后由后台线程格式化时已无法获取上下文）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request = current_request()
+        if request is not None:
+            record.endpoint = request.endpoint
+            if request.mode:
+                record.mode = request.mode
+        return True
+
+
+class InProcessQueueHandler(QueueHandler):
+    """
+    进程内队列的 QueueHandler
+
+    标准实现在入队前调用 format() 把参数合并进消息，以便跨进程序列化；
+    进程内队列直接传递 LogRecord，格式化完全留给后台线程
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(stream=None):
+    """配置根 logger：请求线程只入队，后台线程格式化并写出（重复调用时只生效一次）"""
+    global _listener
+
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    handler = InProcessQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """写出队列中剩余的日志并停止后台线程"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_payload(logger: logging.Logger, label: str, payload: str):
+    """
+    记录模型输出等大段内容
+
+    DEBUG 级别完整记录；INFO 级别按 LOG_PAYLOAD_SAMPLE_RATE 抽样记录前 LOG_PAYLOAD_PREVIEW_CHARS 个字符。
+    出错时的完整内容由调用方以 ERROR 级别直接记录
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %s", label, payload, extra={"payload_chars": len(payload)})
+    elif (LOG_PAYLOAD_SAMPLE_RATE > 0
+          and logger.isEnabledFor(logging.INFO)
+          and random.random() < LOG_PAYLOAD_SAMPLE_RATE):
+        logger.info(
+            "%s（抽样预览）: %s", label, payload[:LOG_PAYLOAD_PREVIEW_CHARS],
+            extra={"payload_chars": len(payload), "sampled": True}
+        )
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+时间线查询的事件存储索引
+按需加载离线流水线生成的事件存储（内存映射）并建立时间索引，供 /timeline 接口分页查询。
+事件存储被批量导入重写或被增量更新追加后，下一次查询时自动重新加载
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from typing import Optional, Dict, Any, Tuple
+
+# 共享的 petlog 模块位于仓库根目录
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+from petlog.event_store import EventStore, EVENT_STORE_PATH
+from petlog.timeline import TimelineIndex
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_EVENT_STORE = os.getenv("TIMELINE_EVENT_STORE", os.path.join(REPO_ROOT, EVENT_STORE_PATH))
+
+# 用于判断事件存储是否变化的文件：追加时时间列变长，重写时全部文件替换
+_SIGNATURE_FILES = ("timestamp.npy", "categories.npy")
+
+
+class TornEventStore(RuntimeError):
+    """事件存储正在被追加写入，各列长度不一致"""
+
+
+def _check_consistent(store: EventStore):
+    """
+    检查各列长度是否一致。EventStore.append 逐列写入，
+    读到写了一半的存储时各列行数不同，或类别编码超出类别字典
+
+    Raises:
+        TornEventStore: 各列不一致
+    """
+    rows = len(store.timestamp)
+    lengths = {
+        "category": len(store.category),
+        "confidence": len(store.confidence),
+        "description_length": len(store.description_length),
+        "reasons_offsets": len(store.reasons_offsets) - 1
+    }
+    torn = {name: length for name, length in lengths.items() if length != rows}
+    if torn:
+        raise TornEventStore(f"事件存储各列长度不一致: timestamp={rows}, {torn}")
+    if rows and int(store.reasons_offsets[-1]) != len(store.reasons_heap):
+        raise TornEventStore("事件存储的 reasons 偏移量与数据长度不一致")
+    if rows and int(store.category.max()) >= len(store.categories):
+        raise TornEventStore("事件存储的类别编码超出类别字典")
+
+
+class TimelineIndexLoader:
+    """缓存事件存储的时间索引，文件变化时重新加载"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index: Optional[TimelineIndex] = None
+        self._signature: Optional[Tuple] = None
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.last_load_ms = 0.0
+
+    def _current_signature(self) -> Tuple:
+        signature = []
+        for name in _SIGNATURE_FILES:
+            stat = os.stat(os.path.join(self.path, name))
+            signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+
+    def get(self) -> TimelineIndex:
+        """
+        返回最新的时间索引
+
+        Raises:
+            FileNotFoundError: 事件存储不存在
+            TornEventStore: 首次加载时事件存储正在被写入
+        """
+        signature = self._current_signature()
+        with self._lock:
+            if self._index is None or signature != self._signature:
+                start = time.perf_counter()
+                store = EventStore.load(self.path)
+                try:
+                    _check_consistent(store)
+                except TornEventStore as e:
+                    if self._index is None:
+                        raise
+                    # 不记录新的签名，下一次查询时重新检查
+                    logger.warning("事件存储正在写入，继续使用上一版时间索引: %s", e)
+                    return self._index
+                self._index = TimelineIndex(store)
+                self._signature = signature
+                self.loads += 1
+                self.last_load_ms = (time.perf_counter() - start) * 1000
+                logger.info("时间线索引已加载: %s 条事件，耗时 %.1f ms", len(self._index), self.last_load_ms)
+            return self._index
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "events": len(self._index) if self._index is not None else None,
+            "loads": self.loads,
+            "last_load_ms": round(self.last_load_ms, 1)
+        }
+
+
+timeline_index = TimelineIndexLoader(TIMELINE_EVENT_STORE)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+上传大小限制
+在请求体进入 multipart 解析之前按 Content-Length 提前拒绝超限上传，
+对未声明长度的分块上传则边接收边计数，超过上限立即中止
+"""
+
+import os
+import logging
+from typing import Optional
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# 单个请求体的最大字节数，默认 20 MB
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+
+
+class _UploadTooLarge(Exception):
+    """请求体超过上限"""
+
+
+def _parse_content_length(value: bytes) -> Optional[int]:
+    """解析 Content-Length，不是非负整数时返回 None"""
+    value = value.strip()
+    if not value.isdigit():
+        return None
+    return int(value)
+
+
+class UploadSizeLimitMiddleware:
+    """限制 POST/PUT 请求体大小的 ASGI 中间件，超限时返回 413"""
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def _reject(self, scope, receive, send):
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"上传内容过大，最大允许 {self.max_bytes // (1024 * 1024)} MB"}
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            declared = _parse_content_length(content_length)
+            if declared is None:
+                logger.warning("Invalid Content-Length header: %r", content_length)
+                response = JSONResponse(status_code=400, content={"detail": "Content-Length 请求头无效"})
+                await response(scope, receive, send)
+                return
+            if declared > self.max_bytes:
+                logger.warning("Upload rejected by Content-Length: %s bytes", declared)
+                await self._reject(scope, receive, send)
+                return
+
+        received = 0
+        exceeded = False
+        responded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _UploadTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal responded
+            # 请求体解析中途超限时，框架可能把异常包装成 400，这里统一替换为 413
+            if exceeded:
+                if message["type"] == "http.response.start" and not responded:
+                    await self._reject(scope, receive, send)
+                responded = True
+                return
+            responded = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _UploadTooLarge:
+            if not responded:
+                await self._reject(scope, receive, send)
+        if exceeded:
+            logger.warning("Upload aborted after %s bytes", received)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+docx 文字提取：iterparse 流式读取 vs python-docx
+以 timestampcategoryconfidencereasons2025.docx 的正文为模板，重复生成指定大小的 word/document.xml
+（末尾附带一个表格），分别在独立的子进程中用两种方式提取文字，报告耗时和峰值内存，并校验两者输出一致
+
+用法:
+    python benchmarks/docx_extraction.py --mb 50
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import zipfile
+import argparse
+import resource
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEMPLATE = os.path.join(ROOT, "timestampcategoryconfidencereasons2025.docx")
+
+TABLE_ROW = (
+    "<w:tr><w:tc><w:p><w:r><w:t>{index}</w:t></w:r></w:p></w:tc>"
+    "<w:tc><w:p><w:r><w:t>observe</w:t></w:r></w:p></w:tc>"
+    "<w:tc><w:p><w:r><w:t>猫趴在床单上，头部转向左侧。</w:t></w:r></w:p></w:tc></w:tr>"
+)
+
+
+def make_report(path, size_mb):
+    """以模板文档的正文段落为单位重复，生成 word/document.xml 约 size_mb MB 的 docx"""
+    with zipfile.ZipFile(TEMPLATE) as template:
+        document = template.read("word/document.xml").decode("utf-8")
+        head, rest = document.split("<w:body>", 1)
+        body, tail = rest.rsplit("</w:body>", 1)
+        section = re.search(r"<w:sectPr.*</w:sectPr>", body, re.S)
+        paragraphs = body[:section.start()] if section else body
+        section = section.group(0) if section else ""
+
+        repeats = max(1, int(size_mb * 1024 * 1024 / len(paragraphs.encode("utf-8"))))
+        table = "<w:tbl>" + "".join(TABLE_ROW.format(index=i) for i in range(1000)) + "</w:tbl>"
+        xml = f"{head}<w:body>{paragraphs * repeats}{table}{section}</w:body>{tail}"
+
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as report:
+            for name in template.namelist():
+                if name != "word/document.xml":
+                    report.writestr(name, template.read(name))
+            report.writestr("word/document.xml", xml)
+    return len(xml.encode("utf-8"))
+
+
+def run_method(method, path):
+    """在当前进程中提取文字，打印 耗时 峰值内存 输出长度"""
+    import read_docx
+    start = time.perf_counter()
+    if method == "stream":
+        content = "\n".join(read_docx.iter_docx_text(path))
+    else:
+        content = read_docx.read_docx_file_with_python_docx(path)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(f"{path}.{method}.txt", "w", encoding="utf-8") as f:
+        f.write(content)
+    print(elapsed, peak_kb, len(content))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=50, help="word/document.xml 的大小（MB）")
+    parser.add_argument("--make", metavar="PATH", help=argparse.SUPPRESS)
+    parser.add_argument("--run", nargs=2, metavar=("METHOD", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.make:
+        print(make_report(args.make, args.mb))
+        return
+    if args.run:
+        run_method(*args.run)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="docx_bench_")
+    try:
+        path = os.path.join(workdir, "report.docx")
+        # 生成和提取都在子进程中进行：Linux 上子进程的峰值内存统计从父进程继承
+        script = os.path.abspath(__file__)
+        made = subprocess.run([sys.executable, script, "--mb", str(args.mb), "--make", path],
+                              capture_output=True, text=True, check=True)
+        xml_size = int(made.stdout)
+        print(f"测试文档: {os.path.getsize(path) / 1024 / 1024:.1f} MB（word/document.xml {xml_size / 1024 / 1024:.1f} MB）")
+
+        for method, label in (("stream", "iterparse 流式"), ("python-docx", "python-docx")):
+            result = subprocess.run(
+                [sys.executable, script, "--run", method, path],
+                capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                print(f"  {label}: 失败\n{result.stderr.strip()}")
+                continue
+            elapsed, peak_kb, length = result.stdout.split()[-3:]
+            print(f"  {label:14s} {float(elapsed):7.2f} s  峰值内存 {int(peak_kb) / 1024:7.0f} MB  输出 {length} 字符")
+
+        outputs = [f"{path}.{method}.txt" for method in ("stream", "python-docx")]
+        if all(os.path.exists(output) for output in outputs):
+            with open(outputs[0], encoding="utf-8") as a, open(outputs[1], encoding="utf-8") as b:
+                print(f"  输出一致: {a.read() == b.read()}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式事件存储与 import_log.json 的加载耗时对比
+生成按 5 秒间隔连续采样的合成事件，分别保存为事件存储和 indent=2 的 import_log.json 格式，
+测量加载并读取时间戳、类别、置信度三列的耗时
+
+用法:
+    python benchmarks/event_store_load.py --events 6307200 --json-events 200000
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from petlog.event_store import EventStore, decode_timestamps
+
+CATEGORIES = ["no_pet", "observe", "explore", "neutral", "occupy", "play", "attack"]
+CATEGORIES_CN = ["无宠物", "观望", "探索", "中性", "占据", "玩耍", "攻击"]
+
+START = np.datetime64("2025-01-01T00:00:00", "s").astype(np.int64)
+
+
+def make_synthetic_store(n: int, seed: int = 0) -> EventStore:
+    """直接按列生成 n 条合成事件，reasons 从少量模板中选取"""
+    rng = np.random.default_rng(seed)
+    codes = rng.integers(0, len(CATEGORIES), n).astype(np.int16)
+    confidence = np.round(rng.uniform(0.3, 1.0, n), 2).astype(np.float32)
+
+    descriptions = [f"猫在室内{cn}，画面中可见床单和玩具。" for cn in CATEGORIES_CN]
+    templates = [
+        json.dumps({"category": cn, "confidence": 0.9, "reasons": description}, ensure_ascii=False).encode("utf-8")
+        for cn, description in zip(CATEGORIES_CN, descriptions)
+    ]
+    lengths = np.array([len(t) for t in templates], dtype=np.int64)[codes]
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    heap = np.empty(int(offsets[-1]), dtype=np.uint8)
+    for code, template in enumerate(templates):
+        # 同一模板的所有记录一次性写入：按行展开起始偏移 + 模板内偏移
+        starts = offsets[:-1][codes == code]
+        index = (starts[:, None] + np.arange(len(template))).ravel()
+        heap[index] = np.tile(np.frombuffer(template, dtype=np.uint8), len(starts))
+
+    return EventStore(
+        timestamp=START + np.arange(n, dtype=np.int64) * 5,
+        category=codes,
+        categories=CATEGORIES,
+        confidence=confidence,
+        reasons_offsets=offsets,
+        reasons_heap=heap,
+        description_length=np.array([len(d) for d in descriptions], dtype=np.int32)[codes]
+    )
+
+
+def write_import_log(store: EventStore, path: str):
+    """按旧流水线的 import_log.json 格式写出"""
+    records = [record.to_dict() for record in store.iter_records()]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+
+
+def time_store_load(path: str) -> float:
+    start = time.perf_counter()
+    store = EventStore.load(path)
+    # 读取三列并做一次聚合，确保数据真正被访问
+    hours = (store.timestamp // 3600) % 24
+    np.bincount(store.category, minlength=len(store.categories))
+    float(store.confidence.mean())
+    int(hours.max())
+    return time.perf_counter() - start
+
+
+def time_json_load(path: str) -> float:
+    start = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    [r["timestamp"] for r in records]
+    [r["category"] for r in records]
+    [r["confidence"] for r in records]
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=365 * 24 * 720, help="事件存储的事件数（默认一年 5 秒一帧）")
+    parser.add_argument("--json-events", type=int, default=200_000, help="import_log.json 对照组的事件数")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="event_store_bench_")
+    try:
+        store_path = os.path.join(workdir, "events.store")
+        store = make_synthetic_store(args.events)
+        store.save(store_path)
+        size_mb = sum(os.path.getsize(os.path.join(store_path, f)) for f in os.listdir(store_path)) / 1024 / 1024
+        first, last = decode_timestamps(store.timestamp[[0, -1]])
+        print(f"事件存储: {args.events} 条 ({first} ~ {last}), {size_mb:.1f} MB")
+        print(f"  加载 + 列聚合: {time_store_load(store_path) * 1000:.1f} ms")
+
+        json_path = os.path.join(workdir, "import_log.json")
+        write_import_log(make_synthetic_store(args.json_events), json_path)
+        json_mb = os.path.getsize(json_path) / 1024 / 1024
+        elapsed = time_json_load(json_path)
+        print(f"import_log.json: {args.json_events} 条, {json_mb:.1f} MB")
+        print(f"  加载 + 取列: {elapsed * 1000:.1f} ms "
+              f"(按比例折算 {args.events} 条约 {elapsed * args.events / args.json_events:.1f} s)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
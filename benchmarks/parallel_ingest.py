@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量导入的并行加速比
+生成若干个“设备 × 天”的合成监控日志导出文件（与 document_content.txt 相同的原始格式，
+同一天的各设备时间交错），分别用 1..N 个进程运行 ingest_exports，报告耗时和吞吐量
+
+用法:
+    python benchmarks/parallel_ingest.py --devices 4 --days 4 --events-per-file 20000 --workers 1,2,4,8
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from event_store_load import make_synthetic_store
+from ingest_exports import find_exports, ingest_exports
+
+RAW_HEADER = "timestampcategoryconfidencereasons"
+
+
+def write_raw_export(path, store, offset):
+    """按原始导出格式写出，时间整体平移 offset 秒"""
+    store.timestamp = store.timestamp + offset
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(RAW_HEADER)
+        for record in store.iter_records():
+            reasons = json.dumps(record.reasons, ensure_ascii=False, indent=0)
+            f.write(f"{record.timestamp}{record.category}{record.confidence}```json\n{reasons}\n```")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--days", type=int, default=4)
+    parser.add_argument("--events-per-file", type=int, default=20000)
+    parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4, 8) if n <= os.cpu_count()))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ingest_bench_")
+    cwd = os.getcwd()
+    try:
+        exports = os.path.join(workdir, "exports")
+        os.makedirs(exports)
+        for day in range(args.days):
+            for device in range(args.devices):
+                # 同一天各设备错开 1 秒，归并时逐条交错
+                store = make_synthetic_store(args.events_per_file, seed=day * args.devices + device)
+                write_raw_export(os.path.join(exports, f"day{day:02d}_device{device}.txt"), store, day * 86400 + device)
+        paths = find_exports([exports])
+        total = args.devices * args.days * args.events_per_file
+        print(f"{len(paths)} 个导出文件，共 {total} 条事件，CPU 核数 {os.cpu_count()}")
+
+        os.chdir(workdir)
+        baseline = None
+        for workers in (int(n) for n in args.workers.split(",")):
+            start = time.perf_counter()
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                ingest_exports(paths, workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"  {workers:2d} 个进程: {elapsed:6.2f} s  {total / elapsed:9.0f} 条/秒  加速比 {baseline / elapsed:.2f}x")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
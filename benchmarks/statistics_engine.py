@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统计报表生成耗时：逐条处理 vs 向量化聚合
+对合成事件分别运行原来的逐条实现（import_log.json 记录列表 + defaultdict）
+和 petlog.aggregations.compute_statistics，并校验两者输出的 JSON 完全一致
+
+用法:
+    python benchmarks/statistics_engine.py --sizes 10000,100000,1000000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from event_store_load import make_synthetic_store
+from petlog.aggregations import compute_statistics
+
+
+def legacy_statistics(import_data):
+    """原 final_import_verification.generate_statistics_data 的逐条实现"""
+    daily_stats = defaultdict(lambda: {
+        'total_activities': 0,
+        'categories': defaultdict(int),
+        'avg_confidence': 0,
+        'confidence_sum': 0
+    })
+    hourly_stats = defaultdict(int)
+    category_totals = defaultdict(int)
+    total_confidence = 0
+
+    for record in import_data:
+        dt = datetime.fromisoformat(record['timestamp'])
+        date_key = dt.strftime('%Y-%m-%d')
+        hour_key = dt.hour
+        category = record['category']
+        confidence = record['confidence']
+
+        daily_stats[date_key]['total_activities'] += 1
+        daily_stats[date_key]['categories'][category] += 1
+        daily_stats[date_key]['confidence_sum'] += confidence
+        hourly_stats[hour_key] += 1
+        category_totals[category] += 1
+        total_confidence += confidence
+
+    for date_key in daily_stats:
+        stats = daily_stats[date_key]
+        stats['avg_confidence'] = stats['confidence_sum'] / stats['total_activities']
+        del stats['confidence_sum']
+
+    return {
+        'summary': {
+            'total_records': len(import_data),
+            'total_categories': len(category_totals),
+            'avg_confidence': total_confidence / len(import_data),
+            'date_range': {
+                'start': min(record['timestamp'] for record in import_data),
+                'end': max(record['timestamp'] for record in import_data)
+            }
+        },
+        'daily_statistics': dict(daily_stats),
+        'hourly_distribution': dict(hourly_stats),
+        'category_distribution': dict(category_totals)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="逗号分隔的事件数")
+    args = parser.parse_args()
+
+    print(f"{'事件数':>10} {'逐条实现':>12} {'向量化':>10} {'加速比':>8}  输出一致")
+    for size in (int(s) for s in args.sizes.split(",")):
+        store = make_synthetic_store(size)
+        import_data = [record.to_dict() for record in store.iter_records()]
+
+        start = time.perf_counter()
+        expected = legacy_statistics(import_data)
+        legacy_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = compute_statistics(store)
+        vector_elapsed = time.perf_counter() - start
+
+        same = json.dumps(expected, ensure_ascii=False, indent=2) == json.dumps(actual, ensure_ascii=False, indent=2)
+        print(f"{size:>10} {legacy_elapsed * 1000:>10.1f}ms {vector_elapsed * 1000:>8.1f}ms "
+              f"{legacy_elapsed / vector_elapsed:>7.1f}x  {'是' if same else '否'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+行为转换统计耗时：逐条拼接 "a -> b" 字符串键 vs 按类别编号的计数矩阵
+对合成事件（5 秒一帧，每天之间有一段停机间隔）分别运行原来的逐条实现和 TransitionMatrix，
+并测量按天分别统计后相加、以及查询“X 之后最可能的行为”的耗时
+
+用法:
+    python benchmarks/transition_matrix.py --days 30
+"""
+
+import os
+import sys
+import time
+import argparse
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from event_store_load import make_synthetic_store
+from petlog.transitions import TransitionMatrix
+
+EVENTS_PER_DAY = 24 * 720
+
+
+def legacy_transitions(categories):
+    """原 generate_behavior_analysis 中的逐条实现（不考虑时间间隔）"""
+    transitions = defaultdict(int)
+    for i in range(len(categories) - 1):
+        transitions[f"{categories[i]} -> {categories[i + 1]}"] += 1
+    return dict(transitions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30, help="合成事件的天数")
+    args = parser.parse_args()
+
+    store = make_synthetic_store(args.days * EVENTS_PER_DAY)
+    # 每天之间停机 1 小时：跨越停机的相邻事件不应计为转换
+    timestamps = store.timestamp + np.arange(len(store), dtype=np.int64) // EVENTS_PER_DAY * 3600
+
+    names = store.category_names()
+    start = time.perf_counter()
+    legacy = legacy_transitions(names)
+    legacy_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix = TransitionMatrix.from_events(timestamps, store.category, store.categories, max_gap=None)
+    matrix_elapsed = time.perf_counter() - start
+    same = all(
+        legacy.get(f"{a} -> {b}", 0) == int(matrix.counts[i, j])
+        for i, a in enumerate(matrix.categories) for j, b in enumerate(matrix.categories)
+    )
+
+    print(f"{len(store)} 条事件 ({args.days} 天)")
+    print(f"  逐条字符串键:     {legacy_elapsed * 1000:8.1f} ms")
+    print(f"  计数矩阵:         {matrix_elapsed * 1000:8.1f} ms  (与逐条结果一致: {same})")
+
+    start = time.perf_counter()
+    gapped = TransitionMatrix.from_events(timestamps, store.category, store.categories)
+    elapsed = time.perf_counter() - start
+    print(f"  计数矩阵 + 间隔:  {elapsed * 1000:8.1f} ms  "
+          f"(max_gap={gapped.max_gap}s 排除 {int(matrix.counts.sum() - gapped.counts.sum())} 个跨间隔转换)")
+
+    start = time.perf_counter()
+    daily = [
+        TransitionMatrix.from_events(timestamps[day:day + EVENTS_PER_DAY], store.category[day:day + EVENTS_PER_DAY],
+                                     store.categories)
+        for day in range(0, len(store), EVENTS_PER_DAY)
+    ]
+    merged = sum(daily)
+    elapsed = time.perf_counter() - start
+    print(f"  按天统计 + 相加:  {elapsed * 1000:8.1f} ms  "
+          f"(与整体统计一致: {np.array_equal(gapped.counts, merged.counts)})")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        merged.most_likely_next("play")
+    elapsed = time.perf_counter() - start
+    print(f"  most_likely_next: {elapsed * 1000:8.3f} ms/千次 -> {merged.most_likely_next('play')}")
+
+
+if __name__ == "__main__":
+    main()
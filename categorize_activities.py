@@ -3,70 +3,17 @@
 
 import json
 import sys
-import re
 from collections import defaultdict
-from datetime import datetime
+
+from petlog.parser import iter_file_records, iter_text_records, record_to_event
 
 def parse_raw_document(content):
     """直接解析原始文档内容"""
-    events = []
-    
-    # 使用正则表达式提取时间戳、类别、置信度和原因
-    pattern = r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})([a-z_]+)([\d.]+)```json\s*\{\s*"category":\s*"([^"]+)",\s*"confidence":\s*([\d.]+),\s*"reasons":\s*"([^"]+)"\s*\}'
-    
-    matches = re.findall(pattern, content, re.DOTALL)
-    
-    for match in matches:
-        timestamp, category_en, confidence_raw, category_cn, confidence, reasons = match
-        
-        # 格式化时间戳
-        try:
-            dt = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-            formatted_timestamp = dt.isoformat()
-        except:
-            formatted_timestamp = timestamp
-        
-        # 创建事件对象
-        event = {
-            "timestamp": formatted_timestamp,
-            "title": f"{category_cn}行为",
-            "content": reasons,
-            "category": category_en,
-            "confidence": float(confidence),
-            "metadata": {
-                "source": "document",
-                "original_text": f"category: {category_cn}, confidence: {confidence}",
-                "location": "室内" if "室内" in reasons else "未知"
-            },
-            "tags": extract_tags_from_content(reasons, category_cn)
-        }
-        
-        events.append(event)
-    
-    return events
+    return [record_to_event(record) for record in iter_text_records(content)]
 
-def extract_tags_from_content(content, category):
-    """从内容中提取标签"""
-    tags = [category]
-    
-    # 常见标签词汇
-    tag_keywords = {
-        "猫": ["猫"],
-        "狗": ["狗"],
-        "室内": ["室内", "房间", "家庭"],
-        "观望": ["观望", "注视", "观察", "警觉"],
-        "探索": ["探索", "嗅探", "巡视", "移动"],
-        "休息": ["休息", "躺", "放松", "静止"],
-        "床单": ["床单", "垫子", "毛绒"],
-        "蓝色": ["蓝色"]
-    }
-    
-    for tag, keywords in tag_keywords.items():
-        if any(keyword in content for keyword in keywords):
-            if tag not in tags:
-                tags.append(tag)
-    
-    return tags
+def parse_document_file(file_path):
+    """逐行流式解析文档文件，不把整个文件读入内存"""
+    return [record_to_event(record) for record in iter_file_records(file_path)]
 
 def categorize_activities(events):
     """按活动类型分类整理数据"""
@@ -131,16 +78,13 @@ def generate_summary(categories):
     return summary
 
 def main():
-    # 读取原始文档内容
+    # 逐行读取并解析原始文档
     try:
-        with open("document_content.txt", "r", encoding="utf-8") as f:
-            content = f.read()
+        events = parse_document_file("document_content.txt")
     except FileNotFoundError:
         print("找不到document_content.txt文件")
         sys.exit(1)
     
-    # 解析事件数据
-    events = parse_raw_document(content)
     print(f"共解析到 {len(events)} 个事件")
     
     if not events:
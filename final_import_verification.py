@@ -3,43 +3,40 @@
 
 import json
 import os
-from datetime import datetime, timedelta
 from collections import defaultdict
 
+from petlog.event_store import EventStore, EVENT_STORE_PATH
+from petlog.aggregations import PartialAggregates
+from petlog.exports import TSV_HEADER_LINE, write_activity_rows, timeline_item, category_chinese
+
 def create_final_import_files():
     """创建最终的导入文件，确保与应用程序完全兼容"""
     
-    # 读取处理好的数据
-    with open('import_log.json', 'r', encoding='utf-8') as f:
-        import_data = json.load(f)
+    # 读取列式事件存储（内存映射，不复制数据）
+    store = EventStore.load(EVENT_STORE_PATH)
+    # 统计报表、行为分析、时间线摘要共用一次聚合结果
+    aggregates = PartialAggregates.from_store(store)
     
     print("=== 创建最终导入文件 ===")
-    print(f"处理记录数: {len(import_data)}")
+    print(f"处理记录数: {len(store)}")
     
     # 1. 创建标准的宠物活动数据文件（用于应用程序文件导入）
     with open('final_pet_activity_data.txt', 'w', encoding='utf-8') as f:
-        f.write("timestamp\tcategory\tconfidence\treasons\n")
-        
-        for record in import_data:
-            timestamp = record['timestamp']
-            category = record['category']
-            confidence = record['confidence']
-            reasons = json.dumps(record['reasons'], ensure_ascii=False)
-            
-            f.write(f"{timestamp}\t{category}\t{confidence}\t{reasons}\n")
+        f.write(TSV_HEADER_LINE)
+        write_activity_rows(f, store)
     
     # 2. 创建统计报表数据
-    stats_data = generate_statistics_data(import_data)
+    stats_data = generate_statistics_data(aggregates)
     with open('statistics_data.json', 'w', encoding='utf-8') as f:
         json.dump(stats_data, f, ensure_ascii=False, indent=2)
     
     # 3. 创建行为分析数据
-    behavior_data = generate_behavior_analysis(import_data)
+    behavior_data = generate_behavior_analysis(aggregates)
     with open('behavior_analysis_data.json', 'w', encoding='utf-8') as f:
         json.dump(behavior_data, f, ensure_ascii=False, indent=2)
     
     # 4. 创建时间线数据
-    timeline_data = generate_timeline_data(import_data)
+    timeline_data = generate_timeline_data(store, aggregates)
     with open('timeline_data.json', 'w', encoding='utf-8') as f:
         json.dump(timeline_data, f, ensure_ascii=False, indent=2)
     
@@ -51,113 +48,26 @@ def create_final_import_files():
     print("  - timeline_data.json (时间线数据)")
     
     return {
-        'total_records': len(import_data),
+        'total_records': len(store),
         'files_created': 4,
         'statistics': stats_data,
         'behavior_analysis': behavior_data
     }
 
-def generate_statistics_data(import_data):
-    """生成统计报表数据"""
-    
-    # 按日期分组
-    daily_stats = defaultdict(lambda: {
-        'total_activities': 0,
-        'categories': defaultdict(int),
-        'avg_confidence': 0,
-        'confidence_sum': 0
-    })
-    
-    # 按小时分组
-    hourly_stats = defaultdict(int)
-    
-    # 总体统计
-    category_totals = defaultdict(int)
-    total_confidence = 0
-    
-    for record in import_data:
-        dt = datetime.fromisoformat(record['timestamp'])
-        date_key = dt.strftime('%Y-%m-%d')
-        hour_key = dt.hour
-        category = record['category']
-        confidence = record['confidence']
-        
-        # 日统计
-        daily_stats[date_key]['total_activities'] += 1
-        daily_stats[date_key]['categories'][category] += 1
-        daily_stats[date_key]['confidence_sum'] += confidence
-        
-        # 小时统计
-        hourly_stats[hour_key] += 1
-        
-        # 总体统计
-        category_totals[category] += 1
-        total_confidence += confidence
-    
-    # 计算平均置信度
-    for date_key in daily_stats:
-        stats = daily_stats[date_key]
-        stats['avg_confidence'] = stats['confidence_sum'] / stats['total_activities']
-        del stats['confidence_sum']  # 删除临时字段
-    
-    return {
-        'summary': {
-            'total_records': len(import_data),
-            'total_categories': len(category_totals),
-            'avg_confidence': total_confidence / len(import_data),
-            'date_range': {
-                'start': min(record['timestamp'] for record in import_data),
-                'end': max(record['timestamp'] for record in import_data)
-            }
-        },
-        'daily_statistics': dict(daily_stats),
-        'hourly_distribution': dict(hourly_stats),
-        'category_distribution': dict(category_totals)
-    }
+def generate_statistics_data(aggregates):
+    """生成统计报表数据（向量化聚合，见 petlog.aggregations）"""
+    return aggregates.statistics()
 
-def generate_behavior_analysis(import_data):
-    """生成行为分析数据"""
-    
-    # 行为模式分析
-    behavior_patterns = {}
-    
-    # 按类别分析
-    for category in set(record['category'] for record in import_data):
-        category_records = [r for r in import_data if r['category'] == category]
-        
-        # 时间分布
-        hours = [datetime.fromisoformat(r['timestamp']).hour for r in category_records]
-        hour_distribution = defaultdict(int)
-        for hour in hours:
-            hour_distribution[hour] += 1
-        
-        # 置信度分析
-        confidences = [r['confidence'] for r in category_records]
-        avg_confidence = sum(confidences) / len(confidences)
-        
-        # 描述长度分析
-        descriptions = [r['reasons'].get('reasons', '') for r in category_records]
-        avg_description_length = sum(len(desc) for desc in descriptions) / len(descriptions)
-        
-        behavior_patterns[category] = {
-            'count': len(category_records),
-            'percentage': len(category_records) / len(import_data) * 100,
-            'avg_confidence': avg_confidence,
-            'hour_distribution': dict(hour_distribution),
-            'avg_description_length': avg_description_length,
-            'peak_hours': sorted(hour_distribution.items(), key=lambda x: x[1], reverse=True)[:3]
-        }
+def generate_behavior_analysis(aggregates):
+    """生成行为分析数据（单次分组聚合，见 petlog.aggregations）"""
     
-    # 行为转换分析
-    transitions = defaultdict(int)
-    for i in range(len(import_data) - 1):
-        current_category = import_data[i]['category']
-        next_category = import_data[i + 1]['category']
-        transitions[f"{current_category} -> {next_category}"] += 1
+    analysis = aggregates.behavior_patterns()
+    behavior_patterns = analysis['behavior_patterns']
     
     return {
         'behavior_patterns': behavior_patterns,
-        'behavior_transitions': dict(transitions),
+        'behavior_transitions': analysis['behavior_transitions'],
+        'transition_matrix': analysis['transition_matrix'],
         'insights': generate_behavior_insights(behavior_patterns),
         'recommendations': generate_recommendations(behavior_patterns)
     }
@@ -211,55 +121,17 @@ def generate_recommendations(behavior_patterns):
     
     return recommendations
 
-def generate_timeline_data(import_data):
+def generate_timeline_data(store, aggregates):
     """生成时间线数据"""
     
-    timeline = []
-    
-    for record in import_data:
-        dt = datetime.fromisoformat(record['timestamp'])
-        
-        timeline_item = {
-            'timestamp': record['timestamp'],
-            'time_formatted': dt.strftime('%H:%M:%S'),
-            'date_formatted': dt.strftime('%Y年%m月%d日'),
-            'category': record['category'],
-            'category_chinese': get_category_chinese(record['category']),
-            'confidence': record['confidence'],
-            'confidence_percentage': int(record['confidence'] * 100),
-            'description': record['reasons'].get('reasons', ''),
-            'metadata': record['reasons']
-        }
-        
-        timeline.append(timeline_item)
-    
     return {
-        'timeline': timeline,
-        'summary': {
-            'total_events': len(timeline),
-            'duration': str(datetime.fromisoformat(import_data[-1]['timestamp']) - 
-                           datetime.fromisoformat(import_data[0]['timestamp'])),
-            'categories': list(set(item['category'] for item in timeline))
-        }
+        'timeline': [timeline_item(record) for record in store.iter_records()],
+        'summary': aggregates.timeline_summary()
     }
 
 def get_category_chinese(category):
     """获取类别的中文名称"""
-    category_map = {
-        'explore': '探索',
-        'observe': '观望',
-        'neutral': '中性',
-        'no_pet': '无宠物',
-        'occupy': '占据',
-        'attack': '攻击',
-        'play': '玩耍',
-        'sleep': '睡觉',
-        'eat': '进食',
-        'drink': '饮水',
-        'groom': '梳理',
-        'rest': '休息'
-    }
-    return category_map.get(category, category)
+    return category_chinese(category)
 
 if __name__ == "__main__":
     result = create_final_import_files()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量更新宠物活动数据
+摄像头全天向监控日志追加事件。这里记录上次处理到的位置（水位线），每次只解析新增的内容：
+
+- 新事件追加到事件存储、formatted/final_pet_activity_data.txt、app_history_import.json、timeline_data.json，
+  已有内容不重写
+- statistics_data.json、behavior_analysis_data.json 由持久化的部分聚合（计数与求和）继续累加后重新生成，
+  耗时只与新增事件数和类别/日期数有关
+
+生成的文件与完整运行 process_pet_data.py → import_to_app.py → final_import_verification.py 的结果相同
+
+用法:
+    python incremental_update.py                # 处理 document_content.txt 中新增的事件
+    python incremental_update.py --rebuild      # 丢弃水位线，从头重建
+"""
+
+import os
+import io
+import json
+import shutil
+import argparse
+
+from petlog.parser import ResumePoint, iter_appended_records, normalize_record
+from petlog.event_store import EventStore, EVENT_STORE_PATH, decode_timestamps
+from petlog.aggregations import PartialAggregates
+from petlog.exports import (
+    TSV_HEADER_LINE, write_activity_rows, append_at,
+    app_history_record, app_history_file, timeline_item, timeline_file, timeline_tail
+)
+from final_import_verification import generate_statistics_data, generate_behavior_analysis
+
+STATE_FILE = "pipeline_state.json"
+
+TSV_OUTPUTS = ("formatted_pet_activity_data.txt", "final_pet_activity_data.txt")
+APP_HISTORY_OUTPUT = "app_history_import.json"
+TIMELINE_OUTPUT = "timeline_data.json"
+
+
+def load_state(path):
+    """读取水位线和部分聚合，不存在时返回初始状态"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    """先写临时文件再替换，避免中途失败留下不完整的状态"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def run_incremental_update(source_file, state_file=STATE_FILE, rebuild=False):
+    """处理监控日志中水位线之后的新增事件"""
+
+    state = None if rebuild else load_state(state_file)
+    if state is None:
+        # 从头开始：清空事件存储，输出文件从偏移 0 处重新写入
+        shutil.rmtree(EVENT_STORE_PATH, ignore_errors=True)
+        state = {
+            'source': source_file,
+            'resume': ResumePoint()._asdict(),
+            'records': 0,
+            'last_timestamp': None,
+            'files': {name: 0 for name in (*TSV_OUTPUTS, APP_HISTORY_OUTPUT, TIMELINE_OUTPUT)},
+            'aggregates': PartialAggregates().to_dict()
+        }
+    elif state['source'] != source_file:
+        raise ValueError(f"水位线属于 {state['source']}，如需切换输入文件请使用 --rebuild")
+
+    resume = ResumePoint(**state['resume'])
+    if os.path.getsize(source_file) < resume.offset:
+        raise ValueError(f"{source_file} 比上次处理时更短（可能被截断或轮转），请使用 --rebuild")
+
+    print(f"=== 增量更新: {source_file} ===")
+    print(f"水位线: 字节偏移 {resume.offset}，已处理 {state['records']} 条记录")
+
+    def report_error(json_str, error):
+        print(f"JSON解析错误: {error}")
+        print(f"原始JSON: {json_str}")
+
+    records = []
+    for record, resume in iter_appended_records(source_file, resume, on_error=report_error):
+        records.append(normalize_record(record))
+
+    if not records:
+        print("没有新增记录")
+        return 0
+
+    start = state['records']
+    files = state['files']
+
+    # 1. 事件存储：只追加新增行，覆盖上次中途失败可能留下的尾部
+    store = EventStore.append(EVENT_STORE_PATH, records, at_row=start)
+    new_rows = store.rows(start)
+
+    # 2. 制表符分隔的数据文件
+    buffer = io.StringIO()
+    if start == 0:
+        buffer.write(TSV_HEADER_LINE)
+    write_activity_rows(buffer, new_rows)
+    for name in TSV_OUTPUTS:
+        files[name] = append_at(name, files[name], buffer.getvalue())
+
+    # 3. 部分聚合继续累加，重新生成统计报表和行为分析
+    aggregates = PartialAggregates.from_dict(state['aggregates']).update(new_rows)
+
+    with open('statistics_data.json', 'w', encoding='utf-8') as f:
+        json.dump(generate_statistics_data(aggregates), f, ensure_ascii=False, indent=2)
+    with open('behavior_analysis_data.json', 'w', encoding='utf-8') as f:
+        json.dump(generate_behavior_analysis(aggregates), f, ensure_ascii=False, indent=2)
+
+    # 4. 应用历史记录和时间线：只追加新条目，重写数组之后的尾部
+    files[APP_HISTORY_OUTPUT] = app_history_file(APP_HISTORY_OUTPUT).append(
+        files[APP_HISTORY_OUTPUT],
+        [app_history_record(start + i, record) for i, record in enumerate(records)]
+    )
+    files[TIMELINE_OUTPUT] = timeline_file(TIMELINE_OUTPUT).append(
+        files[TIMELINE_OUTPUT],
+        [timeline_item(record) for record in new_rows.iter_records()],
+        tail=timeline_tail(aggregates.timeline_summary())
+    )
+
+    # 5. 最后提交水位线
+    state.update({
+        'resume': resume._asdict(),
+        'records': start + len(records),
+        'last_timestamp': str(decode_timestamps(new_rows.timestamp[-1:])[0]),
+        'aggregates': aggregates.to_dict()
+    })
+    save_state(state_file, state)
+
+    print(f"新增记录: {len(records)} 条，累计 {state['records']} 条")
+    print(f"最新事件时间: {state['last_timestamp']}")
+    return len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="增量更新宠物活动数据")
+    parser.add_argument("--source", default="document_content.txt", help="持续追加的监控日志")
+    parser.add_argument("--state", default=STATE_FILE, help="水位线和部分聚合的保存位置")
+    parser.add_argument("--rebuild", action="store_true", help="丢弃水位线，从头重建所有输出")
+    args = parser.parse_args()
+
+    run_incremental_update(args.source, args.state, args.rebuild)
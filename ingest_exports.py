@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量导入多个设备、多天的监控日志导出文件
+每个设备每天导出一个 .docx 或 .txt 文件。这里用进程池并行解析各文件，每个文件得到一个按时间排序的
+事件存储，然后按时间归并为一条事件流，写出与单文件流水线
+（process_pet_data.py → import_to_app.py → final_import_verification.py）相同的输出文件：
+
+    pet_events.store、formatted_pet_activity_data.txt、final_pet_activity_data.txt、
+    app_history_import.json、timeline_data.json、statistics_data.json、behavior_analysis_data.json
+
+解析和输出文件的生成（按行分块）都在进程池中进行，主进程只负责归并、聚合和按顺序写出
+
+用法:
+    python ingest_exports.py exports/                       # 目录下的全部 .docx/.txt
+    python ingest_exports.py "exports/2025-10-*/*.docx"     # glob
+    python ingest_exports.py a.txt b.docx --workers 8
+"""
+
+import io
+import os
+import glob
+import json
+import time
+import shutil
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from petlog.parser import iter_file_records, iter_text_records, normalize_record
+from petlog.event_store import EventStore, EVENT_STORE_PATH
+from petlog.aggregations import PartialAggregates
+from petlog.exports import (
+    TSV_HEADER_LINE, write_activity_rows,
+    app_history_record, app_history_file, timeline_item, timeline_file, timeline_tail
+)
+from final_import_verification import generate_statistics_data, generate_behavior_analysis
+from incremental_update import STATE_FILE, TSV_OUTPUTS, APP_HISTORY_OUTPUT, TIMELINE_OUTPUT
+
+EXPORT_SUFFIXES = (".docx", ".txt")
+
+# 输出文件按该行数分块并行生成
+RENDER_CHUNK_SIZE = 5000
+
+
+def find_exports(patterns):
+    """展开目录、glob 和文件路径，返回去重并排序后的导出文件列表"""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            candidates = glob.glob(pattern, recursive=True)
+        paths.update(
+            path for path in candidates
+            if os.path.isfile(path) and path.lower().endswith(EXPORT_SUFFIXES)
+        )
+    return sorted(paths)
+
+
+# ---- 工作进程 ----
+
+def parse_export(path):
+    """
+    解析一个导出文件（在工作进程中运行）
+
+    Returns:
+        (按时间排序的事件存储, 解析失败的记录数)
+    """
+    failed = []
+
+    def report_error(json_str, error):
+        failed.append(json_str)
+
+    if path.lower().endswith(".docx"):
+        from read_docx import read_docx_file
+        content = read_docx_file(path)
+        if content is None:
+            raise ValueError(f"无法读取文档内容: {path}")
+        records = iter_text_records(content, on_error=report_error)
+    else:
+        records = iter_file_records(path, on_error=report_error)
+
+    store = EventStore.from_records(normalize_record(record) for record in records)
+    return store.sorted_by_time(), len(failed)
+
+
+def render_tsv_rows(store_path, start, stop):
+    """第 start 到 stop 行的制表符分隔数据行"""
+    buffer = io.StringIO()
+    write_activity_rows(buffer, EventStore.load(store_path).rows(start, stop))
+    return buffer.getvalue()
+
+
+def render_app_history(store_path, start, stop):
+    """app_history_import.json 中第 start 到 stop 条历史记录的文本"""
+    records = EventStore.load(store_path).rows(start, stop).iter_records()
+    items = [app_history_record(start + i, record) for i, record in enumerate(records)]
+    return app_history_file().format_items(items, first=start == 0)
+
+
+def render_timeline(store_path, start, stop):
+    """timeline_data.json 中第 start 到 stop 个时间线条目的文本"""
+    records = EventStore.load(store_path).rows(start, stop).iter_records()
+    return timeline_file().format_items([timeline_item(record) for record in records], first=start == 0)
+
+
+# ---- 主流程 ----
+
+def ingest_exports(paths, workers=None):
+    """并行解析导出文件，按时间归并后写出全部输出文件"""
+
+    print(f"=== 批量导入: {len(paths)} 个文件，{workers or os.cpu_count()} 个进程 ===")
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 1. 并行解析，每个文件得到一个按时间排序的事件存储
+        futures = {pool.submit(parse_export, path): index for index, path in enumerate(paths)}
+        stores = [None] * len(paths)
+        failed_total = 0
+        errors = []
+        for future in as_completed(futures):
+            path = paths[futures[future]]
+            try:
+                store, failed = future.result()
+            except Exception as e:
+                errors.append(path)
+                print(f"❌ {path}: {e}")
+                continue
+            stores[futures[future]] = store
+            failed_total += failed
+            print(f"  {path}: {len(store)} 条记录" + (f"，{failed} 条解析失败" if failed else ""))
+
+        # 2. 按时间归并（时间相同时按文件路径顺序），保存事件存储
+        merged = EventStore.merge_sorted([store for store in stores if store is not None])
+        if not len(merged):
+            print("未能解析到任何事件数据，输出文件保持不变")
+            return {'files': len(paths), 'failed_files': errors, 'records': 0, 'failed_records': failed_total}
+        shutil.rmtree(EVENT_STORE_PATH, ignore_errors=True)
+        merged.save(EVENT_STORE_PATH)
+        parsed_elapsed = time.perf_counter() - started
+        print(f"解析并归并完成: {len(merged)} 条记录，耗时 {parsed_elapsed:.1f} 秒")
+
+        # 3. 输出文件按行分块，在工作进程中从事件存储（内存映射）生成文本，主进程按顺序写出
+        chunks = deque(
+            [pool.submit(render, EVENT_STORE_PATH, start, min(start + RENDER_CHUNK_SIZE, len(merged)))
+             for render in (render_tsv_rows, render_app_history, render_timeline)]
+            for start in range(0, len(merged), RENDER_CHUNK_SIZE)
+        )
+
+        aggregates = PartialAggregates.from_store(merged)
+        with open('statistics_data.json', 'w', encoding='utf-8') as f:
+            json.dump(generate_statistics_data(aggregates), f, ensure_ascii=False, indent=2)
+        with open('behavior_analysis_data.json', 'w', encoding='utf-8') as f:
+            json.dump(generate_behavior_analysis(aggregates), f, ensure_ascii=False, indent=2)
+
+        first_tsv, *tsv_copies = TSV_OUTPUTS
+        with open(first_tsv, 'w', encoding='utf-8') as tsv, \
+                open(APP_HISTORY_OUTPUT, 'w', encoding='utf-8') as history, \
+                open(TIMELINE_OUTPUT, 'w', encoding='utf-8') as timeline:
+            tsv.write(TSV_HEADER_LINE)
+            # 按块的顺序写出，写完即释放，已生成但尚未写出的文本只有少数几块
+            while chunks:
+                for f, part in zip((tsv, history, timeline), chunks.popleft()):
+                    f.write(part.result())
+            history.write(app_history_file().footer())
+            timeline.write(timeline_file().footer(timeline_tail(aggregates.timeline_summary())))
+        for name in tsv_copies:
+            shutil.copyfile(first_tsv, name)
+
+    # 输出文件已整体重写，增量更新的水位线不再对应，下次增量更新时从头重建
+    if os.path.exists(STATE_FILE):
+        os.remove(STATE_FILE)
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ 输出文件已写出，总耗时 {elapsed:.1f} 秒（{len(merged) / max(elapsed, 1e-9):.0f} 条/秒）")
+    for name in (EVENT_STORE_PATH, *TSV_OUTPUTS, APP_HISTORY_OUTPUT, TIMELINE_OUTPUT,
+                 'statistics_data.json', 'behavior_analysis_data.json'):
+        print(f"  - {name}")
+
+    return {
+        'files': len(paths),
+        'failed_files': errors,
+        'records': len(merged),
+        'failed_records': failed_total
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="并行批量导入多个监控日志导出文件")
+    parser.add_argument("inputs", nargs="+", help="导出文件、目录或 glob（.docx/.txt）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认等于 CPU 核数")
+    args = parser.parse_args()
+
+    paths = find_exports(args.inputs)
+    if not paths:
+        print("没有找到 .docx 或 .txt 导出文件")
+        raise SystemExit(1)
+
+    result = ingest_exports(paths, args.workers)
+    print(f"\n=== 导入摘要 ===")
+    print(f"文件数: {result['files']}（失败 {len(result['failed_files'])} 个）")
+    print(f"记录数: {result['records']}（解析失败 {result['failed_records']} 条）")
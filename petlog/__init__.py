@@ -0,0 +1,4 @@
+"""
+宠物活动监控日志的共享处理模块
+供离线数据处理脚本和 FastAPI 后端共同使用
+"""
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基于事件存储的向量化聚合
+日期、小时、类别都是整数编码的列，计数用 np.unique / np.bincount 一次完成，
+不再逐条解析时间字符串、构建嵌套 defaultdict。
+
+聚合结果保存在可合并的 PartialAggregates 中（计数与求和，而不是平均值），
+新增事件只需在已有结果上继续累加，统计报表和行为分析由它按需生成。
+
+输出的键顺序与逐条处理时一致（按首次出现的顺序），浮点求和按记录顺序累加，
+因此生成的 JSON 与原来的逐条实现逐字节相同
+"""
+
+from datetime import timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from petlog.event_store import EventStore, decode_timestamps
+from petlog.transitions import TransitionMatrix, DEFAULT_MAX_GAP
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+
+
+def first_seen_unique(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    按首次出现的顺序返回去重后的键
+
+    Returns:
+        (键, 每个键的出现次数, 每条记录对应的键序号)，键序号与返回的键顺序一致
+    """
+    values, first, inverse, counts = np.unique(
+        keys, return_index=True, return_inverse=True, return_counts=True
+    )
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return values[order], counts[order], rank[inverse.ravel()]
+
+
+def accumulate(priors: List[float], index: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    在各组已有的和之上按记录顺序继续累加
+
+    bincount 按数组顺序逐个相加，把已有的和放在最前面，结果与从头逐条相加逐位一致
+    （np.sum 使用分组求和，末位可能不同）
+    """
+    groups = len(priors)
+    return np.bincount(
+        np.concatenate([np.arange(groups), index]),
+        weights=np.concatenate([np.asarray(priors, dtype=np.float64), values]),
+        minlength=groups
+    )
+
+
+def _format_timestamp(epoch: int) -> str:
+    return str(decode_timestamps(np.array([epoch]))[0])
+
+
+class PartialAggregates:
+    """
+    可合并的部分聚合结果
+
+    只保存计数和求和，可以用 update() 在已有结果上追加新事件，
+    也可以用 merge() 合并按时间先后分别计算的两部分；to_dict() / from_dict() 用于持久化
+    """
+
+    def __init__(self, max_gap: Optional[float] = DEFAULT_MAX_GAP):
+        self.total = 0
+        self.confidence_sum = 0.0
+        self.min_timestamp: Optional[int] = None
+        self.max_timestamp: Optional[int] = None
+        self.first_timestamp: Optional[int] = None
+        self.last_timestamp: Optional[int] = None
+        self.first_category: Optional[str] = None
+        self.last_category: Optional[str] = None
+        # 日期 -> {count, confidence_sum, categories: {类别: 次数}}
+        self.daily: Dict[str, Dict[str, Any]] = {}
+        # 小时 -> 次数
+        self.hourly: Dict[int, int] = {}
+        # 类别 -> {count, confidence_sum, description_length_sum, hours: {小时: 次数}}
+        self.categories: Dict[str, Dict[str, Any]] = {}
+        # "a -> b" -> 次数（按记录顺序的全部相邻记录）
+        self.transitions: Dict[str, int] = {}
+        # 按时间排序、忽略长间隔的转换矩阵与停留时间
+        self.transition_matrix = TransitionMatrix(max_gap=max_gap)
+
+    @classmethod
+    def from_store(cls, store: EventStore) -> "PartialAggregates":
+        return cls().update(store)
+
+    def update(self, store: EventStore) -> "PartialAggregates":
+        """
+        追加一批事件（时间上位于已有事件之后），只处理这批事件本身
+
+        Args:
+            store: 新增的事件，通常是 EventStore.rows() 得到的视图
+        """
+        if len(store) == 0:
+            return self
+
+        names = store.categories
+        timestamps = np.asarray(store.timestamp)
+        codes = np.asarray(store.category).astype(np.int64)
+        confidences = store.confidence_values()
+        lengths = np.asarray(store.description_length)
+
+        # 总体
+        self.total += len(store)
+        self.confidence_sum = float(np.cumsum(np.concatenate([[self.confidence_sum], confidences]))[-1])
+
+        # 按日期：计数、置信度之和，以及日期 x 类别的计数
+        days, day_counts, day_index = first_seen_unique(timestamps // SECONDS_PER_DAY)
+        day_keys = [str(ts)[:10] for ts in decode_timestamps(days * SECONDS_PER_DAY)]
+        day_entries = [
+            self.daily.setdefault(key, {"count": 0, "confidence_sum": 0.0, "categories": {}})
+            for key in day_keys
+        ]
+        day_sums = accumulate([entry["confidence_sum"] for entry in day_entries], day_index, confidences)
+        for entry, count, total in zip(day_entries, day_counts.tolist(), day_sums.tolist()):
+            entry["count"] += count
+            entry["confidence_sum"] = total
+
+        pairs, pair_counts, _ = first_seen_unique(day_index.astype(np.int64) * len(names) + codes)
+        for pair, count in zip(pairs.tolist(), pair_counts.tolist()):
+            day, code = divmod(pair, len(names))
+            day_categories = day_entries[day]["categories"]
+            day_categories[names[code]] = day_categories.get(names[code], 0) + count
+
+        # 按小时
+        hours = (timestamps // SECONDS_PER_HOUR) % 24
+        hour_values, hour_counts, _ = first_seen_unique(hours)
+        for hour, count in zip(hour_values.tolist(), hour_counts.tolist()):
+            self.hourly[hour] = self.hourly.get(hour, 0) + count
+
+        # 按类别：计数、置信度之和、描述长度之和，以及类别 x 小时的计数
+        category_codes, category_counts, category_index = first_seen_unique(codes)
+        category_entries = [
+            self.categories.setdefault(names[code], {
+                "count": 0, "confidence_sum": 0.0, "description_length_sum": 0, "hours": {}
+            })
+            for code in category_codes.tolist()
+        ]
+        confidence_sums = accumulate(
+            [entry["confidence_sum"] for entry in category_entries], category_index, confidences
+        )
+        length_sums = np.bincount(category_index, weights=lengths, minlength=len(category_entries))
+        for entry, count, total, length in zip(
+            category_entries, category_counts.tolist(), confidence_sums.tolist(), length_sums.tolist()
+        ):
+            entry["count"] += count
+            entry["confidence_sum"] = total
+            entry["description_length_sum"] += int(length)
+
+        pairs, pair_counts, _ = first_seen_unique(category_index.astype(np.int64) * 24 + hours)
+        for pair, count in zip(pairs.tolist(), pair_counts.tolist()):
+            index, hour = divmod(pair, 24)
+            category_hours = category_entries[index]["hours"]
+            category_hours[hour] = category_hours.get(hour, 0) + count
+
+        # 相邻转换，包含上一批最后一条与这一批第一条之间的转换
+        sequence_names = list(names)
+        if self.last_category is not None:
+            sequence_names.append(self.last_category)
+            codes = np.concatenate([[len(sequence_names) - 1], codes])
+        self._add_transitions(codes, sequence_names)
+
+        # 同一批内按时间排序后续接到转换矩阵
+        order = np.argsort(timestamps, kind="stable")
+        self.transition_matrix.update(timestamps[order], np.asarray(store.category)[order], names)
+
+        # 时间范围
+        batch_min, batch_max = int(timestamps.min()), int(timestamps.max())
+        self.min_timestamp = batch_min if self.min_timestamp is None else min(self.min_timestamp, batch_min)
+        self.max_timestamp = batch_max if self.max_timestamp is None else max(self.max_timestamp, batch_max)
+        if self.first_timestamp is None:
+            self.first_timestamp = int(timestamps[0])
+            self.first_category = names[int(store.category[0])]
+        self.last_timestamp = int(timestamps[-1])
+        self.last_category = names[int(store.category[-1])]
+        return self
+
+    def _add_transitions(self, codes: np.ndarray, names: List[str]):
+        if len(codes) < 2:
+            return
+        pairs, counts, _ = first_seen_unique(codes[:-1] * len(names) + codes[1:])
+        for pair, count in zip(pairs.tolist(), counts.tolist()):
+            current, following = divmod(pair, len(names))
+            key = f"{names[current]} -> {names[following]}"
+            self.transitions[key] = self.transitions.get(key, 0) + count
+
+    def merge(self, other: "PartialAggregates") -> "PartialAggregates":
+        """
+        合并时间上位于其后的另一部分结果（例如并行处理的不同文件）
+
+        计数与合并前逐条累加完全相同；浮点求和是两部分之和相加，末位可能与逐条累加不同
+        """
+        if other.total == 0:
+            return self
+        if self.total == 0:
+            self.__dict__.update(PartialAggregates.from_dict(other.to_dict()).__dict__)
+            return self
+
+        self.total += other.total
+        self.confidence_sum += other.confidence_sum
+
+        for key, other_entry in other.daily.items():
+            entry = self.daily.setdefault(key, {"count": 0, "confidence_sum": 0.0, "categories": {}})
+            entry["count"] += other_entry["count"]
+            entry["confidence_sum"] += other_entry["confidence_sum"]
+            for name, count in other_entry["categories"].items():
+                entry["categories"][name] = entry["categories"].get(name, 0) + count
+
+        for hour, count in other.hourly.items():
+            self.hourly[hour] = self.hourly.get(hour, 0) + count
+
+        for name, other_entry in other.categories.items():
+            entry = self.categories.setdefault(name, {
+                "count": 0, "confidence_sum": 0.0, "description_length_sum": 0, "hours": {}
+            })
+            entry["count"] += other_entry["count"]
+            entry["confidence_sum"] += other_entry["confidence_sum"]
+            entry["description_length_sum"] += other_entry["description_length_sum"]
+            for hour, count in other_entry["hours"].items():
+                entry["hours"][hour] = entry["hours"].get(hour, 0) + count
+
+        boundary = f"{self.last_category} -> {other.first_category}"
+        self.transitions[boundary] = self.transitions.get(boundary, 0) + 1
+        for key, count in other.transitions.items():
+            self.transitions[key] = self.transitions.get(key, 0) + count
+
+        self.transition_matrix = self.transition_matrix + other.transition_matrix
+
+        self.min_timestamp = min(self.min_timestamp, other.min_timestamp)
+        self.max_timestamp = max(self.max_timestamp, other.max_timestamp)
+        self.last_timestamp = other.last_timestamp
+        self.last_category = other.last_category
+        return self
+
+    # ---- 持久化 ----
+
+    def to_dict(self) -> Dict[str, Any]:
+        """可 JSON 序列化的状态（小时键在 JSON 中会变为字符串，from_dict 负责还原）"""
+        return {
+            "total": self.total,
+            "confidence_sum": self.confidence_sum,
+            "min_timestamp": self.min_timestamp,
+            "max_timestamp": self.max_timestamp,
+            "first_timestamp": self.first_timestamp,
+            "last_timestamp": self.last_timestamp,
+            "first_category": self.first_category,
+            "last_category": self.last_category,
+            "daily": self.daily,
+            "hourly": self.hourly,
+            "categories": self.categories,
+            "transitions": self.transitions,
+            "transition_matrix": self.transition_matrix.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PartialAggregates":
+        if "transition_matrix" not in data:
+            raise ValueError("聚合状态中缺少转换矩阵（由旧版本生成），请重新从头计算")
+
+        aggregates = cls()
+        aggregates.transition_matrix = TransitionMatrix.from_dict(data["transition_matrix"])
+        for key in ("total", "confidence_sum", "min_timestamp", "max_timestamp", "first_timestamp",
+                    "last_timestamp", "first_category", "last_category", "transitions"):
+            setattr(aggregates, key, data[key])
+        aggregates.daily = {
+            key: {**entry, "categories": dict(entry["categories"])} for key, entry in data["daily"].items()
+        }
+        aggregates.hourly = {int(hour): count for hour, count in data["hourly"].items()}
+        aggregates.categories = {
+            name: {**entry, "hours": {int(hour): count for hour, count in entry["hours"].items()}}
+            for name, entry in data["categories"].items()
+        }
+        return aggregates
+
+    # ---- 报表 ----
+
+    def statistics(self) -> Dict[str, Any]:
+        """统计报表数据（statistics_data.json）"""
+        if self.total == 0:
+            raise ValueError("事件存储为空，无法生成统计数据")
+
+        return {
+            "summary": {
+                "total_records": self.total,
+                "total_categories": len(self.categories),
+                "avg_confidence": self.confidence_sum / self.total,
+                "date_range": {
+                    "start": _format_timestamp(self.min_timestamp),
+                    "end": _format_timestamp(self.max_timestamp)
+                }
+            },
+            "daily_statistics": {
+                key: {
+                    "total_activities": entry["count"],
+                    "categories": dict(entry["categories"]),
+                    "avg_confidence": entry["confidence_sum"] / entry["count"]
+                }
+                for key, entry in self.daily.items()
+            },
+            "hourly_distribution": dict(self.hourly),
+            "category_distribution": {name: entry["count"] for name, entry in self.categories.items()}
+        }
+
+    def behavior_patterns(self) -> Dict[str, Any]:
+        """行为分析数据（behavior_analysis_data.json）中的 behavior_patterns、behavior_transitions 和 transition_matrix"""
+        if self.total == 0:
+            raise ValueError("事件存储为空，无法生成行为分析数据")
+
+        behavior_patterns = {}
+        for name, entry in self.categories.items():
+            count = entry["count"]
+            hour_distribution = dict(entry["hours"])
+            behavior_patterns[name] = {
+                "count": count,
+                "percentage": count / self.total * 100,
+                "avg_confidence": entry["confidence_sum"] / count,
+                "hour_distribution": hour_distribution,
+                "avg_description_length": entry["description_length_sum"] / count,
+                "peak_hours": sorted(hour_distribution.items(), key=lambda x: x[1], reverse=True)[:3]
+            }
+
+        return {
+            "behavior_patterns": behavior_patterns,
+            "behavior_transitions": dict(self.transitions),
+            "transition_matrix": self.transition_matrix.summary()
+        }
+
+    def timeline_summary(self) -> Dict[str, Any]:
+        """时间线数据（timeline_data.json）中的 summary"""
+        return {
+            "total_events": self.total,
+            "duration": str(timedelta(seconds=self.last_timestamp - self.first_timestamp)),
+            "categories": list(self.categories)
+        }
+
+
+def compute_statistics(store: EventStore) -> Dict[str, Any]:
+    """
+    计算统计报表数据（statistics_data.json）
+
+    Returns:
+        包含 summary、daily_statistics、hourly_distribution、category_distribution 的字典
+    """
+    return PartialAggregates.from_store(store).statistics()
+
+
+def compute_behavior_patterns(store: EventStore) -> Dict[str, Any]:
+    """
+    计算行为分析数据（behavior_analysis_data.json）中的 behavior_patterns 和 behavior_transitions
+
+    所有类别的小时分布、平均置信度、描述长度在同一次分组中得到，
+    不再对每个类别重新扫描全部记录
+    """
+    return PartialAggregates.from_store(store).behavior_patterns()
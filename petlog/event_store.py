@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式事件存储
+替代 import_log.json 等多次写出、读回的 JSON 中间文件。每一列是一个 NumPy 数组：
+
+    timestamp   int64    时间戳（秒级 epoch，按墙上时间编码，不做时区换算）
+    category    int16    类别的字典编码，对应 categories 中的下标
+    confidence  float32  置信度
+    reasons     字符串堆  reasons JSON 的 UTF-8 字节拼接成一个 uint8 数组，offsets 记录每条的起止位置
+    description_length  int32  行为描述（reasons.reasons）的字符数，写入时计算，聚合时无需再解析 JSON
+
+默认保存为一个目录下的若干 .npy 文件，加载时使用内存映射，不复制数据；
+安装了 pyarrow 时也可以保存为单个 Parquet 文件
+"""
+
+import os
+import json
+from typing import List, Dict, Any, Optional, Sequence, Iterable, Iterator
+
+import numpy as np
+
+from petlog.parser import ActivityRecord
+
+# 流水线默认使用的事件存储位置
+EVENT_STORE_PATH = "pet_events.store"
+
+PARQUET_SUFFIX = ".parquet"
+
+# 置信度以 float32 保存，转回 float64 时按该精度取整，恢复原始的十进制取值
+CONFIDENCE_DECIMALS = 6
+
+_COLUMNS = ("timestamp", "category", "confidence", "reasons_offsets", "reasons_heap", "description_length")
+
+
+def _parquet_available() -> bool:
+    """Parquet 需要 pyarrow 依赖"""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def encode_timestamps(timestamps: Iterable[str]) -> np.ndarray:
+    """将 "YYYY-MM-DD HH:MM:SS" 或 ISO 格式的时间字符串批量编码为 int64 epoch 秒"""
+    values = np.array([ts.replace(" ", "T") for ts in timestamps], dtype="datetime64[s]")
+    return values.astype(np.int64)
+
+
+def decode_timestamps(epochs: np.ndarray) -> np.ndarray:
+    """将 int64 epoch 秒批量还原为 "YYYY-MM-DD HH:MM:SS" 字符串数组"""
+    epochs = np.asarray(epochs, dtype=np.int64)
+    if not len(epochs):
+        # 部分 NumPy 版本的 np.char.replace 不接受空数组
+        return np.array([], dtype="<U19")
+    iso = np.datetime_as_string(epochs.astype("datetime64[s]"), unit="s")
+    return np.char.replace(iso, "T", " ")
+
+
+def _write_npy_rows(path: str, start: int, values: np.ndarray):
+    """
+    从第 start 行开始写入一维 .npy 文件并截断其后的内容，然后原地更新文件头中的长度
+
+    先写数据后写文件头，中途失败时文件头仍是旧长度，已有数据保持可读。
+    NumPy 写文件头时为长度预留了填充空间，长度变化不会改变文件头大小
+    """
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        header_size = f.tell()
+
+        f.seek(header_size + start * dtype.itemsize)
+        f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+        f.truncate()
+
+        header = {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": fortran_order,
+            "shape": (start + len(values),)
+        }
+        f.seek(0)
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(f, header)
+        else:
+            np.lib.format.write_array_header_2_0(f, header)
+        if f.tell() != header_size:
+            raise RuntimeError(f"{path} 的文件头长度发生变化，无法原地追加")
+
+
+class EventStore:
+    """按列存放的宠物活动事件，行顺序即原始记录顺序"""
+
+    def __init__(
+        self,
+        timestamp: np.ndarray,
+        category: np.ndarray,
+        categories: List[str],
+        confidence: np.ndarray,
+        reasons_offsets: np.ndarray,
+        reasons_heap: np.ndarray,
+        description_length: np.ndarray
+    ):
+        self.timestamp = timestamp
+        self.category = category
+        self.categories = list(categories)
+        self.confidence = confidence
+        self.reasons_offsets = reasons_offsets
+        self.reasons_heap = reasons_heap
+        self.description_length = description_length
+
+    @classmethod
+    def from_records(cls, records: Iterable[ActivityRecord], categories: Sequence[str] = ()) -> "EventStore":
+        """
+        由解析器产出的 ActivityRecord 构建事件存储
+
+        Args:
+            records: 记录
+            categories: 已有的类别字典，新类别追加在其后（向已有存储追加时保持编码一致）
+        """
+        timestamps: List[str] = []
+        codes: List[int] = []
+        confidences: List[float] = []
+        lengths: List[int] = []
+        description_lengths: List[int] = []
+        chunks: List[bytes] = []
+        category_ids: Dict[str, int] = {name: code for code, name in enumerate(categories)}
+
+        for record in records:
+            timestamps.append(record.timestamp)
+            codes.append(category_ids.setdefault(record.category, len(category_ids)))
+            confidences.append(record.confidence)
+            encoded = json.dumps(record.reasons, ensure_ascii=False).encode("utf-8")
+            chunks.append(encoded)
+            lengths.append(len(encoded))
+            description_lengths.append(len(record.description))
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        return cls(
+            timestamp=encode_timestamps(timestamps),
+            category=np.array(codes, dtype=np.int16),
+            categories=list(category_ids),
+            confidence=np.array(confidences, dtype=np.float32),
+            reasons_offsets=offsets,
+            reasons_heap=np.frombuffer(b"".join(chunks), dtype=np.uint8),
+            description_length=np.array(description_lengths, dtype=np.int32)
+        )
+
+    @classmethod
+    def concat(cls, stores: Sequence["EventStore"]) -> "EventStore":
+        """
+        按顺序拼接多个事件存储，类别字典取并集（按首次出现的顺序），各部分的类别编码相应重映射
+        """
+        categories: Dict[str, int] = {}
+        timestamps, codes, confidences, offsets, heaps, description_lengths = [], [], [], [], [], []
+        heap_start = 0
+        for store in stores:
+            mapping = np.array(
+                [categories.setdefault(name, len(categories)) for name in store.categories], dtype=np.int16
+            )
+            timestamps.append(store.timestamp)
+            codes.append(mapping[store.category])
+            confidences.append(store.confidence)
+            description_lengths.append(store.description_length)
+            # rows() 视图的偏移量指向原字符串堆，只取其中用到的部分
+            first, last = int(store.reasons_offsets[0]), int(store.reasons_offsets[-1])
+            heaps.append(store.reasons_heap[first:last])
+            offsets.append(store.reasons_offsets[1:] - first + heap_start)
+            heap_start += last - first
+
+        return cls(
+            timestamp=np.concatenate([np.zeros(0, dtype=np.int64)] + timestamps),
+            category=np.concatenate([np.zeros(0, dtype=np.int16)] + codes),
+            categories=list(categories),
+            confidence=np.concatenate([np.zeros(0, dtype=np.float32)] + confidences),
+            reasons_offsets=np.concatenate([np.zeros(1, dtype=np.int64)] + offsets),
+            reasons_heap=np.concatenate([np.zeros(0, dtype=np.uint8)] + heaps),
+            description_length=np.concatenate([np.zeros(0, dtype=np.int32)] + description_lengths)
+        )
+
+    @classmethod
+    def merge_sorted(cls, stores: Sequence["EventStore"]) -> "EventStore":
+        """
+        合并多个已按时间排序的事件存储（k 路归并），时间相同的事件保持 stores 中的先后顺序
+
+        拼接后做一次稳定排序：int64 的稳定排序是 timsort，会识别出 k 段已排序的序列并逐段归并，
+        复杂度 O(n log k)，与堆归并相同但不需要逐条比较 Python 对象。
+        类别字典按归并后首次出现的顺序重新编码，与直接解析一个按时间排序的合并文件得到的结果一致
+        """
+        merged = cls.concat(stores)
+        merged = merged.take(np.argsort(merged.timestamp, kind="stable"))
+
+        codes, first_rows = np.unique(merged.category, return_index=True)
+        codes = codes[np.argsort(first_rows)]
+        mapping = np.zeros(len(merged.categories), dtype=np.int16)
+        mapping[codes] = np.arange(len(codes))
+        merged.category = mapping[merged.category]
+        merged.categories = [merged.categories[code] for code in codes]
+        return merged
+
+    def sorted_by_time(self) -> "EventStore":
+        """按时间稳定排序，已经有序时直接返回自身"""
+        if np.all(self.timestamp[1:] >= self.timestamp[:-1]):
+            return self
+        return self.take(np.argsort(self.timestamp, kind="stable"))
+
+    def take(self, indices: np.ndarray) -> "EventStore":
+        """
+        按行下标重新排列（复制数据），reasons 字符串堆按新顺序重新拼接
+
+        下标中连续递增的部分合并为一段整体复制，归并互不重叠的多个文件时只有少数几段
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        lengths = self.reasons_offsets[1:][indices] - self.reasons_offsets[:-1][indices]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+        run_first = indices[np.concatenate([[0], breaks])] if len(indices) else indices
+        run_last = indices[np.concatenate([breaks - 1, [len(indices) - 1]])] if len(indices) else indices
+        runs = zip(self.reasons_offsets[run_first].tolist(), self.reasons_offsets[run_last + 1].tolist())
+        if offsets[-1] * 4 < len(self.reasons_heap):
+            # 只取少量行（例如分页查询）时按段读取，不复制整个字符串堆
+            heap = b"".join([self.reasons_heap[start:end].tobytes() for start, end in runs])
+        else:
+            heap = self.reasons_heap.tobytes()
+            heap = b"".join([heap[start:end] for start, end in runs])
+
+        return EventStore(
+            timestamp=self.timestamp[indices],
+            category=self.category[indices],
+            categories=self.categories,
+            confidence=self.confidence[indices],
+            reasons_offsets=offsets,
+            reasons_heap=np.frombuffer(heap, dtype=np.uint8),
+            description_length=self.description_length[indices]
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def rows(self, start: int, stop: Optional[int] = None) -> "EventStore":
+        """第 start 到 stop 行的视图（不复制数据，reasons 偏移量仍指向原字符串堆）"""
+        stop = len(self) if stop is None else stop
+        return EventStore(
+            timestamp=self.timestamp[start:stop],
+            category=self.category[start:stop],
+            categories=self.categories,
+            confidence=self.confidence[start:stop],
+            reasons_offsets=self.reasons_offsets[start:stop + 1],
+            reasons_heap=self.reasons_heap,
+            description_length=self.description_length[start:stop]
+        )
+
+    # ---- 列访问 ----
+
+    def timestamp_strings(self) -> np.ndarray:
+        """全部时间戳的字符串形式"""
+        return decode_timestamps(self.timestamp)
+
+    def category_names(self) -> np.ndarray:
+        """逐行的类别名称"""
+        return np.asarray(self.categories)[self.category]
+
+    def confidence_values(self) -> np.ndarray:
+        """float64 形式的置信度，与写入前的取值一致"""
+        return np.round(self.confidence.astype(np.float64), CONFIDENCE_DECIMALS)
+
+    def reasons_json(self, index: int) -> str:
+        """第 index 条记录的 reasons 原始 JSON 文本"""
+        start, end = self.reasons_offsets[index], self.reasons_offsets[index + 1]
+        return self.reasons_heap[start:end].tobytes().decode("utf-8")
+
+    def reasons(self, index: int) -> Dict[str, Any]:
+        """第 index 条记录的 reasons 对象"""
+        return json.loads(self.reasons_json(index))
+
+    def iter_records(self) -> Iterator[ActivityRecord]:
+        """按原始顺序逐条还原为 ActivityRecord"""
+        timestamps = self.timestamp_strings()
+        names = self.category_names()
+        confidences = self.confidence_values()
+        for i in range(len(self)):
+            yield ActivityRecord(str(timestamps[i]), str(names[i]), float(confidences[i]), self.reasons(i))
+
+    # ---- 持久化 ----
+
+    def save(self, path: str = EVENT_STORE_PATH):
+        """保存事件存储，路径以 .parquet 结尾时保存为 Parquet，否则保存为 .npy 目录"""
+        if path.endswith(PARQUET_SUFFIX):
+            self._save_parquet(path)
+            return
+
+        os.makedirs(path, exist_ok=True)
+        for name in _COLUMNS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        np.save(os.path.join(path, "categories.npy"), np.array(self.categories, dtype=str))
+
+    @classmethod
+    def append(cls, path: str, records: Iterable[ActivityRecord], at_row: Optional[int] = None) -> "EventStore":
+        """
+        向已保存的 .npy 事件存储追加记录，只写入新增的部分，已有数据不重写
+
+        Args:
+            path: 事件存储目录，不存在时新建
+            records: 新增记录
+            at_row: 写入起始行，默认接在末尾；传入调用方记录的已提交行数时，
+                上次中途失败留下的多余尾部会被覆盖
+
+        Returns:
+            追加后的事件存储（内存映射）
+        """
+        if path.endswith(PARQUET_SUFFIX):
+            raise ValueError("Parquet 事件存储不支持追加写入")
+        if not os.path.isdir(path):
+            cls.from_records(records).save(path)
+            return cls.load(path)
+
+        existing = cls.load(path)
+        start = len(existing) if at_row is None else at_row
+        heap_start = int(existing.reasons_offsets[start])
+        new = cls.from_records(records, categories=existing.categories)
+        del existing
+
+        columns = {
+            "timestamp": new.timestamp,
+            "category": new.category,
+            "confidence": new.confidence,
+            "description_length": new.description_length,
+            # 偏移量首项即已有的末项，只追加其后的部分
+            "reasons_offsets": new.reasons_offsets[1:] + heap_start,
+            "reasons_heap": new.reasons_heap
+        }
+        positions = {name: start for name in columns}
+        positions["reasons_offsets"] = start + 1
+        positions["reasons_heap"] = heap_start
+
+        for name, values in columns.items():
+            _write_npy_rows(os.path.join(path, f"{name}.npy"), positions[name], values)
+        np.save(os.path.join(path, "categories.npy"), np.array(new.categories, dtype=str))
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path: str = EVENT_STORE_PATH, mmap: bool = True) -> "EventStore":
+        """
+        加载事件存储
+
+        Args:
+            path: save() 使用的路径
+            mmap: 为 True 时以只读内存映射方式打开 .npy 文件，按需读取，不复制数据
+
+        Returns:
+            EventStore 实例
+        """
+        if path.endswith(PARQUET_SUFFIX):
+            return cls._load_parquet(path)
+
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"事件存储不存在: {path}")
+
+        mmap_mode = "r" if mmap else None
+        columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in _COLUMNS
+        }
+        categories = np.load(os.path.join(path, "categories.npy")).tolist()
+        return cls(categories=categories, **columns)
+
+    def _save_parquet(self, path: str):
+        if not _parquet_available():
+            raise RuntimeError("保存为 Parquet 需要安装 pyarrow")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        reasons = pa.LargeStringArray.from_buffers(
+            len(self),
+            pa.py_buffer(np.ascontiguousarray(self.reasons_offsets)),
+            pa.py_buffer(np.ascontiguousarray(self.reasons_heap))
+        )
+        table = pa.table({
+            "timestamp": pa.array(self.timestamp, type=pa.int64()),
+            "category": pa.DictionaryArray.from_arrays(
+                pa.array(self.category, type=pa.int16()),
+                pa.array(self.categories, type=pa.string())
+            ),
+            "confidence": pa.array(self.confidence, type=pa.float32()),
+            "reasons": reasons,
+            "description_length": pa.array(self.description_length, type=pa.int32())
+        })
+        pq.write_table(table, path)
+
+    @classmethod
+    def _load_parquet(cls, path: str) -> "EventStore":
+        if not _parquet_available():
+            raise RuntimeError("读取 Parquet 事件存储需要安装 pyarrow")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        category = table.column("category").combine_chunks()
+        reasons = table.column("reasons").combine_chunks().cast(pa.large_string())
+        _, offsets_buffer, heap_buffer = reasons.buffers()
+        offsets = np.frombuffer(offsets_buffer, dtype=np.int64)[reasons.offset:reasons.offset + len(reasons) + 1]
+
+        return cls(
+            timestamp=table.column("timestamp").to_numpy(),
+            category=category.indices.to_numpy(zero_copy_only=False).astype(np.int16),
+            categories=category.dictionary.to_pylist(),
+            confidence=table.column("confidence").to_numpy(),
+            reasons_offsets=offsets - offsets[0],
+            reasons_heap=np.frombuffer(heap_buffer, dtype=np.uint8)[offsets[0]:offsets[-1]],
+            description_length=table.column("description_length").to_numpy()
+        )
+
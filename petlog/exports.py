@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导出给应用程序的数据文件
+final_pet_activity_data.txt、app_history_import.json、timeline_data.json 的记录格式，
+以及只追加新增部分、不重写已有内容的写入方式（增量模式使用）。
+
+JSON 文件的排版与 json.dump(..., ensure_ascii=False, indent=2) 完全一致，
+因此增量写出的文件与一次性生成的文件逐字节相同
+"""
+
+import os
+import json
+from datetime import datetime
+from typing import List, Dict, Any, TextIO
+
+from petlog.parser import ActivityRecord
+from petlog.event_store import EventStore
+
+TSV_HEADER_LINE = "timestamp\tcategory\tconfidence\treasons\n"
+
+CATEGORY_CHINESE = {
+    'explore': '探索',
+    'observe': '观望',
+    'neutral': '中性',
+    'no_pet': '无宠物',
+    'occupy': '占据',
+    'attack': '攻击',
+    'play': '玩耍',
+    'sleep': '睡觉',
+    'eat': '进食',
+    'drink': '饮水',
+    'groom': '梳理',
+    'rest': '休息'
+}
+
+
+def category_chinese(category: str) -> str:
+    """获取类别的中文名称"""
+    return CATEGORY_CHINESE.get(category, category)
+
+
+# ---- 记录格式 ----
+
+def write_activity_rows(f: TextIO, store: EventStore):
+    """按 final_pet_activity_data.txt 的制表符分隔格式写出事件（不含表头）"""
+    # 直接使用字符串堆中的 reasons JSON，无需重新序列化
+    timestamps = store.timestamp_strings()
+    categories = store.category_names()
+    confidences = store.confidence_values()
+    for i in range(len(store)):
+        f.write(f"{timestamps[i]}\t{categories[i]}\t{confidences[i]}\t{store.reasons_json(i)}\n")
+
+
+def app_history_record(index: int, record: ActivityRecord) -> Dict[str, Any]:
+    """app_history_import.json 中的一条历史记录，index 从 0 开始"""
+    return {
+        "id": f"import_{index + 1}",
+        "timestamp": record.timestamp,
+        "result": {
+            "title": f"宠物{record.category}行为",
+            "confidence": int(record.confidence * 100),
+            "subInfo": json.dumps(record.reasons, ensure_ascii=False)
+        },
+        "mode": "pet_activity",
+        "imagePath": None
+    }
+
+
+def timeline_item(record: ActivityRecord) -> Dict[str, Any]:
+    """timeline_data.json 中的一个时间线条目"""
+    dt = datetime.fromisoformat(record.timestamp)
+    return {
+        'timestamp': record.timestamp,
+        'time_formatted': dt.strftime('%H:%M:%S'),
+        'date_formatted': dt.strftime('%Y年%m月%d日'),
+        'category': record.category,
+        'category_chinese': category_chinese(record.category),
+        'confidence': record.confidence,
+        'confidence_percentage': int(record.confidence * 100),
+        'description': record.description,
+        'metadata': record.reasons
+    }
+
+
+# ---- 只追加的写入 ----
+
+def _indent(text: str, depth: int) -> str:
+    prefix = "  " * depth
+    return "\n".join(prefix + line for line in text.split("\n"))
+
+
+def _dumps(value: Any, depth: int) -> str:
+    """与 json.dump(indent=2) 中嵌套在 depth 层的值排版一致（首行不缩进）"""
+    return _indent(json.dumps(value, ensure_ascii=False, indent=2), depth).lstrip(" ")
+
+
+def append_at(path: str, offset: int, text: str) -> int:
+    """
+    从字节偏移 offset 处写入 text 并截断其后的内容
+
+    offset 是上次提交时记录的文件末尾，上次中途失败多写的部分会被覆盖
+
+    Returns:
+        写入后的文件末尾偏移
+    """
+    mode = "r+b" if os.path.exists(path) else "wb"
+    with open(path, mode) as f:
+        f.seek(offset)
+        f.write(text.encode("utf-8"))
+        f.truncate()
+        return f.tell()
+
+
+class JsonArrayFile:
+    """
+    JSON 文件中的一个数组，新元素追加在数组末尾，只重写数组之后的尾部内容
+
+    Args:
+        path: 文件路径
+        head: 数组开始之前的内容（含 "["）
+        depth: 数组元素的缩进层级
+    """
+
+    def __init__(self, path: str, head: str, depth: int):
+        self.path = path
+        self.head = head
+        self.depth = depth
+
+    def _closing(self) -> str:
+        return "\n" + "  " * (self.depth - 1) + "]"
+
+    def format_items(self, items: List[Dict[str, Any]], first: bool = False) -> str:
+        """
+        数组元素的文本
+
+        Args:
+            items: 元素
+            first: 是否是数组中的第一批元素（此时包含数组开始之前的内容）
+        """
+        if first:
+            parts, separator = [self.head], "\n"
+        else:
+            parts, separator = [], ",\n"
+        for item in items:
+            parts.append(separator + "  " * self.depth + _dumps(item, self.depth))
+            separator = ",\n"
+        return "".join(parts)
+
+    def append(self, array_end: int, items: List[Dict[str, Any]], tail: str = "") -> int:
+        """
+        追加数组元素并重写尾部
+
+        Args:
+            array_end: 上次写入后数组最后一个元素结束处的字节偏移，0 表示文件尚未创建
+            items: 新元素
+            tail: 数组 "]" 之后的内容
+
+        Returns:
+            新的 array_end
+        """
+        array_end = append_at(self.path, array_end, self.format_items(items, first=array_end == 0))
+        append_at(self.path, array_end, self.footer(tail))
+        return array_end
+
+    def footer(self, tail: str = "") -> str:
+        """
+        数组结束及其后的内容
+
+        整个文件一次性写出时（例如分块并行生成的 format_items() 结果按顺序拼接），写在最后一块之后
+        """
+        return self._closing() + tail
+
+
+def app_history_file(path: str = "app_history_import.json") -> JsonArrayFile:
+    return JsonArrayFile(path, "[", depth=1)
+
+
+def timeline_file(path: str = "timeline_data.json") -> JsonArrayFile:
+    return JsonArrayFile(path, '{\n  "timeline": [', depth=2)
+
+
+def timeline_tail(summary: Dict[str, Any]) -> str:
+    """timeline_data.json 中数组之后的 summary 部分"""
+    return ',\n  "summary": ' + _dumps(summary, 1) + "\n}"
+
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监控日志流式解析引擎
+摄像头导出的监控数据格式固定，逐行读取即可解析，无需把整个文档读入内存，
+也不需要对整篇文档运行 DOTALL 正则：
+
+    2025-10-13 19:50:51no_pet0.5```json
+    {"category": "无宠物", "confidence": 1.0, "reasons": "..."}
+    ```
+
+也支持 final_pet_activity_data.txt 的制表符分隔格式：
+
+    2025-10-13 19:50:51\tno_pet\t0.5\t{"category": "无宠物", ...}
+
+每条记录内嵌的 JSON 只解析一次，解析结果以 ActivityRecord 的形式由生成器逐条产出
+"""
+
+import io
+import re
+import json
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable, NamedTuple, Tuple
+
+# 导出文档的表头
+DOCUMENT_HEADER = "timestampcategoryconfidencereasons"
+TSV_HEADER = "timestamp\tcategory\tconfidence\treasons"
+
+# 原始导出格式的记录头：时间戳 + 类别 + 置信度紧密相连，后接 ```json
+RECORD_HEADER_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})([a-z_]+)(\d+(?:\.\d+)?)```json")
+
+# 制表符分隔格式：每行一条记录
+TSV_RECORD_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\t([a-z_]+)\t(\d+(?:\.\d+)?)\t(\{.*\})\s*$")
+
+CODE_FENCE = "```"
+
+# 中文类别到标签关键词的映射
+TAG_KEYWORDS = {
+    "猫": ["猫"],
+    "狗": ["狗"],
+    "室内": ["室内", "房间", "家庭"],
+    "观望": ["观望", "注视", "观察", "警觉"],
+    "探索": ["探索", "嗅探", "巡视", "移动"],
+    "休息": ["休息", "躺", "放松", "静止"],
+    "床单": ["床单", "垫子", "毛绒"],
+    "蓝色": ["蓝色"]
+}
+
+
+class ActivityRecord(NamedTuple):
+    """一条宠物活动监控记录"""
+    timestamp: str
+    category: str
+    confidence: float
+    reasons: Dict[str, Any]
+
+    @property
+    def description(self) -> str:
+        """模型给出的行为描述"""
+        return self.reasons.get("reasons", "")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为 import_log.json 使用的记录结构"""
+        return {
+            "timestamp": self.timestamp,
+            "category": self.category,
+            "confidence": self.confidence,
+            "reasons": self.reasons
+        }
+
+
+class UnstructuredContentError(ValueError):
+    """严格模式下文档中出现了无法按结构化格式解析的内容"""
+
+
+def _outside_text(text: str) -> str:
+    """记录之外的文字（去掉表头和空白）"""
+    return text.replace(DOCUMENT_HEADER, "").replace(TSV_HEADER, "").strip()
+
+
+def _check_reasons(reasons: Any, strict: bool):
+    """
+    校验记录内嵌的 JSON：必须是对象；严格模式下 confidence 必须是数值，category、reasons 必须是字符串，
+    否则交给大模型处理，而不是在转换为时间轴事件时出错
+
+    Raises:
+        ValueError: 结构不符合要求
+    """
+    if not isinstance(reasons, dict):
+        raise ValueError(f"内嵌 JSON 应为对象，实际为 {type(reasons).__name__}")
+    if not strict:
+        return
+    confidence = reasons.get("confidence", 0)
+    if isinstance(confidence, bool) or not isinstance(confidence, (int, float)):
+        raise ValueError(f"confidence 应为数值: {confidence!r}")
+    for key in ("category", "reasons"):
+        if not isinstance(reasons.get(key, ""), str):
+            raise ValueError(f"{key} 应为字符串")
+
+
+def _parse_lines(
+    lines: Iterable[str],
+    strict: bool,
+    on_error: Optional[Callable[[str, Exception], None]],
+    final: bool
+) -> Iterator[Tuple[ActivityRecord, int, int]]:
+    """
+    解析状态机，产出 (记录, 记录头所在行号, 结束标记所在行号)，行号从 0 开始
+
+    final 为 False 时表示文件仍在追加，末尾未写完的记录不产出，留给下次从断点继续解析
+    """
+    header = None
+    header_line = 0
+    json_parts: List[str] = []
+
+    def build(timestamp: str, category: str, confidence: str, json_str: str) -> Optional[ActivityRecord]:
+        try:
+            reasons = json.loads(json_str)
+            _check_reasons(reasons, strict)
+            return ActivityRecord(timestamp, category, float(confidence), reasons)
+        except ValueError as e:
+            if strict:
+                raise UnstructuredContentError(f"记录 {timestamp} 的 JSON 无效: {e}") from e
+            if on_error is not None:
+                on_error(json_str, e)
+            return None
+
+    line_no = -1
+    for line_no, line in enumerate(lines):
+        pos = 0
+
+        if header is None:
+            tsv_match = TSV_RECORD_PATTERN.match(line)
+            if tsv_match:
+                record = build(*tsv_match.groups())
+                if record is not None:
+                    yield record, line_no, line_no
+                continue
+
+        while True:
+            if header is None:
+                match = RECORD_HEADER_PATTERN.search(line, pos)
+                outside = line[pos:match.start()] if match else line[pos:]
+                # 上一条记录的结束标记与下一条记录头在同一行
+                if outside.startswith(CODE_FENCE):
+                    outside = outside[len(CODE_FENCE):]
+                if strict and _outside_text(outside):
+                    raise UnstructuredContentError(f"无法解析的内容: {outside.strip()[:50]}")
+                if not match:
+                    break
+                header = match.groups()
+                header_line = line_no
+                json_parts = []
+                pos = match.end()
+            else:
+                end = line.find(CODE_FENCE, pos)
+                if end == -1:
+                    json_parts.append(line[pos:])
+                    break
+                json_parts.append(line[pos:end])
+                record = build(*header, "".join(json_parts))
+                header = None
+                if record is not None:
+                    yield record, header_line, line_no
+                # 保留结束标记，交给下一轮识别同一行中的下一条记录
+                pos = end
+
+    if header is not None and final:
+        # 文档在代码块中途结束，尝试解析已读到的部分
+        record = build(*header, "".join(json_parts))
+        if record is not None:
+            yield record, header_line, line_no
+
+
+def iter_records(
+    lines: Iterable[str],
+    strict: bool = False,
+    on_error: Optional[Callable[[str, Exception], None]] = None
+) -> Iterator[ActivityRecord]:
+    """
+    逐行解析监控日志，产出 ActivityRecord
+
+    Args:
+        lines: 文本行的可迭代对象（例如打开的文件），每次只处理一行
+        strict: 为 True 时，遇到记录之外的文字或无效 JSON 抛出 UnstructuredContentError
+        on_error: 非严格模式下单条记录解析失败时的回调，参数为原始 JSON 文本和异常
+
+    Yields:
+        按文档顺序排列的 ActivityRecord
+    """
+    for record, _, _ in _parse_lines(lines, strict, on_error, final=True):
+        yield record
+
+
+def iter_file_records(path: str, **kwargs) -> Iterator[ActivityRecord]:
+    """逐行读取文件并解析监控记录，内存占用与文件大小无关"""
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_records(f, **kwargs)
+
+
+class ResumePoint(NamedTuple):
+    """
+    追加写入的日志文件的解析断点
+
+    offset 是最后一条已产出记录的结束标记所在行的起始字节偏移，
+    skip 是记录头也位于该行、已经产出过的记录数（从该行重新解析时需要跳过）
+    """
+    offset: int = 0
+    skip: int = 0
+
+
+def iter_appended_records(
+    path: str,
+    resume: ResumePoint = ResumePoint(),
+    on_error: Optional[Callable[[str, Exception], None]] = None
+) -> Iterator[Tuple[ActivityRecord, ResumePoint]]:
+    """
+    从断点继续解析仍在追加写入的日志文件，只读取断点之后的内容
+
+    末尾尚未写完的记录不会产出；每条记录附带处理完该记录后的断点，
+    调用方持久化最后一个断点即可在下次只解析新增内容
+
+    Yields:
+        (记录, 断点) 二元组
+    """
+    line_offsets: List[int] = []
+
+    def decoded_lines(f):
+        position = resume.offset
+        for raw in f:
+            line_offsets.append(position)
+            position += len(raw)
+            # 最后一行可能还没写完，截断在多字节字符中间
+            yield raw.decode("utf-8", errors="strict" if raw.endswith(b"\n") else "replace")
+
+    point = resume
+    to_skip = resume.skip
+    with open(path, "rb") as f:
+        f.seek(resume.offset)
+        for record, header_line, close_line in _parse_lines(decoded_lines(f), False, on_error, final=False):
+            header_offset, close_offset = line_offsets[header_line], line_offsets[close_line]
+            if to_skip and header_offset == resume.offset:
+                # 上次已经产出过的记录
+                to_skip -= 1
+                continue
+            same_line = 1 if header_offset == close_offset else 0
+            skip = point.skip + same_line if close_offset == point.offset else same_line
+            point = ResumePoint(close_offset, skip)
+            yield record, point
+
+
+def iter_text_records(content: str, **kwargs) -> Iterator[ActivityRecord]:
+    """解析内存中的文档内容"""
+    return iter_records(io.StringIO(content), **kwargs)
+
+
+def parse_structured_document(content: str) -> Optional[List[ActivityRecord]]:
+    """
+    解析结构化监控文档
+
+    Returns:
+        全部内容都符合结构化格式时返回记录列表，否则返回 None（交给大模型处理）
+    """
+    try:
+        records = list(iter_text_records(content, strict=True))
+    except UnstructuredContentError:
+        return None
+    return records or None
+
+
+def normalize_record(record: ActivityRecord) -> ActivityRecord:
+    """只保留 reasons 中的 category、confidence、reasons 三个字段（formatted_pet_activity_data.txt 的格式）"""
+    return record._replace(reasons={
+        "category": record.reasons.get("category", ""),
+        "confidence": record.reasons.get("confidence", 0),
+        "reasons": record.description
+    })
+
+
+def extract_tags(content: str, category: str) -> List[str]:
+    """从描述中提取标签"""
+    tags = [category]
+    for tag, keywords in TAG_KEYWORDS.items():
+        if any(keyword in content for keyword in keywords):
+            if tag not in tags:
+                tags.append(tag)
+    return tags
+
+
+def record_to_event(record: ActivityRecord) -> Dict[str, Any]:
+    """将监控记录转换为时间轴事件结构（/analyze-document 的输出格式）"""
+    category_cn = record.reasons.get("category", record.category)
+    description = record.description
+    confidence = record.reasons.get("confidence", record.confidence)
+
+    try:
+        timestamp = datetime.strptime(record.timestamp, "%Y-%m-%d %H:%M:%S").isoformat()
+    except ValueError:
+        timestamp = record.timestamp
+
+    return {
+        "timestamp": timestamp,
+        "title": f"{category_cn}行为",
+        "content": description,
+        "category": record.category,
+        "confidence": float(confidence),
+        "metadata": {
+            "source": "document",
+            "original_text": f"category: {category_cn}, confidence: {confidence}",
+            "location": "室内" if "室内" in description else "未知"
+        },
+        "tags": extract_tags(description, category_cn)
+    }
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+时间线查询
+在事件存储上建立按时间排序的索引，用二分查找定位时间范围，按页返回 timeline_data.json 格式的条目，
+客户端只需获取当前可见的时间窗口，不必下载并解析整个历史。
+
+- 时间范围为左闭右开区间 [start, end)
+- 类别过滤：每个类别单独保存一份有序下标，多个类别的结果按时间归并，耗时与页大小有关，与总事件数无关
+- 分页游标记录上一页最后一条事件的（时间, 行号），事件存储追加新事件后游标仍然有效
+"""
+
+import base64
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+from petlog.event_store import EventStore, encode_timestamps
+from petlog.exports import timeline_item
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(timestamp: int, row: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp}:{row}".encode("ascii")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        timestamp, row = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split(":")
+        return int(timestamp), int(row)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+
+def parse_time(value: str) -> int:
+    """将 "YYYY-MM-DD HH:MM:SS"、ISO 格式或 "YYYY-MM-DD" 转换为 epoch 秒（与事件存储的编码一致）"""
+    try:
+        return int(encode_timestamps([value.strip()])[0])
+    except ValueError as e:
+        raise ValueError(f"无效的时间: {value}") from e
+
+
+class TimelineIndex:
+    """
+    事件存储的时间索引
+
+    order 是按（时间, 行号）排序的行号，keys 是对应的时间戳，在构建时计算一次；
+    事件存储本身已按时间排序时（批量导入和增量更新的常见情况）直接使用时间列，不复制
+    """
+
+    def __init__(self, store: EventStore):
+        self.store = store
+        timestamps = np.asarray(store.timestamp)
+        if np.all(timestamps[1:] >= timestamps[:-1]):
+            self.order = np.arange(len(store), dtype=np.int64)
+            self.keys = timestamps
+        else:
+            self.order = np.argsort(timestamps, kind="stable")
+            self.keys = timestamps[self.order]
+        # 类别编码 -> 该类别事件在排序后序列中的位置（递增）
+        self._category_positions: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def _positions(self, category: str) -> np.ndarray:
+        if category not in self.store.categories:
+            return np.zeros(0, dtype=np.int64)
+        code = self.store.categories.index(category)
+        if code not in self._category_positions:
+            codes = np.asarray(self.store.category)[self.order]
+            self._category_positions[code] = np.flatnonzero(codes == code)
+        return self._category_positions[code]
+
+    def _cursor_position(self, cursor: str, descending: bool) -> int:
+        """游标之后（升序）或之前（降序）第一条事件在排序后序列中的位置"""
+        timestamp, row = decode_cursor(cursor)
+        low = int(np.searchsorted(self.keys, timestamp, side="left"))
+        high = int(np.searchsorted(self.keys, timestamp, side="right"))
+        # 时间相同的事件按行号排列
+        tied_rows = self.order[low:high]
+        if descending:
+            return low + int(np.searchsorted(tied_rows, row, side="left")) - 1
+        return low + int(np.searchsorted(tied_rows, row, side="right"))
+
+    def query(
+        self,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        categories: Sequence[str] = (),
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        descending: bool = False
+    ) -> Dict[str, Any]:
+        """
+        查询一页时间线条目
+
+        Args:
+            start: 起始时间（epoch 秒，含），为 None 时不限制
+            end: 结束时间（epoch 秒，不含），为 None 时不限制
+            categories: 只返回这些类别，为空时返回全部
+            cursor: 上一页返回的 next_cursor
+            limit: 每页条数（1..MAX_PAGE_SIZE）
+            descending: 为 True 时从新到旧返回
+
+        Returns:
+            {"items": [...], "next_cursor": 下一页游标或 None, "total": 时间范围和类别内的事件总数}
+
+        Raises:
+            ValueError: 游标无效
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        # 时间范围在排序后序列中对应的位置区间 [low, high)
+        low = 0 if start is None else int(np.searchsorted(self.keys, start, side="left"))
+        high = len(self) if end is None else int(np.searchsorted(self.keys, end, side="left"))
+        high = max(low, high)
+
+        page_low, page_high = low, high
+        if cursor is not None:
+            position = self._cursor_position(cursor, descending)
+            if descending:
+                page_high = min(high, position + 1)
+            else:
+                page_low = max(low, position)
+
+        lanes = [self._positions(name) for name in dict.fromkeys(categories)] if categories else [None]
+        selected: List[np.ndarray] = []
+        total = 0
+        for positions in lanes:
+            if positions is None:
+                # 不过滤类别：位置本身就是连续的
+                total += high - low
+                if descending:
+                    selected.append(np.arange(max(page_low, page_high - limit - 1), page_high)[::-1])
+                else:
+                    selected.append(np.arange(page_low, min(page_high, page_low + limit + 1)))
+                continue
+            lane_low, lane_high, lane_page_low, lane_page_high = np.searchsorted(
+                positions, [low, high, page_low, page_high], side="left"
+            )
+            total += int(lane_high - lane_low)
+            if descending:
+                selected.append(positions[max(lane_page_low, lane_page_high - limit - 1):lane_page_high][::-1])
+            else:
+                selected.append(positions[lane_page_low:min(lane_page_high, lane_page_low + limit + 1)])
+
+        # 多个类别各取 limit + 1 条后按时间归并，多取的一条用于判断是否还有下一页
+        merged = np.sort(np.concatenate(selected)) if len(selected) > 1 else selected[0]
+        if len(selected) > 1 and descending:
+            merged = merged[::-1]
+        page = merged[:limit]
+        has_more = len(merged) > limit
+
+        rows = self.order[page]
+        if not len(rows):
+            return {"items": [], "next_cursor": None, "total": total}
+        items = [timeline_item(record) for record in self.store.take(rows).iter_records()]
+        next_cursor = None
+        if has_more and len(rows):
+            next_cursor = encode_cursor(int(self.keys[page[-1]]), int(rows[-1]))
+
+        return {"items": items, "next_cursor": next_cursor, "total": total}
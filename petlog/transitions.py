@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+行为转换矩阵
+按类别编号索引的稠密计数矩阵 counts[a, b]（a 之后紧接着 b 的次数），以及每个类别连续持续时间
+（停留时间）的直方图。
+
+- 事件先按时间排序，不要求输入有序
+- 相邻两条事件间隔超过 max_gap 秒时不视为转换（例如相隔数小时的两次记录），同时结束当前停留
+- 不同日期、不同设备分别计算的矩阵可以直接相加，便于并行统计后合并
+- 由计数得到马尔可夫转移概率，用于查询“X 之后通常是什么行为”
+"""
+
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 默认的最大关联间隔（秒），超过该间隔的相邻事件不计为转换
+DEFAULT_MAX_GAP = 300
+
+# 停留时间直方图的分桶上界（秒），最后一个桶收纳超过最大上界的停留
+DWELL_BIN_EDGES = (10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _dwell_bin_labels() -> List[str]:
+    labels = []
+    lower = 0
+    for upper in DWELL_BIN_EDGES:
+        labels.append(f"{lower}-{upper}s")
+        lower = upper
+    labels.append(f">{lower}s")
+    return labels
+
+
+class TransitionMatrix:
+    """
+    类别转换计数矩阵与停留时间分布
+
+    Args:
+        categories: 类别名称，矩阵下标与其顺序一致
+        max_gap: 最大关联间隔（秒），为 None 时不限制
+    """
+
+    def __init__(self, categories: Sequence[str] = (), max_gap: Optional[float] = DEFAULT_MAX_GAP):
+        self.categories: List[str] = list(categories)
+        self.max_gap = max_gap
+        size = len(self.categories)
+        self.counts = np.zeros((size, size), dtype=np.int64)
+        # 每个类别已结束的停留：次数直方图、总时长、次数
+        self.dwell_histogram = np.zeros((size, len(DWELL_BIN_EDGES) + 1), dtype=np.int64)
+        self.dwell_seconds = np.zeros(size, dtype=np.int64)
+        # 续接状态：最后一条事件的时间与类别，以及当前尚未结束的停留的开始时间
+        self.last_timestamp: Optional[int] = None
+        self.last_category: Optional[str] = None
+        self.run_start: Optional[int] = None
+
+    @classmethod
+    def from_events(
+        cls,
+        timestamps: np.ndarray,
+        codes: np.ndarray,
+        categories: Sequence[str],
+        max_gap: Optional[float] = DEFAULT_MAX_GAP
+    ) -> "TransitionMatrix":
+        """由时间戳列和类别编码列构建（按时间排序后统计）"""
+        timestamps = np.asarray(timestamps)
+        order = np.argsort(timestamps, kind="stable")
+        return cls(categories, max_gap).update(timestamps[order], np.asarray(codes)[order], categories)
+
+    @classmethod
+    def from_store(cls, store, max_gap: Optional[float] = DEFAULT_MAX_GAP) -> "TransitionMatrix":
+        """由事件存储构建"""
+        return cls.from_events(store.timestamp, store.category, store.categories, max_gap)
+
+    # ---- 统计 ----
+
+    def _ensure_categories(self, names: Sequence[str]) -> np.ndarray:
+        """返回 names 中各类别在矩阵中的下标，新类别追加到矩阵末尾"""
+        index = {name: i for i, name in enumerate(self.categories)}
+        mapping = []
+        for name in names:
+            if name not in index:
+                index[name] = len(self.categories)
+                self.categories.append(name)
+            mapping.append(index[name])
+
+        grow = len(self.categories) - len(self.counts)
+        if grow:
+            self.counts = np.pad(self.counts, ((0, grow), (0, grow)))
+            self.dwell_histogram = np.pad(self.dwell_histogram, ((0, grow), (0, 0)))
+            self.dwell_seconds = np.pad(self.dwell_seconds, (0, grow))
+        return np.asarray(mapping, dtype=np.int64)
+
+    def update(self, timestamps: np.ndarray, codes: np.ndarray, names: Sequence[str]) -> "TransitionMatrix":
+        """
+        追加一批按时间排序、且位于已有事件之后的事件
+
+        与上一批最后一条事件之间的转换和跨批次的停留会被续接，
+        因此分批 update 与一次性统计的结果相同
+
+        Args:
+            timestamps: int64 epoch 秒
+            codes: 类别编码，对应 names 中的下标
+            names: 本批事件的类别字典
+        """
+        if len(timestamps) == 0:
+            return self
+
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        mapping = self._ensure_categories(names)
+        if self.last_category is not None:
+            mapping = np.append(mapping, self.categories.index(self.last_category))
+            timestamps = np.concatenate([[self.last_timestamp], timestamps])
+            codes = np.concatenate([[len(mapping) - 1], codes])
+        codes = mapping[np.asarray(codes, dtype=np.int64)]
+        size = len(self.categories)
+
+        gaps = np.diff(timestamps)
+        linked = np.ones(len(gaps), dtype=bool) if self.max_gap is None else gaps <= self.max_gap
+
+        # 转换计数：只统计间隔在 max_gap 以内的相邻事件
+        pairs = codes[:-1][linked] * size + codes[1:][linked]
+        self.counts += np.bincount(pairs, minlength=size * size).reshape(size, size)
+
+        # 停留：类别变化或间隔过大时结束。类别变化时持续到下一条事件，间隔过大时持续到本段最后一条事件
+        ends = np.flatnonzero((codes[1:] != codes[:-1]) | ~linked)
+        starts = np.concatenate([[0], ends + 1])
+        start_times = timestamps[starts]
+        if self.run_start is not None:
+            start_times[0] = self.run_start
+        end_times = np.where(linked[ends], timestamps[ends + 1], timestamps[ends])
+        durations = end_times - start_times[:-1]
+        run_codes = codes[starts[:-1]]
+
+        bins = np.searchsorted(DWELL_BIN_EDGES, durations, side="left")
+        np.add.at(self.dwell_histogram, (run_codes, bins), 1)
+        self.dwell_seconds += np.bincount(run_codes, weights=durations, minlength=size).astype(np.int64)
+
+        self.last_timestamp = int(timestamps[-1])
+        self.last_category = self.categories[int(codes[-1])]
+        self.run_start = int(start_times[-1])
+        return self
+
+    # ---- 合并 ----
+
+    def aligned(self, categories: Sequence[str]) -> "TransitionMatrix":
+        """按给定的类别顺序重新排列（categories 需包含全部已有类别）"""
+        result = TransitionMatrix(categories, self.max_gap)
+        mapping = result._ensure_categories(self.categories)
+        result.counts[np.ix_(mapping, mapping)] = self.counts
+        result.dwell_histogram[mapping] = self.dwell_histogram
+        result.dwell_seconds[mapping] = self.dwell_seconds
+        result.last_timestamp, result.last_category, result.run_start = (
+            self.last_timestamp, self.last_category, self.run_start
+        )
+        return result
+
+    def __add__(self, other: "TransitionMatrix") -> "TransitionMatrix":
+        """
+        合并分别统计的矩阵（不同日期或设备），类别取并集
+
+        两部分之间的边界不计转换，尚未结束的停留也不续接；合并结果不能再 update()
+        """
+        if not isinstance(other, TransitionMatrix):
+            return NotImplemented
+        if self.max_gap != other.max_gap:
+            raise ValueError(f"最大关联间隔不同，无法合并: {self.max_gap} != {other.max_gap}")
+        categories = self.categories + [name for name in other.categories if name not in self.categories]
+        left, right = self.aligned(categories), other.aligned(categories)
+        left.counts += right.counts
+        left.dwell_histogram += right.dwell_histogram
+        left.dwell_seconds += right.dwell_seconds
+        left.last_timestamp = left.last_category = left.run_start = None
+        return left
+
+    def __radd__(self, other):
+        # 支持 sum(matrices)
+        if other == 0:
+            return self
+        return self.__add__(other)
+
+    # ---- 查询 ----
+
+    def probabilities(self) -> np.ndarray:
+        """马尔可夫转移概率 P(下一个为 b | 当前为 a)，没有后续事件的行全为 0"""
+        totals = self.counts.sum(axis=1, keepdims=True)
+        return np.divide(self.counts, totals, out=np.zeros(self.counts.shape), where=totals > 0)
+
+    def most_likely_next(self, category: str, top: int = 3) -> List[Tuple[str, float]]:
+        """category 之后最常出现的行为及其概率"""
+        if category not in self.categories:
+            return []
+        row = self.probabilities()[self.categories.index(category)]
+        order = np.argsort(-row, kind="stable")[:top]
+        return [(self.categories[i], float(row[i])) for i in order if row[i] > 0]
+
+    def dwell_times(self) -> Dict[str, Dict[str, Any]]:
+        """各类别已结束的停留次数、平均时长（秒）和时长分布"""
+        labels = _dwell_bin_labels()
+        runs = self.dwell_histogram.sum(axis=1)
+        result = {}
+        for i, name in enumerate(self.categories):
+            if runs[i] == 0:
+                continue
+            result[name] = {
+                "runs": int(runs[i]),
+                "avg_seconds": float(self.dwell_seconds[i] / runs[i]),
+                "distribution": dict(zip(labels, self.dwell_histogram[i].tolist()))
+            }
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        """行为分析数据中的转换矩阵部分"""
+        probabilities = self.probabilities()
+        return {
+            "max_gap_seconds": self.max_gap,
+            "categories": list(self.categories),
+            "counts": self.counts.tolist(),
+            "probabilities": np.round(probabilities, 4).tolist(),
+            "most_likely_next": {
+                name: self.most_likely_next(name) for name in self.categories
+            },
+            "dwell_times": self.dwell_times()
+        }
+
+    # ---- 持久化 ----
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "categories": self.categories,
+            "max_gap": self.max_gap,
+            "counts": self.counts.tolist(),
+            "dwell_histogram": self.dwell_histogram.tolist(),
+            "dwell_seconds": self.dwell_seconds.tolist(),
+            "last_timestamp": self.last_timestamp,
+            "last_category": self.last_category,
+            "run_start": self.run_start
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TransitionMatrix":
+        matrix = cls(data["categories"], data["max_gap"])
+        size = len(matrix.categories)
+        matrix.counts = np.array(data["counts"], dtype=np.int64).reshape(size, size)
+        matrix.dwell_histogram = np.array(data["dwell_histogram"], dtype=np.int64).reshape(size, len(DWELL_BIN_EDGES) + 1)
+        matrix.dwell_seconds = np.array(data["dwell_seconds"], dtype=np.int64)
+        matrix.last_timestamp = data["last_timestamp"]
+        matrix.last_category = data["last_category"]
+        matrix.run_start = data["run_start"]
+        return matrix
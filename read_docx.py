@@ -3,15 +3,118 @@
 
 import sys
 import os
+import zipfile
+import xml.etree.ElementTree as ET
 
 try:
     from docx import Document
 except ImportError:
-    print("需要安装python-docx库: pip install python-docx")
-    sys.exit(1)
+    # 只有流式读取失败时才需要 python-docx
+    Document = None
 
-def read_docx_file(file_path):
-    """读取docx文件内容"""
+try:
+    # python-docx 依赖 lxml；lxml 的 iterparse 可以在 C 层按标签过滤事件，速度约为标准库的两倍
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_BODY, _P, _TBL, _TR, _TC = _W + "body", _W + "p", _W + "tbl", _W + "tr", _W + "tc"
+_R, _HYPERLINK, _T = _W + "r", _W + "hyperlink", _W + "t"
+# 只跟踪这些元素的开始和结束，其余元素（run 格式等）只在段落结束时作为子元素读取
+_CONTAINERS = (_BODY, _P, _TBL, _TR, _TC)
+_PARSE_ERRORS = (ET.ParseError,) if lxml_etree is None else (ET.ParseError, lxml_etree.XMLSyntaxError)
+# 与 python-docx 的 Run.text 相同的文字等价：制表符、换行、不换行连字符
+_RUN_CHARACTERS = {_W + "tab": "\t", _W + "ptab": "\t", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+
+
+def _paragraph_text(p):
+    """段落文字：直接子级 w:r 和 w:hyperlink 中的 w:r（与 python-docx 的 Paragraph.text 一致）"""
+    parts = []
+    for child in p:
+        runs = [child] if child.tag == _R else child.findall(_R) if child.tag == _HYPERLINK else ()
+        for run in runs:
+            for item in run:
+                if item.tag == _T:
+                    parts.append(item.text or "")
+                elif item.tag == _W + "br":
+                    # 只有换行符（默认类型）对应换行，分页符、分栏符没有文字
+                    if item.get(_W + "type", "textWrapping") == "textWrapping":
+                        parts.append("\n")
+                else:
+                    parts.append(_RUN_CHARACTERS.get(item.tag, ""))
+    return "".join(parts)
+
+
+def _is_merged_continuation(tc):
+    """合并单元格中被合并的部分（w:vMerge / w:hMerge 不带 val 或 val="continue"）"""
+    for merge in (tc.find(f"{_W}tcPr/{_W}vMerge"), tc.find(f"{_W}tcPr/{_W}hMerge")):
+        if merge is not None and merge.get(_W + "val", "continue") == "continue":
+            return True
+    return False
+
+
+def _iterparse(xml):
+    """正文容器元素的 start/end 事件"""
+    if lxml_etree is not None:
+        return lxml_etree.iterparse(xml, events=("start", "end"), tag=_CONTAINERS, huge_tree=True)
+    return (
+        (event, elem) for event, elem in ET.iterparse(xml, events=("start", "end"))
+        if elem.tag in _CONTAINERS
+    )
+
+
+def iter_docx_text(file_path):
+    """
+    流式读取 docx 正文，按文档顺序逐个产出非空段落和表格行的文字
+
+    直接从 zip 中读取 word/document.xml 并用 iterparse 解析，处理完的元素立即清除，
+    不构建 python-docx 的对象树，内存占用与文档大小无关。
+    只处理正文中的顶层段落和顶层表格：表格每行的非空单元格用 " | " 连接，
+    合并单元格只输出一次（python-docx 的 row.cells 会重复返回合并的单元格）
+
+    Raises:
+        zipfile.BadZipFile、KeyError（缺少 word/document.xml）、XML 解析错误
+    """
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as xml:
+        # 祖先容器元素及其标签，用于判断段落是否位于正文顶层或顶层表格的单元格中
+        stack, tags = [], []
+        row, cell = [], []
+        for event, elem in _iterparse(xml):
+            if event == "start":
+                stack.append(elem)
+                tags.append(elem.tag)
+                continue
+
+            stack.pop()
+            tags.pop()
+            if tags[-1:] == [_BODY]:
+                if elem.tag == _P:
+                    text = _paragraph_text(elem).strip()
+                    if text:
+                        yield text
+                # 正文的直接子元素处理完后全部清除，已解析的部分不再占用内存
+                stack[-1].clear()
+            elif elem.tag == _P and tags[-4:] == [_BODY, _TBL, _TR, _TC]:
+                cell.append(_paragraph_text(elem))
+                elem.clear()
+            elif elem.tag == _TC and tags[-3:] == [_BODY, _TBL, _TR]:
+                text = "\n".join(cell).strip()
+                if text and not _is_merged_continuation(elem):
+                    row.append(text)
+                cell = []
+            elif elem.tag == _TR and tags[-2:] == [_BODY, _TBL]:
+                if row:
+                    yield " | ".join(row)
+                row = []
+                stack[-1].clear()
+
+
+def read_docx_file_with_python_docx(file_path):
+    """使用 python-docx 读取（先输出全部段落，再输出全部表格）"""
+    if Document is None:
+        print("需要安装python-docx库: pip install python-docx")
+        return None
     try:
         doc = Document(file_path)
         content = []
@@ -36,6 +139,14 @@ def read_docx_file(file_path):
         print(f"读取文档时出错: {e}")
         return None
 
+def read_docx_file(file_path):
+    """读取docx文件内容，流式解析失败时回退到 python-docx"""
+    try:
+        return "\n".join(iter_docx_text(file_path))
+    except (zipfile.BadZipFile, KeyError, *_PARSE_ERRORS) as e:
+        print(f"流式读取文档失败（{e}），改用 python-docx")
+        return read_docx_file_with_python_docx(file_path)
+
 if __name__ == "__main__":
     file_path = "timestampcategoryconfidencereasons2025.docx"
     